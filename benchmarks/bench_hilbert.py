@@ -0,0 +1,19 @@
+from phac.hilbert import hilbert
+from phac.util import filtfilt
+
+from .common import SAMPLING_RATE, SIZES, FAST_BAND, recording
+
+
+class Hilbert:
+    params = [SIZES, [4096, 16384, 65536]]
+    param_names = ['n', 'nsegment']
+    timeout = 600
+
+    def setup(self, n, nsegment):
+        self.x = filtfilt(recording(n), SAMPLING_RATE, *FAST_BAND)
+
+    def time_hilbert(self, n, nsegment):
+        hilbert(self.x, nsegment=nsegment)
+
+    def peakmem_hilbert(self, n, nsegment):
+        hilbert(self.x, nsegment=nsegment)
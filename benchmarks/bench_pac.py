@@ -0,0 +1,44 @@
+from phac.pac import phase_amplitude_coupling
+from phac.comodulogram import comodulogram
+
+from .common import SAMPLING_RATE, SIZES, SLOW_BAND, FAST_BAND, recording, \
+    grid
+
+
+class PhaseAmplitudeCoupling:
+    params = [SIZES, [None, 2**26], ['median', 'mean']]
+    param_names = ['n', 'memory_budget', 'aggregator']
+    timeout = 1200
+
+    def setup(self, n, memory_budget, aggregator):
+        self.x = recording(n)
+
+    def time_phase_amplitude_coupling(self, n, memory_budget, aggregator):
+        phase_amplitude_coupling(self.x, SAMPLING_RATE, SLOW_BAND, FAST_BAND,
+                                 memory_budget=memory_budget,
+                                 aggregator=aggregator)
+
+    def peakmem_phase_amplitude_coupling(self, n, memory_budget,
+                                         aggregator):
+        phase_amplitude_coupling(self.x, SAMPLING_RATE, SLOW_BAND, FAST_BAND,
+                                 memory_budget=memory_budget,
+                                 aggregator=aggregator)
+
+
+class Comodulogram:
+    # the full grid holds all envelopes in memory, which limits the length
+    params = [[10**4, 10**5, 10**6], [4, 8, 16], ['time', 'fft']]
+    param_names = ['n', 'num_bands', 'engine']
+    timeout = 1200
+
+    def setup(self, n, num_bands, engine):
+        self.x = recording(n)
+        self.slow, self.fast = grid(num_bands)
+
+    def time_comodulogram(self, n, num_bands, engine):
+        comodulogram(self.x, SAMPLING_RATE, self.slow, self.fast,
+                     engine=engine)
+
+    def peakmem_comodulogram(self, n, num_bands, engine):
+        comodulogram(self.x, SAMPLING_RATE, self.slow, self.fast,
+                     engine=engine)
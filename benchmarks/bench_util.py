@@ -0,0 +1,61 @@
+import numpy as np
+
+from phac.models import sin_with_noise, triangle_wave
+from phac.signal import Signal
+from phac.util import filtfilt, indices_of_binned_phase, phase_bin_codes, \
+    bin_index
+
+from .common import SAMPLING_RATE, SIZES, SLOW_BAND, recording
+
+
+class Filtfilt:
+    params = [SIZES]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.x = recording(n)
+
+    def time_filtfilt(self, n):
+        filtfilt(self.x, SAMPLING_RATE, *SLOW_BAND)
+
+    def peakmem_filtfilt(self, n):
+        filtfilt(self.x, SAMPLING_RATE, *SLOW_BAND)
+
+
+class Binning:
+    params = [SIZES, [12, 18]]
+    param_names = ['n', 'num_bins']
+    timeout = 600
+
+    def setup(self, n, num_bins):
+        self.phase = Signal(recording(n), SAMPLING_RATE).phase(SLOW_BAND)
+        self.codes = phase_bin_codes(self.phase, num_bins)
+
+    def time_indices_of_binned_phase(self, n, num_bins):
+        indices_of_binned_phase(self.phase, num_bins)
+
+    def time_phase_bin_codes(self, n, num_bins):
+        phase_bin_codes(self.phase, num_bins, validate=False)
+
+    def time_bin_index(self, n, num_bins):
+        bin_index(self.codes, num_bins)
+
+    def peakmem_indices_of_binned_phase(self, n, num_bins):
+        indices_of_binned_phase(self.phase, num_bins)
+
+
+class Models:
+    params = [[1, 100]]
+    param_names = ['size']
+
+    def setup(self, size):
+        self.t = np.arange(10**4) / SAMPLING_RATE
+
+    def time_sin_with_noise(self, size):
+        sin_with_noise(self.t, frequency=6.0, dphi=1.0, band=(40.0, 90.0),
+                       rng=np.random.default_rng(0), size=size)
+
+    def time_triangle_wave(self, size):
+        triangle_wave(self.t, frequency=6.0, rng=np.random.default_rng(0),
+                      size=size)
@@ -0,0 +1,25 @@
+import numpy as np
+
+from phac.models import sin_with_noise
+from phac.filter_series import FilterSeries
+
+SAMPLING_RATE = 256.0
+
+# recording lengths in samples
+SIZES = [10**4, 10**6, 10**8]
+
+SLOW_BAND, FAST_BAND = (4.0, 8.0), (50.0, 80.0)
+
+
+def recording(n: int, coupling: float = 0.5) -> np.ndarray:
+    """return `n` samples of a coupled slow rhythm and fast noise"""
+    t = np.arange(n) / SAMPLING_RATE
+    return sin_with_noise(t, frequency=6.0, dphi=1.0, band=(40.0, 90.0),
+                          coupling=coupling, rng=np.random.default_rng(42))
+
+
+def grid(num_bands: int):
+    """return slow and fast filter series with `num_bands` bands each"""
+    slow = FilterSeries(4.0, 4.0 + 0.5*num_bands, 2.0)
+    fast = FilterSeries(40.0, 40.0 + 5.0*num_bands, 20.0)
+    return slow, fast
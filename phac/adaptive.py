@@ -0,0 +1,207 @@
+import itertools
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .util import phase_bin_codes
+from .aggregators import Aggregator, binned_aggregate
+from .metrics import _modulation_index
+from .filter_bank import FilterBank
+from .filter_series import FilterSeries
+from .surrogates import surrogate_test
+from .profiling import stage
+
+_AdaptiveComodulogram: Tuple = namedtuple(  # type: ignore
+    "AdaptiveComodulogram", "f_slow f_fast level modulation_index zscore"
+)
+
+
+class AdaptiveComodulogram(_AdaptiveComodulogram):
+    """band pairs evaluated by `adaptive_comodulogram`
+
+    `f_slow`, `f_fast` and `level` (of refinement) have one entry per pair,
+    `modulation_index` and `zscore` (None without surrogates) have shape
+    `(..., n_pairs)` where `...` are the channel axes.
+    """
+
+    @property
+    def score(self) -> np.ndarray:
+        """z-scores if computed, modulation indices otherwise"""
+        return self.modulation_index if self.zscore is None else self.zscore
+
+    def peak(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """return f_slow, f_fast and modulation index of the largest score,
+        per channel"""
+        i = np.argmax(self.score, axis=-1)
+        mi = np.take_along_axis(self.modulation_index,
+                                np.expand_dims(i, -1), axis=-1)[..., 0]
+        return self.f_slow[i], self.f_fast[i], mi
+
+    def to_dataframe(self):
+        """return one row per pair (and channel) as a pd.DataFrame"""
+        import pandas as pd
+        columns = {'f_slow': self.f_slow, 'f_fast': self.f_fast,
+                   'level': self.level}
+        values = {'modulation_index': self.modulation_index}
+        if self.zscore is not None:
+            values['zscore'] = self.zscore
+        if self.modulation_index.ndim == 1:
+            return pd.DataFrame(dict(columns, **values))
+        num_channels = int(np.prod(self.modulation_index.shape[:-1]))
+        frame = {'channel': np.repeat(np.arange(num_channels),
+                                      self.f_slow.size)}
+        frame.update({key: np.tile(x, num_channels)
+                      for key, x in columns.items()})
+        frame.update({key: x.ravel() for key, x in values.items()})
+        return pd.DataFrame(frame)
+
+
+def _centers(filters: FilterSeries) -> List[float]:
+    return [_key(band.center) for band in filters]
+
+
+def _key(f: float) -> float:
+    """return a center frequency rounded to compare across levels"""
+    return round(float(f), 9)
+
+
+def _neighbours(centers: List[float], step: float, refine: bool,
+                lo: float, hi: float) -> List[float]:
+    """return `centers` and, if `refine`, their neighbours at `step` within
+    `[lo, hi]`"""
+    offsets = (-step, 0.0, step) if refine else (0.0,)
+    return sorted({_key(f + d) for f in centers for d in offsets
+                   if lo - 1e-9 <= f + d <= hi + 1e-9})
+
+
+@stage('adaptive_comodulogram')
+def adaptive_comodulogram(samples: np.ndarray, sampling_rate: float,
+                          slow_filters: FilterSeries,
+                          fast_filters: FilterSeries,
+                          resolution: Tuple[float, float],
+                          threshold: Optional[float] = None,
+                          num_bins: int = 18,
+                          num_surrogates: Optional[int] = None,
+                          rng: Optional[np.random.Generator] = None,
+                          axis: int = -1,
+                          aggregator: Aggregator = 'median',
+                          **kwargs) -> AdaptiveComodulogram:
+    """return modulation indices on a grid refined around coupling
+
+    The band pairs of `slow_filters` and `fast_filters` are evaluated
+    first.  Around each pair whose score (the modulation index, or its
+    z-score against `num_surrogates` surrogates) exceeds `threshold` in any
+    channel, the spacing of the band centers is halved and the neighbouring
+    pairs are evaluated, until the spacing reaches `resolution`.  Band
+    widths are those of the series throughout, and each band is filtered
+    only once.
+
+    Parameters
+    ----------
+    samples: np.ndarray
+        the recording, with any number of channel axes.
+    sampling_rate: float
+        in Hz.
+    slow_filters, fast_filters: FilterSeries
+        the coarse grid, with center spacing `width/4`.  A `FilterBank` is
+        rejected with a ValueError, since refined bands are designed from
+        the width of the series.
+    resolution: 2-tuple
+        target spacing of the slow and the fast band centers in Hz.
+    threshold: float, optional
+        score above which pairs are refined.  By default, half of the
+        largest score of the coarse grid.
+    num_bins: int, default=18
+        number of phase bins.
+    num_surrogates: int, optional
+        if given, scores are z-scores against surrogates, see
+        `surrogates.surrogate_test`.
+    rng: np.random.Generator, optional
+        source of randomness of the surrogates.
+    axis: int, default=-1
+        time axis of `samples`.
+    aggregator: str or callable, default='median'
+        see `aggregators.get_aggregator`.
+    **kwargs:
+        passed on to `FilterBank`, e.g. `engine` or `multirate`.
+
+    Returns
+    -------
+    AdaptiveComodulogram of all evaluated pairs, ordered by `f_slow` and
+    `f_fast`.
+    """
+    try:
+        assert all(isinstance(filters, FilterSeries)
+                   for filters in (slow_filters, fast_filters)), \
+            "slow_filters and fast_filters must be FilterSeries"
+        assert all(r > 0 for r in resolution), \
+            f"resolution ({resolution}) must be positive"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    samples = np.moveaxis(samples, axis, -1)
+    series = (slow_filters, fast_filters)
+    codes: Dict[float, np.ndarray] = {}
+    envelopes: Dict[float, np.ndarray] = {}
+
+    def filter_bands(centers, filters, store, compute):
+        new = [f for f in centers if f not in store]
+        if new:
+            bank = FilterBank([(f - filters.width/2, f + filters.width/2)
+                               for f in new], sampling_rate, **kwargs)
+            store.update(zip(new, compute(bank)))
+
+    def evaluate(pairs):
+        slow = sorted({s for s, _ in pairs})
+        filter_bands(slow, slow_filters, codes, lambda bank: phase_bin_codes(
+            bank.phase(samples), num_bins, validate=False))
+        filter_bands(sorted({f for _, f in pairs}), fast_filters, envelopes,
+                     lambda bank: bank.envelope(samples))
+        for s in slow:
+            fast = [f for t, f in pairs if t == s]
+            c = codes[s][..., None, :]
+            e = np.stack([envelopes[f] for f in fast], axis=-2)
+            if num_surrogates is not None:
+                ans = surrogate_test(c, e, num_surrogates, num_bins=num_bins,
+                                     rng=rng, aggregator=aggregator)
+                mi, z = ans.modulation_index[..., 0, :], ans.zscore[..., 0, :]
+            else:
+                mi = _modulation_index(
+                    binned_aggregate(c, e, num_bins, aggregator))[..., 0, :]
+                z = None
+            for i, f in enumerate(fast):
+                yield (s, f), mi[..., i], None if z is None else z[..., i]
+
+    centers = [_centers(filters) for filters in series]
+    bounds = [(c[0], c[-1]) for c in centers]
+    steps = [filters.width / 4 for filters in series]
+    results: Dict[Tuple[float, ...], Tuple] = {}
+    level = 0
+    pairs = list(itertools.product(*centers))
+    while True:
+        new = [pair for pair in pairs if pair not in results]
+        for pair, mi, z in evaluate(new):
+            results[pair] = (level, mi, z)
+        scores = {pair: np.max(results[pair][1 if num_surrogates is None
+                                             else 2]) for pair in pairs}
+        if threshold is None:
+            threshold = 0.5 * max(scores.values())
+        selected = [pair for pair in pairs if scores[pair] > threshold]
+        refine = [step > r for step, r in zip(steps, resolution)]
+        if not selected or not any(refine):
+            break
+        steps = [step/2 if r else step for step, r in zip(steps, refine)]
+        pairs = sorted({
+            pair for s, f in selected for pair in itertools.product(
+                *(_neighbours([c], step, r, lo, hi) for c, step, r, (lo, hi)
+                  in zip((s, f), steps, refine, bounds)))})
+        level += 1
+    keys = sorted(results)
+    values = [results[key] for key in keys]
+    return AdaptiveComodulogram(
+        f_slow=np.array([s for s, _ in keys]),
+        f_fast=np.array([f for _, f in keys]),
+        level=np.array([v[0] for v in values]),
+        modulation_index=np.stack([v[1] for v in values], axis=-1),
+        zscore=None if num_surrogates is None
+        else np.stack([v[2] for v in values], axis=-1))
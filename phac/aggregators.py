@@ -0,0 +1,262 @@
+from typing import Callable, Tuple, Union
+
+import numpy as np
+
+from .util import binned_median, binned_sum, bin_index, _bin_offsets
+from .profiling import stage
+
+AGGREGATORS = ('median', 'mean', 'trimmed_mean')
+
+Aggregator = Union[str, Callable[..., np.ndarray]]
+
+
+def _broadcast(codes: np.ndarray,
+               amplitudes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """return codes `(..., n_phase, n)` and amplitudes `(..., n_amp, n)`
+    with common leading axes"""
+    codes = np.atleast_2d(codes)
+    amplitudes = np.atleast_2d(amplitudes)
+    lead = np.broadcast_shapes(codes.shape[:-2], amplitudes.shape[:-2])
+    return (np.broadcast_to(codes, lead + codes.shape[-2:]),
+            np.broadcast_to(amplitudes, lead + amplitudes.shape[-2:]))
+
+
+def binned_mean(codes: np.ndarray, amplitudes: np.ndarray,
+                num_bins: int = 18) -> np.ndarray:
+    """return means of all amplitudes within all phase bins
+
+    Sums and counts are computed with `np.bincount` in linear time.  See
+    `util.binned_median` for the shapes.  Empty bins yield `nan`.
+    """
+    codes, amplitudes = _broadcast(codes, amplitudes)
+    n_phase, n_amplitude = codes.shape[-2], amplitudes.shape[-2]
+    ans = np.empty(codes.shape[:-2] + (n_phase, n_amplitude, num_bins),
+                   dtype=np.float64)
+    for i in range(n_phase):
+        c = codes[..., i, None, :]
+        counts = binned_sum(c, None, num_bins)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ans[..., i, :, :] = binned_sum(c, amplitudes, num_bins) / counts
+    return ans
+
+
+def binned_trimmed_mean(codes: np.ndarray, amplitudes: np.ndarray,
+                        num_bins: int = 18,
+                        proportiontocut: float = 0.1) -> np.ndarray:
+    """return trimmed means of all amplitudes within all phase bins
+
+    Like `scipy.stats.trim_mean`, `int(proportiontocut*count)` of the
+    smallest and of the largest amplitudes of each bin are dropped.
+    Amplitudes are grouped by bin in sorted order as in `util.binned_median`
+    and the means are read off from cumulative sums.  Empty bins yield
+    `nan`.
+    """
+    try:
+        assert 0.0 <= proportiontocut < 0.5, \
+            f"proportiontocut ({proportiontocut}) must be in [0, 0.5)"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    codes, amplitudes = _broadcast(codes, amplitudes)
+    (n_phase, n), n_amplitude = codes.shape[-2:], amplitudes.shape[-2]
+    lead = codes.shape[:-2]
+    order = np.argsort(amplitudes, axis=-1)
+    sorted_amplitudes = np.take_along_axis(amplitudes, order, axis=-1)
+    cumulative = np.zeros(lead + (n_amplitude, n+1), dtype=np.float64)
+    ans = np.empty(lead + (n_phase, n_amplitude, num_bins), dtype=np.float64)
+    for i in range(n_phase):
+        c = codes[..., i, :]
+        counts = binned_sum(c, num_bins=num_bins)[..., None, :]
+        offsets = _bin_offsets(counts)[..., :-1]
+        grouped = np.argsort(
+            np.take_along_axis(c[..., None, :], order, axis=-1),
+            axis=-1, kind='stable')
+        np.cumsum(np.take_along_axis(sorted_amplitudes, grouped, axis=-1),
+                  axis=-1, out=cumulative[..., 1:])
+        cut = (proportiontocut * counts).astype(np.intp)
+        lower, upper = offsets + cut, offsets + counts - cut
+        sums = np.take_along_axis(cumulative, upper, axis=-1) \
+            - np.take_along_axis(cumulative, lower, axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ans[..., i, :, :] = sums / (upper - lower)
+    return ans
+
+
+def _partition_median(codes: np.ndarray, amplitudes: np.ndarray,
+                      num_bins: int = 18) -> np.ndarray:
+    """return binned medians by partitioning the amplitudes of each bin
+
+    The amplitudes are grouped by bin with the permutation of `bin_index`,
+    and each group is partitioned in place around its middle, which takes
+    linear time.
+    """
+    codes, amplitudes = _broadcast(codes, amplitudes)
+    (n_phase, n), n_amplitude = codes.shape[-2:], amplitudes.shape[-2]
+    lead = codes.shape[:-2]
+    num = int(np.prod(lead))
+    codes = codes.reshape((num, n_phase, n))
+    amplitudes = amplitudes.reshape((num, n_amplitude, n))
+    ans = np.full((num, n_phase, n_amplitude, num_bins), np.nan)
+    for j in range(num):
+        for i in range(n_phase):
+            bins = bin_index(codes[j, i], num_bins)
+            grouped = np.take(amplitudes[j], bins.permutation, axis=-1)
+            for k, (start, count) in enumerate(zip(bins.offsets,
+                                                   bins.counts)):
+                if count == 0:
+                    continue
+                group = grouped[:, start:start+count]
+                middle = [(count-1) // 2, count // 2]
+                group.partition(middle, axis=-1)
+                ans[j, i, :, k] = 0.5 * (
+                    group[:, middle[0]].astype(np.float64)
+                    + group[:, middle[1]])
+    return ans.reshape(lead + (n_phase, n_amplitude, num_bins))
+
+
+def _median(codes: np.ndarray, amplitudes: np.ndarray,
+            num_bins: int = 18) -> np.ndarray:
+    # sorting the amplitudes pays off if they are shared by phase signals
+    if np.ndim(codes) > 1 and np.shape(codes)[-2] > 1:
+        return binned_median(codes, amplitudes, num_bins)
+    return _partition_median(codes, amplitudes, num_bins)
+
+
+def get_aggregator(aggregator: Aggregator) -> Callable[..., np.ndarray]:
+    """return the function averaging amplitudes within phase bins
+
+    Parameters
+    ----------
+    aggregator: str or callable
+        one of `AGGREGATORS`, or a function with the signature of
+        `binned_mean`, e.g. `functools.partial(binned_trimmed_mean,
+        proportiontocut=0.2)`.
+    """
+    if callable(aggregator):
+        return aggregator
+    aggregator_fn = {
+        'median': _median,
+        'mean': binned_mean,
+        'trimmed_mean': binned_trimmed_mean,
+    }
+    try:
+        return aggregator_fn[aggregator]
+    except KeyError:
+        raise ValueError(f"aggregator ({aggregator}) must be one of "
+                         f"{AGGREGATORS} or callable")
+
+
+@stage('aggregate')
+def binned_aggregate(codes: np.ndarray, amplitudes: np.ndarray,
+                     num_bins: int = 18,
+                     aggregator: Aggregator = 'median') -> np.ndarray:
+    """return averages of all amplitudes within all phase bins
+
+    'median' is exact.  Amplitudes shared by several phase signals are
+    sorted once (see `util.binned_median`), otherwise each bin is
+    partitioned in linear time.  'mean' and 'trimmed_mean' (10% cut at
+    both ends) are computed from sums.
+
+    Parameters
+    ----------
+    codes: np.ndarray
+        phase bin codes of shape `(..., n_phase, n)`.
+    amplitudes: np.ndarray
+        amplitudes of shape `(..., n_amplitude, n)`.
+    num_bins: int, default=18
+        number of phase bins.
+    aggregator: str or callable, default='median'
+        see `get_aggregator`.
+
+    Returns
+    -------
+    np.ndarray of shape `(..., n_phase, n_amplitude, num_bins)`
+    """
+    return get_aggregator(aggregator)(codes, amplitudes, num_bins)
+
+
+class QuantileSketch:
+    """streaming quantiles of non-negative values within phase bins
+
+    Values are counted in logarithmically spaced buckets (as in DDSketch,
+    Masson et al., 2019), such that quantiles are estimated with a relative
+    error of at most `relative_accuracy`, using memory that grows only with
+    the logarithm of the range of the values.  Counts are additive: values
+    can be added and removed, e.g. for sliding windows.
+
+    Parameters
+    ----------
+    num_bins: int
+        number of phase bins.
+    shape: tuple, default=()
+        leading (channel) axes of the values.
+    relative_accuracy: float, default=0.01
+        bound on the relative error of the quantiles.
+    min_value: float, default=1e-12
+        smaller values are counted as `min_value`.
+    """
+
+    def __init__(self, num_bins: int, shape: Tuple[int, ...] = (),
+                 relative_accuracy: float = 0.01, min_value: float = 1e-12):
+        try:
+            assert 0.0 < relative_accuracy < 1.0, \
+                f"relative_accuracy ({relative_accuracy}) must be in (0, 1)"
+        except AssertionError as err:
+            raise ValueError(str(err))
+        self.num_bins = num_bins
+        self.shape = tuple(shape)
+        self.gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self.min_value = min_value
+        self.offset = 0
+        self.counts = np.zeros(self.shape + (num_bins, 0), dtype=np.int64)
+
+    def _buckets(self, values: np.ndarray) -> np.ndarray:
+        values = np.maximum(values, self.min_value)
+        return np.ceil(np.log(values) / np.log(self.gamma)).astype(np.int64)
+
+    def _grow(self, low: int, high: int) -> None:
+        num_buckets = self.counts.shape[-1]
+        if num_buckets == 0:
+            self.offset = low
+        before = max(self.offset - low, 0)
+        after = max(high - (self.offset + num_buckets) + 1, 0)
+        if before or after:
+            pad = [(0, 0)] * (self.counts.ndim-1) + [(before, after)]
+            self.counts = np.pad(self.counts, pad)
+            self.offset -= before
+
+    def add(self, codes: np.ndarray, values: np.ndarray,
+            weight: int = 1) -> None:
+        """count `values` of shape `shape + (n,)` in the bins of `codes`
+
+        A `weight` of -1 removes values that were added before.
+        """
+        codes, values = np.broadcast_arrays(codes, values)
+        if values.size == 0:
+            return
+        buckets = self._buckets(values)
+        self._grow(int(buckets.min()), int(buckets.max()))
+        num_buckets = self.counts.shape[-1]
+        num = int(np.prod(self.shape))
+        flat = (np.arange(num).reshape(self.shape + (1,)) * self.num_bins
+                + codes) * num_buckets + buckets - self.offset
+        self.counts += weight * np.bincount(
+            flat.ravel(), minlength=self.counts.size
+        ).reshape(self.counts.shape)
+
+    def quantile(self, q: float) -> np.ndarray:
+        """return the `q`-quantile of each bin, shape `shape + (num_bins,)`
+
+        Empty bins yield `nan`.
+        """
+        if self.counts.shape[-1] == 0:
+            return np.full(self.counts.shape[:-1], np.nan)
+        cumulative = np.cumsum(self.counts, axis=-1)
+        total = cumulative[..., -1:]
+        rank = q * (total - 1)
+        index = np.argmax(cumulative > rank, axis=-1)
+        ans = 2.0 * self.gamma**(index + self.offset) / (self.gamma + 1.0)
+        ans[total[..., 0] == 0] = np.nan
+        return ans
+
+    def median(self) -> np.ndarray:
+        return self.quantile(0.5)
@@ -0,0 +1,79 @@
+from collections import OrderedDict, namedtuple
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import numpy as np
+
+from .profiling import record_cache
+
+CacheInfo: Tuple = namedtuple(  # type: ignore
+    "CacheInfo", "hits misses max_bytes nbytes"
+)
+
+
+class ArrayCache:
+    """least-recently-used cache of arrays within a budget of bytes
+
+    Cached arrays are made read-only, so that callers cannot corrupt them.
+    Arrays larger than the budget are not cached.
+
+    Parameters
+    ----------
+    max_bytes: int, optional
+        budget of the cached arrays in bytes.  `None` is unlimited, 0 disables
+        the cache.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._arrays: OrderedDict = OrderedDict()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(arr.nbytes for arr in self._arrays.values())
+
+    def __len__(self) -> int:
+        return len(self._arrays)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._arrays
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.max_bytes, self.nbytes)
+
+    def get(self, key: Hashable,
+            compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """return the array at `key`, computing and caching it if missing"""
+        try:
+            arr = self._arrays[key]
+        except KeyError:
+            self.misses += 1
+            record_cache(False)
+            return self.put(key, compute())
+        self.hits += 1
+        record_cache(True)
+        self._arrays.move_to_end(key)
+        return arr
+
+    def put(self, key: Hashable, arr: np.ndarray) -> np.ndarray:
+        """cache `arr` at `key`, evicting the least recently used arrays"""
+        if self.max_bytes is not None and arr.nbytes > self.max_bytes:
+            return arr
+        arr.flags.writeable = False
+        self._arrays.pop(key, None)
+        self._arrays[key] = arr
+        if self.max_bytes is not None:
+            nbytes = self.nbytes
+            while nbytes > self.max_bytes:
+                _, evicted = self._arrays.popitem(last=False)
+                nbytes -= evicted.nbytes
+        return arr
+
+    def invalidate(self,
+                   match: Optional[Callable[[Any], bool]] = None
+                   ) -> None:
+        """drop all arrays, or those whose key satisfies `match`"""
+        for key in list(self._arrays):
+            if match is None or match(key):
+                del self._arrays[key]
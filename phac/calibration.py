@@ -0,0 +1,287 @@
+import ast
+import csv
+import json
+import inspect
+import itertools
+from collections import namedtuple
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .models import sin_with_noise
+from .pac import phase_amplitude_coupling
+
+CalibrationResult: Tuple = namedtuple(  # type: ignore
+    "CalibrationResult", "records summary"
+)
+
+_MODEL_DEFAULTS = {
+    key: parameter.default for key, parameter in
+    inspect.signature(sin_with_noise).parameters.items()
+    if parameter.default is not inspect.Parameter.empty
+}
+
+# grid keys passed on to `phase_amplitude_coupling` instead of the model
+ANALYSIS_PARAMETERS = ('slow_band', 'fast_band')
+
+
+def parameter_grid(grid: Dict[str, Sequence]) -> List[Dict]:
+    """return all combinations of the values of `grid`, last key fastest"""
+    keys = list(grid)
+    return [dict(zip(keys, values))
+            for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def _null_cells(cells: List[Dict]) -> List[Dict]:
+    """return the distinct cells without coupling, in order of appearance"""
+    ans: List[Dict] = []
+    for cell in cells:
+        null = dict(cell, coupling=0.0)
+        if null not in ans:
+            ans.append(null)
+    return ans
+
+
+def analysis_bands(model: Dict,
+                   slow_band: Optional[Tuple[float, float]] = None,
+                   fast_band: Optional[Tuple[float, float]] = None
+                   ) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    """return the given bands, or those of the rhythm and of the modulated
+    noise of `sin_with_noise` with keyword arguments `model`
+
+    The default slow band spans 20% around the `frequency` of the model,
+    the default fast band is its noise `band`.
+    """
+    if slow_band is None:
+        frequency = model.get('frequency', _MODEL_DEFAULTS['frequency'])
+        slow_band = (0.8*frequency, 1.2*frequency)
+    if fast_band is None:
+        fast_band = tuple(model.get('band', _MODEL_DEFAULTS['band']))
+    return slow_band, fast_band
+
+
+def _simulate_task(params: Dict, kind: str, cell: int, start: int, num: int,
+                   seed: np.random.SeedSequence, duration: float,
+                   sampling_rate: float, slow_band: Tuple[float, float],
+                   fast_band: Tuple[float, float],
+                   kwargs: Dict) -> List[Dict]:
+    """return the records of realizations `start` to `start+num` of a cell"""
+    model = {key: value for key, value in params.items()
+             if key not in ANALYSIS_PARAMETERS}
+    slow_band, fast_band = analysis_bands(
+        model, params.get('slow_band', slow_band),
+        params.get('fast_band', fast_band))
+    t = np.arange(int(duration*sampling_rate)) / sampling_rate
+    samples = sin_with_noise(t, rng=np.random.default_rng(seed), size=num,
+                             **model)
+    mi = phase_amplitude_coupling(samples, sampling_rate, slow_band,
+                                  fast_band, **kwargs).modulation_index
+    return [dict(params, kind=kind, cell=cell, realization=start+i,
+                 modulation_index=float(mi[i])) for i in range(num)]
+
+
+class _RecordWriter:
+    """append records to a JSON-lines file, or to a `.csv` file"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._file = None if path is None else open(path, 'w', newline='')
+        self._csv: Optional[csv.DictWriter] = None
+
+    def write(self, records: List[Dict]) -> None:
+        if self._file is None or not records:
+            return
+        if not str(self.path).endswith('.csv'):
+            for record in records:
+                self._file.write(json.dumps(record) + '\n')
+        else:
+            if self._csv is None:
+                self._csv = csv.DictWriter(self._file, list(records[0]))
+                self._csv.writeheader()
+            self._csv.writerows(records)
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+def _tuples(value):
+    """return lists, and strings of tuples from csv files, as tuples"""
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, str) and value.startswith('('):
+        return ast.literal_eval(value)
+    return value
+
+
+def load_records(path: str) -> pd.DataFrame:
+    """return the records streamed to `path` by `calibrate`"""
+    if str(path).endswith('.csv'):
+        records = pd.read_csv(path, float_precision='round_trip')
+    else:
+        with open(path) as f:
+            records = pd.DataFrame([json.loads(line) for line in f])
+    for column in records.columns:
+        if not pd.api.types.is_numeric_dtype(records[column]):
+            records[column] = records[column].map(_tuples).astype(object)
+    return records
+
+
+def summarize(records: pd.DataFrame, alpha: float = 0.05,
+              quantiles: Sequence[float] = (0.5, 0.9, 0.95, 0.99)
+              ) -> pd.DataFrame:
+    """return null quantiles and detection rates of each parameter cell
+
+    The threshold of a cell is the `1-alpha` quantile of the modulation
+    indices of its null cell, the same parameters without coupling.  The
+    detection rate is the fraction of realizations of the cell exceeding it.
+    """
+    try:
+        assert 0.0 < alpha < 1.0, f"alpha ({alpha}) must be in (0, 1)"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    reserved = ('kind', 'cell', 'realization', 'modulation_index')
+    params = [c for c in records.columns if c not in reserved]
+    null_params = [c for c in params if c != 'coupling']
+    signal = records[records['kind'] == 'coupled']
+    null = records[records['kind'] == 'uncoupled']
+    null_mi = {
+        key if isinstance(key, tuple) else (key,): group['modulation_index']
+        for key, group in (null.groupby(null_params, sort=False)
+                           if null_params else [((), null)])
+    }
+    rows = []
+    for _, group in signal.groupby('cell', sort=True):
+        cell = group.iloc[0]
+        mi = group['modulation_index'].to_numpy()
+        reference = null_mi[tuple(cell[c] for c in null_params)].to_numpy()
+        threshold = np.quantile(reference, 1.0-alpha)
+        row = {c: cell[c] for c in params}
+        row.update(num_realizations=mi.size,
+                   modulation_index=np.median(mi))
+        row.update({f'null_q{100*q:g}': np.quantile(reference, q)
+                    for q in quantiles})
+        row.update(threshold=threshold,
+                   detection_rate=np.mean(mi > threshold))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def detection_curve(summary: pd.DataFrame,
+                    parameter: str = 'coupling') -> pd.DataFrame:
+    """return detection rates with index `parameter` and one column per
+    combination of the other parameters of `summary`"""
+    reserved = ('num_realizations', 'modulation_index', 'threshold',
+                'detection_rate')
+    others = [c for c in summary.columns
+              if c != parameter and c not in reserved
+              and not c.startswith('null_q')]
+    if not others:
+        return summary.set_index(parameter)[['detection_rate']]
+    return summary.pivot_table(index=parameter, columns=others,
+                               values='detection_rate')
+
+
+def _tasks(cells: List[Dict], num_realizations: int, batch_size: int,
+           seed: int) -> Iterator[Tuple]:
+    """yield params, kind, cell, first realization, number and seed
+
+    Each batch of realizations has its own seed derived from `seed`, the
+    kind, cell and batch, so that results do not depend on scheduling.
+    """
+    for k, (kind, kind_cells) in enumerate(
+            [('coupled', cells), ('uncoupled', _null_cells(cells))]):
+        for i, params in enumerate(kind_cells):
+            for j, start in enumerate(range(0, num_realizations,
+                                            batch_size)):
+                num = min(batch_size, num_realizations - start)
+                yield params, kind, i, start, num, np.random.SeedSequence(
+                    seed, spawn_key=(k, i, j))
+
+
+def calibrate(grid: Dict[str, Sequence], num_realizations: int = 100,
+              duration: float = 10.0, sampling_rate: float = 256.0,
+              slow_band: Optional[Tuple[float, float]] = None,
+              fast_band: Optional[Tuple[float, float]] = None,
+              seed: int = 0, n_jobs: int = 1,
+              executor: Optional[Executor] = None, batch_size: int = 16,
+              path: Optional[str] = None, alpha: float = 0.05,
+              quantiles: Sequence[float] = (0.5, 0.9, 0.95, 0.99),
+              **kwargs) -> CalibrationResult:
+    """return modulation indices of `sin_with_noise` realizations on a grid
+
+    For each cell of the parameter grid, `num_realizations` recordings are
+    generated and analysed with `phase_amplitude_coupling`, and as many
+    for its null cell without coupling.  Realizations are generated in
+    batches of `batch_size` with seeds derived from `seed`, so that results
+    are reproducible for any number of jobs (given the same `batch_size`).
+
+    Parameters
+    ----------
+    grid: dict
+        lists of values of the keyword arguments of `sin_with_noise`, e.g.
+        `{'coupling': [0.1, 0.3], 'amplitude': [0.5, 1.0]}`, and possibly of
+        `slow_band` and `fast_band`.
+    num_realizations: int, default=100
+        per cell.
+    duration: float, default=10.0
+        of the recordings in seconds.
+    sampling_rate: float, default=256.0
+        in Hz.
+    slow_band, fast_band: 2-tuples, optional
+        bands of the analysis, unless given in `grid`.  By default, those
+        of the `frequency` and the noise `band` of each cell, see
+        `analysis_bands`.
+    seed: int, default=0
+        root of the seeds of all batches.
+    n_jobs: int, default=1
+        number of worker processes, -1 uses all CPUs.  Ignored if `executor`
+        is given.
+    executor: concurrent.futures.Executor, optional
+        pool to submit the batches to.
+    batch_size: int, default=16
+        realizations generated and analysed together.
+    path: str, optional
+        file to which records are streamed as batches complete, as JSON lines
+        or, for a `.csv` suffix, as CSV.  See `load_records`.
+    alpha, quantiles:
+        see `summarize`.
+    **kwargs:
+        passed on to `phase_amplitude_coupling`, e.g. `engine`.
+
+    Returns
+    -------
+    CalibrationResult of the records, one row per realization, and their
+    `summarize`.
+    """
+    cells = [dict({'coupling': _MODEL_DEFAULTS['coupling']}, **cell)
+             for cell in parameter_grid(grid)]
+    tasks = [task + (duration, sampling_rate, slow_band, fast_band, kwargs)
+             for task in _tasks(cells, num_realizations, batch_size, seed)]
+    writer = _RecordWriter(path)
+    records: List[Dict] = []
+    own_executor = None
+    if executor is None and n_jobs != 1:
+        executor = own_executor = ProcessPoolExecutor(
+            max_workers=None if n_jobs == -1 else n_jobs)
+    try:
+        if executor is None:
+            results = (_simulate_task(*task) for task in tasks)
+        else:
+            futures = [executor.submit(_simulate_task, *task)
+                       for task in tasks]
+            results = (future.result() for future in as_completed(futures))
+        for result in results:
+            writer.write(result)
+            records.extend(result)
+    finally:
+        writer.close()
+        if own_executor is not None:
+            own_executor.shutdown()
+    records.sort(key=lambda r: (r['kind'] != 'coupled', r['cell'],
+                                r['realization']))
+    ans = pd.DataFrame(records)
+    return CalibrationResult(ans, summarize(ans, alpha, quantiles))
@@ -0,0 +1,316 @@
+import argparse
+import csv
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor, as_completed)
+from pathlib import Path
+from typing import (Dict, Iterator, List, Optional, Sequence, Tuple, Union,
+                    cast)
+
+import numpy as np
+
+from .comodulogram import Filters, comodulogram_metrics
+from .filter_bank import FilterBank
+from .filter_series import FilterSeries
+from .metrics import METRICS
+from .result import ComodulogramResult
+from .version import __version__
+
+Recording: Tuple = namedtuple(  # type: ignore
+    "Recording", "path name sampling_rate dtype num_channels offset"
+)
+
+# file suffixes of recordings found in directories
+SUFFIXES = ('.npy', '.bin', '.raw', '.dat')
+
+# keyword arguments of `run` used to design the filter banks
+BANK_PARAMETERS = ('engine', 'filter_shape', 'precision', 'multirate')
+
+
+def _recording(path: Path, name: str, defaults: Dict,
+               row: Optional[Dict] = None) -> Recording:
+    """return the recording at `path` with `defaults` overridden by the
+    non-empty entries of a manifest `row`"""
+    params = dict(defaults)
+    params.update({key: value for key, value in (row or {}).items()
+                   if key in params and value not in (None, '')})
+    try:
+        assert params['sampling_rate'] is not None, \
+            f"no sampling rate for {path}"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    num_channels = params['num_channels']
+    return Recording(
+        path=str(path), name=name,
+        sampling_rate=float(params['sampling_rate']),
+        dtype=str(params['dtype']),
+        num_channels=None if num_channels is None else int(num_channels),
+        offset=int(params['offset']))
+
+
+def find_recordings(inputs: Sequence[str],
+                    sampling_rate: Optional[float] = None,
+                    dtype: str = 'float64', num_channels: Optional[int] = None,
+                    offset: int = 0) -> List[Recording]:
+    """return the recordings of files, directories and manifests
+
+    Directories contribute their files with a suffix in `SUFFIXES`, named by
+    their path relative to the directory.  A manifest is a `.csv` file with
+    a column `path` (relative to the manifest) and optional columns
+    `sampling_rate`, `dtype`, `num_channels` and `offset` that override the
+    keyword arguments, which apply to all other recordings.
+    """
+    defaults = dict(sampling_rate=sampling_rate, dtype=dtype,
+                    num_channels=num_channels, offset=offset)
+    ans: List[Recording] = []
+    for item in map(Path, inputs):
+        if item.is_dir():
+            ans.extend(_recording(path, str(path.relative_to(item)), defaults)
+                       for path in sorted(item.rglob('*'))
+                       if path.suffix in SUFFIXES)
+        elif item.suffix == '.csv':
+            with open(item, newline='') as f:
+                for row in csv.DictReader(f):
+                    path = item.parent / row['path']
+                    ans.append(_recording(path, row['path'], defaults, row))
+        else:
+            ans.append(_recording(item, item.name, defaults))
+    return ans
+
+
+def load(recording: Recording) -> np.ndarray:
+    """return the samples of `recording` read into memory, time last"""
+    if recording.path.endswith('.npy'):
+        samples = np.load(recording.path)
+    else:
+        samples = np.fromfile(recording.path, dtype=recording.dtype,
+                              offset=recording.offset)
+    if recording.num_channels is not None:
+        samples = samples.reshape(-1, recording.num_channels).T
+    return samples
+
+
+def output_path(output: str, recording: Recording) -> Path:
+    return Path(output) / Path(recording.name).with_suffix('.npz')
+
+
+def _check_outputs(recordings: Sequence[Recording], output: str) -> None:
+    """raise a ValueError if two recordings have the same output path"""
+    seen: Dict[Path, Recording] = {}
+    for recording in recordings:
+        path = output_path(output, recording)
+        try:
+            assert path not in seen, \
+                f"{seen[path].path} and {recording.path} both have the " \
+                f"output {path}"
+        except AssertionError as err:
+            raise ValueError(str(err))
+        seen[path] = recording
+
+
+def analyse(samples: np.ndarray, sampling_rate: float,
+            slow_filters: Filters, fast_filters: Filters,
+            **kwargs) -> ComodulogramResult:
+    """return the comodulograms of a recording, see `comodulogram_metrics`"""
+    return cast(ComodulogramResult, comodulogram_metrics(
+        samples, sampling_rate, slow_filters, fast_filters, as_frame=False,
+        **kwargs))
+
+
+def _save(result: ComodulogramResult, path: Path) -> None:
+    """write `result` to `path` at once, so that no partial results are
+    left if interrupted"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.stem + '.partial.npz')
+    result.save(str(tmp))
+    os.replace(tmp, path)
+
+
+def _process(recording: Recording, output: str,
+             samples: Optional[np.ndarray],
+             slow_bank: FilterBank, fast_bank: FilterBank,
+             **kwargs) -> Path:
+    """load (unless given), analyse and save a recording"""
+    samples = load(recording) if samples is None else samples
+    path = output_path(output, recording)
+    _save(analyse(samples, recording.sampling_rate, slow_bank, fast_bank,
+                  **kwargs), path)
+    return path
+
+
+def _filter_banks(recordings: Sequence[Recording], slow_filters: Filters,
+                  fast_filters: Filters,
+                  kwargs: Dict) -> Dict[float, Tuple[FilterBank, FilterBank]]:
+    """return the slow and fast banks by sampling rate of `recordings`,
+    removing the design parameters from `kwargs`"""
+    design = {key: kwargs.pop(key) for key in BANK_PARAMETERS
+              if key in kwargs}
+
+    def bank(filters: Filters, sampling_rate: float) -> FilterBank:
+        if isinstance(filters, FilterBank):
+            return filters
+        return FilterBank.from_series(filters, sampling_rate, **design)
+
+    return {sr: (bank(slow_filters, sr), bank(fast_filters, sr))
+            for sr in sorted({r.sampling_rate for r in recordings})}
+
+
+def run(recordings: Sequence[Recording], output: str, n_jobs: int = 1,
+        executor: Optional[Executor] = None, overwrite: bool = False, *,
+        slow_filters: Filters, fast_filters: Filters,
+        **kwargs) -> Iterator[Tuple[Recording, Union[Path, Exception]]]:
+    """yield recordings and the paths of their results as they complete
+
+    A recording that fails to load or to be analysed is yielded with the
+    raised exception instead of a path, and the others are processed
+    anyway.  Recordings with an existing result are skipped unless
+    `overwrite`.  Recordings with the same output path, e.g. files of the
+    same name from two directories, raise a ValueError before any is
+    processed.
+    The filters are designed once per sampling rate.  With one job, the
+    next recording is read in a background thread while the current one is
+    analysed.  With more jobs, or a given `executor`, each recording is
+    read and analysed by a worker process.
+
+    Parameters
+    ----------
+    recordings: sequence of Recording
+        see `find_recordings`.
+    output: str
+        directory of the results.
+    n_jobs: int, default=1
+        number of worker processes, -1 uses all CPUs.
+    executor: concurrent.futures.Executor, optional
+        pool to submit the recordings to.
+    overwrite: bool, default=False
+        recompute existing results.
+    slow_filters, fast_filters: FilterSeries or FilterBank
+        see `comodulogram`.
+    **kwargs:
+        passed on to `analyse`, i.e., the keyword arguments of
+        `comodulogram_metrics`.
+    """
+    _check_outputs(recordings, output)
+    todo = [recording for recording in recordings
+            if overwrite or not output_path(output, recording).exists()]
+    if not todo:
+        return
+    banks = _filter_banks(todo, slow_filters, fast_filters, kwargs)
+    if executor is None and n_jobs == 1:
+        with ThreadPoolExecutor(max_workers=1) as reader:
+            pending = reader.submit(load, todo[0])
+            for i, recording in enumerate(todo):
+                loading = pending
+                if i + 1 < len(todo):
+                    pending = reader.submit(load, todo[i+1])
+                try:
+                    result: Union[Path, Exception] = _process(
+                        recording, output, loading.result(),
+                        *banks[recording.sampling_rate], **kwargs)
+                except Exception as err:
+                    result = err
+                yield recording, result
+        return
+    own_executor = executor is None
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=None if n_jobs == -1
+                                       else n_jobs)
+    try:
+        futures = {executor.submit(_process, recording, output, None,
+                                   *banks[recording.sampling_rate], **kwargs):
+                   recording for recording in todo}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as err:
+                result = err
+            yield futures[future], result
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='phac', description='compute comodulograms of recordings')
+    parser.add_argument('inputs', nargs='+',
+                        help='recordings (.npy or raw binary), directories '
+                             'of recordings or .csv manifests')
+    parser.add_argument('-o', '--output', required=True,
+                        help='directory of the results')
+    parser.add_argument('--slow', nargs=3, type=float, required=True,
+                        metavar=('MIN', 'MAX', 'WIDTH'),
+                        help='FilterSeries of the phase bands')
+    parser.add_argument('--fast', nargs=3, type=float, required=True,
+                        metavar=('MIN', 'MAX', 'WIDTH'),
+                        help='FilterSeries of the amplitude bands')
+    parser.add_argument('-r', '--sampling-rate', type=float,
+                        help='in Hz, unless given by a manifest')
+    parser.add_argument('--dtype', default='float64',
+                        help='type of raw samples (default: float64)')
+    parser.add_argument('--num-channels', type=int,
+                        help='number of interleaved channels of raw samples')
+    parser.add_argument('--offset', type=int, default=0,
+                        help='header size of raw files in bytes')
+    parser.add_argument('--metrics', nargs='+', default=['modulation_index'],
+                        choices=METRICS)
+    parser.add_argument('--num-bins', type=int, default=18)
+    parser.add_argument('--engine', default='time', choices=['time', 'fft'])
+    parser.add_argument('--precision', default='double',
+                        choices=['double', 'single'])
+    parser.add_argument('--aggregator', default='median')
+    parser.add_argument('--multirate', action='store_true')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes, -1 for all CPUs')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='recompute existing results')
+    parser.add_argument('--version', action='version', version=__version__)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """run the `phac` console script, e.g.
+
+        phac recordings/ -r 1000 --slow 2 12 2 --fast 30 150 20 -o results/
+
+    Each recording gets a `ComodulogramResult` (one layer per metric) saved
+    to `<output>/<name>.npz` as soon as it is computed.  Recordings whose
+    result exists are skipped, so that an interrupted run resumes where it
+    stopped.  Recordings that fail are reported and the exit status is 1.
+    """
+    args = _parser().parse_args(argv)
+    try:
+        recordings = find_recordings(args.inputs, args.sampling_rate,
+                                     args.dtype, args.num_channels,
+                                     args.offset)
+    except ValueError as err:
+        print(f"phac: error: {err}", file=sys.stderr)
+        return 2
+    done = failed = 0
+    try:
+        for recording, result in run(
+                recordings, args.output, args.jobs, overwrite=args.overwrite,
+                slow_filters=FilterSeries(*args.slow),
+                fast_filters=FilterSeries(*args.fast), metrics=args.metrics,
+                num_bins=args.num_bins, aggregator=args.aggregator,
+                engine=args.engine, precision=args.precision,
+                multirate=args.multirate):
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"phac: error: {recording.path}: {result}",
+                      file=sys.stderr)
+            else:
+                done += 1
+                print(f"{recording.path} -> {result}")
+    except ValueError as err:
+        print(f"phac: error: {err}", file=sys.stderr)
+        return 2
+    print(f"{done} recordings processed, {failed} failed, "
+          f"{len(recordings) - done - failed} skipped")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
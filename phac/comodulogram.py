@@ -1,47 +1,179 @@
-import itertools
+from typing import TYPE_CHECKING, Dict, Optional, Sequence, Tuple, Union
+from concurrent.futures import Executor
 
 import numpy as np
-import pandas as pd
 
-from .signal import Signal
-from .metrics import _modulation_index
-from .util import indices_of_binned_phase
+from .metrics import METRICS, _modulation_index, pac_metrics
+from .util import phase_bin_codes
+from .aggregators import Aggregator, binned_aggregate
+from .filter_bank import FilterBank
 from .filter_series import FilterSeries
+from .parallel import parallel_binned_median
+from .profiling import stage, timed
+from .result import ComodulogramResult, _to_frame
 
+if TYPE_CHECKING:
+    import pandas as pd
 
+
+Filters = Union[FilterSeries, FilterBank]
+
+
+def _filter_bank(filters: Filters, sampling_rate: float,
+                 **kwargs) -> FilterBank:
+    """return `filters` if a `FilterBank`, otherwise the bank of the series
+    designed with `kwargs`"""
+    if not isinstance(filters, FilterBank):
+        return FilterBank.from_series(filters, sampling_rate, **kwargs)
+    try:
+        assert filters.sampling_rate == sampling_rate, \
+            f"filter bank of sampling rate {filters.sampling_rate} for " \
+            f"samples of sampling rate {sampling_rate}"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    return filters
+
+
+@stage('comodulogram.filter')
+def _codes_and_envelopes(samples: np.ndarray, sampling_rate: float,
+                         slow_filters: Filters, fast_filters: Filters,
+                         num_bins: int = 18, axis: int = -1,
+                         **kwargs) -> Tuple[np.ndarray, ...]:
+    """return band centers, slow-band bin codes and fast-band envelopes
+
+    Codes and envelopes have shape `(..., n_bands, n)` with channel axes
+    first and time last.
+    """
+    slow_bank = _filter_bank(slow_filters, sampling_rate, **kwargs)
+    fast_bank = _filter_bank(fast_filters, sampling_rate, **kwargs)
+    samples = np.moveaxis(samples, axis, -1)
+    # compute band-filtered phases of the slow component, (n_slow, ..., n)
+    phases = slow_bank.phase(samples)
+    # Compute bin codes from the phase signals
+    codes = np.moveaxis(
+        phase_bin_codes(phases, num_bins, validate=False), 0, -2)
+    del phases
+    # compute band-filtered amplitudes of the fast component, (n_fast, ..., n)
+    amps = np.moveaxis(fast_bank.envelope(samples), 0, -2)
+    return slow_bank.centers, fast_bank.centers, codes, amps
+
+
+@stage('comodulogram')
 def comodulogram(samples: np.ndarray, sampling_rate: float,
-                 slow_filters: FilterSeries,
-                 fast_filters: FilterSeries) -> pd.DataFrame:
-    assert isinstance(slow_filters, FilterSeries)
-    assert isinstance(fast_filters, FilterSeries)
-    signal = Signal(samples, sampling_rate)
-    # compute band-filtered phase of the slow component
-    phases_by_freq = {
-        band.center: signal.phase(band)
-        for band in slow_filters
-    }
-    # Compute bin indices from the phase signals
-    bin_idxs_by_freq = {
-        center_freq: indices_of_binned_phase(phase)
-        for center_freq, phase in phases_by_freq.items()
-    }
-    # compute band-filtered amplitudes of the fast component
-    amps_by_freq = {
-        band.center: signal.envelope(band)
-        for band in fast_filters
-    }
-    # Average fast-band amplitudes within slow-band phase bins
-    avg_amp_by_freqs = {
-        (f_slow, f_fast): np.array([np.median(amp[idx]) for idx in idxs])
-        for (f_slow, idxs), (f_fast, amp) in itertools.product(
-            bin_idxs_by_freq.items(), amps_by_freq.items()
-        )
-    }
-    # compute modulation indices from the average
-    mi = {
-        freqs: _modulation_index(amps)
-        for freqs, amps in avg_amp_by_freqs.items()
-    }
-    s = pd.Series(data=mi)
-    s.index.names = ['f_slow', 'f_fast']
-    return s.unstack('f_slow')
+                 slow_filters: Filters, fast_filters: Filters,
+                 num_bins: int = 18, engine: str = 'time',
+                 filter_shape: str = 'butter', n_jobs: int = 1,
+                 executor: Optional[Executor] = None, axis: int = -1,
+                 precision: str = 'double',
+                 aggregator: Aggregator = 'median',
+                 multirate: bool = False, as_frame: bool = True
+                 ) -> Union['pd.DataFrame', ComodulogramResult]:
+    """return modulation indices of all pairs of slow and fast bands
+
+    Parameters
+    ----------
+    samples: np.ndarray
+        the recording, with any number of channel axes.
+    sampling_rate: float
+        in Hz.
+    slow_filters, fast_filters: FilterSeries or FilterBank
+        bands of the phase and of the amplitude component.  A `FilterBank`
+        (e.g. from `FilterBank.load`) of `sampling_rate` is used as is, so
+        that repeated calls skip the filter design, whereas the banks of
+        `FilterSeries` are designed with `engine`, `filter_shape`,
+        `precision` and `multirate`.
+    num_bins: int, default=18
+        number of phase bins.
+    engine, filter_shape: str
+        see `Signal`.
+    precision: str, default='double'
+        'double' or 'single', see `Signal`.  Modulation indices are computed
+        in double precision from the binned medians.
+    aggregator: str or callable, default='median'
+        average of the amplitudes within phase bins, see
+        `aggregators.get_aggregator`.
+    multirate: bool, default=False
+        filter each band at a reduced sampling rate and interpolate phases
+        and envelopes back to the full rate, see `FilterBank`.
+    n_jobs: int, default=1
+        number of worker processes, -1 uses all CPUs.  With more than one
+        job, or a given `executor`, bands are processed in parallel over
+        shared memory (see `parallel.parallel_binned_median`).
+    executor: concurrent.futures.Executor, optional
+        pool to run the parallel computation on.
+    axis: int, default=-1
+        time axis of `samples`.
+
+    Returns
+    -------
+    pd.DataFrame with index `f_fast` and columns `f_slow`.  For multichannel
+    `samples`, the index is `(channel, f_fast)` with the flat (C-order) index
+    over the channel axes.  With `as_frame=False`, a `ComodulogramResult`
+    with the layer 'modulation_index' of shape `(..., n_slow, n_fast)`, which
+    does not need pandas.
+    """
+    kwargs = dict(engine=engine, filter_shape=filter_shape,
+                  precision=precision, multirate=multirate)
+    if n_jobs != 1 or executor is not None:
+        slow_bank = _filter_bank(slow_filters, sampling_rate, **kwargs)
+        fast_bank = _filter_bank(fast_filters, sampling_rate, **kwargs)
+        avg_amps = parallel_binned_median(np.moveaxis(samples, axis, -1),
+                                          slow_bank, fast_bank, num_bins,
+                                          n_jobs, executor, aggregator)
+        slow_centers, fast_centers = slow_bank.centers, fast_bank.centers
+    else:
+        slow_centers, fast_centers, codes, amps = _codes_and_envelopes(
+            samples, sampling_rate, slow_filters, fast_filters, num_bins,
+            axis, **kwargs)
+        # Average fast-band amplitudes within slow-band phase bins, shape
+        # (n_slow, n_fast, num_bins)
+        avg_amps = binned_aggregate(codes, amps, num_bins, aggregator)
+    # compute modulation indices from the average, (n_slow, n_fast)
+    with timed('comodulogram.modulation_index'):
+        mi = _modulation_index(avg_amps)
+    if not as_frame:
+        return ComodulogramResult(mi[None], slow_centers, fast_centers)
+    return _to_frame(mi, slow_centers, fast_centers)
+
+
+def comodulogram_metrics(samples: np.ndarray, sampling_rate: float,
+                         slow_filters: Filters, fast_filters: Filters,
+                         metrics: Sequence[str] = METRICS,
+                         num_bins: int = 18, axis: int = -1,
+                         aggregator: Aggregator = 'median',
+                         as_frame: bool = True, **kwargs
+                         ) -> Union[Dict[str, 'pd.DataFrame'],
+                                    ComodulogramResult]:
+    """return several coupling metrics of all pairs of slow and fast bands
+
+    Phases and envelopes are computed once and all metrics are computed
+    from them in one pass, see `metrics.pac_metrics`.
+
+    Parameters
+    ----------
+    slow_filters, fast_filters: FilterSeries or FilterBank
+        see `comodulogram`, the banks of `FilterSeries` are designed with
+        `kwargs` (`engine`, `filter_shape`, `precision`, `multirate`).
+    metrics: sequence of str, default=METRICS
+        see `metrics.pac_metrics`.
+    as_frame: bool, default=True
+        whether to return pd.DataFrame's or a `ComodulogramResult`.
+
+    Returns
+    -------
+    dict of pd.DataFrame's by metric, see `comodulogram`, or a
+    `ComodulogramResult` with one layer per metric.
+    """
+    slow_bank, fast_bank = (
+        _filter_bank(filters, sampling_rate, **kwargs)
+        for filters in (slow_filters, fast_filters))
+    samples = np.moveaxis(samples, axis, -1)
+    phases = np.moveaxis(slow_bank.phase(samples), 0, -2)
+    amps = np.moveaxis(fast_bank.envelope(samples), 0, -2)
+    values = pac_metrics(phases, amps, metrics, num_bins, aggregator,
+                         slow_bank)
+    if not as_frame:
+        return ComodulogramResult.from_layers(values, slow_bank.centers,
+                                              fast_bank.centers)
+    return {metric: _to_frame(x, slow_bank.centers, fast_bank.centers)
+            for metric, x in values.items()}
@@ -0,0 +1,17 @@
+import pytest
+import numpy as np
+from .models import sin_with_noise
+
+
+@pytest.fixture
+def make_samples():
+    """return a function of the duration in seconds (and `coupling`) that
+    returns the sampling rate and a reproducible `sin_with_noise` recording
+    with a 6 Hz rhythm modulating 40-90 Hz noise"""
+    def make(duration: float, coupling: float = 0.5):
+        sr = 256.0
+        t = np.arange(int(duration*sr))/sr
+        return sr, sin_with_noise(t, frequency=6.0, dphi=1.0,
+                                  band=(40.0, 90.0), coupling=coupling,
+                                  rng=np.random.default_rng(42))
+    return make
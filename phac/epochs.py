@@ -0,0 +1,172 @@
+from collections import namedtuple
+from typing import Tuple
+
+import numpy as np
+
+from .util import phase_bin_codes
+from .aggregators import Aggregator, binned_aggregate
+from .metrics import _nan_modulation_index
+from .signal import Signal
+from .comodulogram import Filters, _filter_bank
+from .pac import PACResult
+from .profiling import stage
+from .result import ComodulogramResult
+
+EpochedPACResult: Tuple = namedtuple(  # type: ignore
+    "EpochedPACResult", "time trials pooled"
+)
+
+
+def epoch_indices(events: np.ndarray, window: Tuple[float, float],
+                  sampling_rate: float, num_samples: int) -> np.ndarray:
+    """return sample indices of shape `(n_events, n_window)` of the epochs
+
+    Parameters
+    ----------
+    events: np.ndarray
+        sample indices of the events.
+    window: 2-tuple
+        start and end of the epochs in seconds relative to the events, e.g.
+        `(-0.5, 1.0)`.
+    sampling_rate: float
+        in Hz.
+    num_samples: int
+        length of the recording, all epochs must lie within.
+    """
+    events = np.asarray(events, dtype=np.int64).ravel()
+    start, stop = (int(round(t * sampling_rate)) for t in window)
+    try:
+        assert stop > start, f"empty window {window}"
+        assert events.size > 0, "no events"
+        assert events.min() + start >= 0 and \
+            events.max() + stop <= num_samples, \
+            f"epochs of window {window} exceed the recording " \
+            f"({num_samples} samples)"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    return events[:, None] + np.arange(start, stop)
+
+
+def _pac(codes: np.ndarray, phase: np.ndarray, envelope: np.ndarray,
+         num_bins: int, aggregator: Aggregator) -> PACResult:
+    """return the `PACResult` of the last axis of codes, phase and envelope,
+    `nan` where a phase bin is empty"""
+    phi_avg = binned_aggregate(codes[..., None, :], phase[..., None, :],
+                               num_bins, aggregator)[..., 0, 0, :]
+    env_avg = binned_aggregate(codes[..., None, :], envelope[..., None, :],
+                               num_bins, aggregator)[..., 0, 0, :]
+    mi = _nan_modulation_index(env_avg)
+    mpc = (env_avg * np.exp(1.0j*phi_avg)).mean(axis=-1)
+    return PACResult(modulation_index=mi, mean_phase_coherence=mpc)
+
+
+def _pooled(x: np.ndarray) -> np.ndarray:
+    """return epochs `(..., n_events, n_window)` concatenated in time"""
+    return x.reshape(x.shape[:-2] + (-1,))
+
+
+@stage('epoched_phase_amplitude_coupling')
+def epoched_phase_amplitude_coupling(signal: Signal, events: np.ndarray,
+                                     window: Tuple[float, float],
+                                     slow_band: Tuple[float, float],
+                                     fast_band: Tuple[float, float],
+                                     num_bins: int = 12,
+                                     aggregator: Aggregator = 'median'
+                                     ) -> EpochedPACResult:
+    """return modulation index and mean phase coherence of epochs
+
+    Phase and envelope of the continuous recording are computed once (and
+    cached by `signal`), and all epochs are gathered from them with one
+    index, so that epochs are free of filter edge effects.
+
+    Parameters
+    ----------
+    signal: Signal
+        the continuous recording.
+    events, window:
+        see `epoch_indices`.
+    slow_band, fast_band: 2-tuples
+        band edges of the phase and the amplitude component.
+    num_bins: int, default=12
+        number of phase bins.
+    aggregator: str or callable, default='median'
+        see `aggregators.get_aggregator`.
+
+    Returns
+    -------
+    EpochedPACResult with the times of the window in seconds, the
+    `PACResult` of each trial, of shape `(..., n_events)` where `...` are
+    the channel axes, and the `PACResult` of all trials pooled, of shape
+    `(...)`.  Trials too short to populate all phase bins get `nan`
+    values, which do not affect the pooled result.
+    """
+    phase = np.moveaxis(signal.phase(slow_band), signal.axis, -1)
+    envelope = np.moveaxis(signal.envelope(fast_band), signal.axis, -1)
+    indices = epoch_indices(events, window, signal.sampling_rate,
+                            phase.shape[-1])
+    phase, envelope = phase[..., indices], envelope[..., indices]
+    codes = phase_bin_codes(phase, num_bins, validate=False)
+    trials = _pac(codes, phase, envelope, num_bins, aggregator)
+    pooled = _pac(_pooled(codes), _pooled(phase), _pooled(envelope),
+                  num_bins, aggregator)
+    time = (indices[0] - indices[0, 0]) / signal.sampling_rate + window[0]
+    return EpochedPACResult(time, trials, pooled)
+
+
+@stage('epoched_comodulogram')
+def epoched_comodulogram(signal: Signal, events: np.ndarray,
+                         window: Tuple[float, float],
+                         slow_filters: Filters, fast_filters: Filters,
+                         num_bins: int = 18,
+                         aggregator: Aggregator = 'median'
+                         ) -> EpochedPACResult:
+    """return modulation indices of all pairs of bands in epochs
+
+    All bands of the continuous recording are filtered once, and epochs are
+    gathered from the phases and envelopes.
+
+    Parameters
+    ----------
+    slow_filters, fast_filters: FilterSeries or FilterBank
+        bands of the phase and of the amplitude component.  The banks of
+        `FilterSeries` are designed with the engine, filter shape, precision
+        and multirate mode of `signal`, a `FilterBank` of the sampling rate
+        of `signal` is used as is.
+    num_bins: int, default=18
+        number of phase bins.
+    signal, events, window, aggregator:
+        see `epoched_phase_amplitude_coupling`.
+
+    Returns
+    -------
+    EpochedPACResult with the times of the window in seconds, and
+    `ComodulogramResult`s of the trials, of shape `(1, ..., n_events,
+    n_slow, n_fast)`, and of all trials pooled, of shape `(1, ..., n_slow,
+    n_fast)`.  Pairs with an empty phase bin in a trial are `nan` in that
+    trial only.
+    """
+    slow_bank, fast_bank = (
+        _filter_bank(filters, signal.sampling_rate, engine=signal.engine,
+                     filter_shape=signal.filter_shape,
+                     precision=signal.precision, multirate=signal.multirate)
+        for filters in (slow_filters, fast_filters))
+    samples = signal.samples
+    indices = epoch_indices(events, window, signal.sampling_rate,
+                            samples.shape[-1])
+    # (n_bands, ..., n) -> (..., n_events, n_bands, n_window)
+    codes = np.moveaxis(phase_bin_codes(
+        slow_bank.phase(samples)[..., indices], num_bins, validate=False),
+        0, -2)
+    amps = np.moveaxis(fast_bank.envelope(samples)[..., indices], 0, -2)
+    trials = _nan_modulation_index(
+        binned_aggregate(codes, amps, num_bins, aggregator))
+    pooled = _nan_modulation_index(binned_aggregate(
+        _pooled(np.swapaxes(codes, -3, -2)),
+        _pooled(np.swapaxes(amps, -3, -2)), num_bins, aggregator))
+    time = (indices[0] - indices[0, 0]) / signal.sampling_rate + window[0]
+    return EpochedPACResult(
+        time,
+        ComodulogramResult(trials[None], slow_bank.centers,
+                           fast_bank.centers),
+        ComodulogramResult(pooled[None], slow_bank.centers,
+                           fast_bank.centers))
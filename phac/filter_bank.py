@@ -0,0 +1,209 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy import fft as _fft
+
+from .hilbert import hilbert
+from .spectral import band_analytic
+from .util import (_bandpass, _dtypes, _wrap_phase, _zero_phase,
+                   analytic_phase, decimate, decimation_factor, interpolate,
+                   is_stable)
+from .frequency_band import FrequencyBand
+from .filter_series import FilterSeries
+
+
+def _decimated(levels: Dict[int, np.ndarray], factor: int) -> np.ndarray:
+    """return samples decimated by a power of two `factor`, adding the
+    missing intermediate factors to `levels`"""
+    if factor not in levels:
+        levels[factor] = decimate(_decimated(levels, factor // 2), 2)
+    return levels[factor]
+
+
+class FilterBank:
+    """band-pass filters designed together and applied in one pass
+
+    All filters of the bank are designed when the bank is constructed.
+    Filtering a recording returns the stacked `(n_bands, ..., n_samples)`
+    array of filtered signals, from which analytic signals, phases and
+    envelopes are computed with a single batched Hilbert transform.
+
+    Parameters
+    ----------
+    bands: iterable of 2-tuples
+        band edges (left, right) in Hz.
+    sampling_rate: float
+        sampling rate in Hz of the recordings the bank is applied to.
+    engine: str, default='time'
+        'time' or 'fft', see `Signal`.  With 'fft' the spectrum of a recording
+        is computed once and shared by all bands.
+    filter_shape: str, default='butter'
+        shape of the band-pass of the 'fft' engine.
+    precision: str, default='double'
+        'double' or 'single', the precision of filtered (`dtype`) and analytic
+        (`complex_dtype`) signals, see `Signal`.
+    sos: np.ndarray, optional
+        precomputed second-order sections of the Butterworth band-passes,
+        shape `(n_bands, n_sections, 6)`.  By default they are designed from
+        `bands` and `sampling_rate`.  See `save` and `load`.
+    multirate: bool, default=False
+        with the 'time' engine, filter each band at the sampling rate
+        reduced by `factors` (see `util.decimation_factor`).  The recording
+        is decimated once per factor and shared by all bands, and analytic
+        signals are interpolated back to the full rate.  Away from the edges
+        of the recording, phases of a band dominated by an oscillation stay
+        within 0.05 rad and envelopes within 5% of the full-rate path, and
+        modulation indices of `comodulogram` within 10% of the largest one.
+    """
+
+    def __init__(self, bands: Iterable[Tuple[float, float]],
+                 sampling_rate: float, engine: str = 'time',
+                 filter_shape: str = 'butter', precision: str = 'double',
+                 sos: Optional[np.ndarray] = None, multirate: bool = False):
+        from .signal import ENGINES
+        try:
+            assert engine in ENGINES, \
+                f"engine ({engine}) must be one of {ENGINES}"
+        except AssertionError as err:
+            raise ValueError(str(err))
+        self.engine = engine
+        self.filter_shape = filter_shape
+        self.precision = precision
+        self.dtype, self.complex_dtype = _dtypes(precision)
+        self.bands: List[FrequencyBand] = [
+            FrequencyBand(*band) for band in bands
+        ]
+        self.sampling_rate = sampling_rate
+        self.multirate = multirate
+        self.factors = [
+            decimation_factor(sampling_rate, band.right)
+            if multirate and engine == 'time' else 1
+            for band in self.bands
+        ]
+        if sos is None:
+            # each design is checked for stability
+            self.sos = np.array([
+                _bandpass(sampling_rate / factor, tuple(band))
+                for band, factor in zip(self.bands, self.factors)
+            ]).reshape(len(self.bands), -1, 6)
+            return
+        sos = np.asarray(sos, dtype=np.float64)
+        try:
+            assert sos.ndim == 3 and sos.shape[::2] == (len(self.bands), 6), \
+                f"sos of shape {sos.shape} for {len(self.bands)} bands"
+            assert is_stable(sos), "sos of unstable filters"
+        except AssertionError as err:
+            raise ValueError(str(err))
+        self.sos = sos
+
+    @classmethod
+    def from_series(cls, series: FilterSeries, sampling_rate: float,
+                    **kwargs):
+        return cls(series, sampling_rate, **kwargs)
+
+    def select(self, indices: Iterable[int]):
+        """return a bank with the bands at `indices`"""
+        indices = list(indices)
+        return type(self)([self.bands[i] for i in indices],
+                          self.sampling_rate, engine=self.engine,
+                          filter_shape=self.filter_shape,
+                          precision=self.precision,
+                          sos=self.sos[indices], multirate=self.multirate)
+
+    def save(self, path: str) -> None:
+        """write bands, settings and filter sections to an `.npz` file"""
+        np.savez(path, bands=np.array(self.bands, dtype=np.float64),
+                 sampling_rate=self.sampling_rate, engine=self.engine,
+                 filter_shape=self.filter_shape, precision=self.precision,
+                 sos=self.sos, multirate=self.multirate)
+
+    @classmethod
+    def load(cls, path: str, **kwargs):
+        """return the bank saved at `path` without designing its filters
+
+        `kwargs` override the saved `engine`, `filter_shape` or `precision`.
+        """
+        with np.load(path) as data:
+            settings: Dict[str, Any] = dict(
+                engine=str(data['engine']),
+                filter_shape=str(data['filter_shape']),
+                precision=str(data['precision']))
+            settings.update(kwargs)
+            # the sections are designed for the rates of `multirate`
+            settings['multirate'] = 'multirate' in data and \
+                bool(data['multirate'])
+            return cls([tuple(band) for band in data['bands']],
+                       float(data['sampling_rate']), sos=data['sos'],
+                       **settings)
+
+    def __len__(self) -> int:
+        return len(self.bands)
+
+    @property
+    def centers(self) -> np.ndarray:
+        return np.array([band.center for band in self.bands])
+
+    def filtered(self, x: np.ndarray) -> np.ndarray:
+        """return `x` filtered with each band, stacked along a new axis 0"""
+        if self.engine == 'fft' or self.multirate:
+            return np.real(self.analytic(x))
+        ans = np.empty((len(self),) + x.shape, dtype=self.dtype)
+        for i, sos in enumerate(self.sos):
+            ans[i] = _zero_phase(sos, x, axis=-1)
+        return ans
+
+    def analytic(self, x: np.ndarray,
+                 levels: Optional[Dict[int, np.ndarray]] = None) -> np.ndarray:
+        """return analytic signals of all bands, shape `(n_bands,)+x.shape`"""
+        if self.engine == 'fft':
+            spectrum = _fft.fft(x.astype(self.dtype, copy=False), axis=-1)
+            ans = np.empty((len(self),) + x.shape, dtype=self.complex_dtype)
+            for i, band in enumerate(self.bands):
+                ans[i] = band_analytic(spectrum, self.sampling_rate, band,
+                                       self.filter_shape)
+            return ans
+        if self.multirate:
+            ans = np.empty((len(self),) + x.shape, dtype=self.complex_dtype)
+            for i, factor, envelope, phase in self._multirate(x, levels):
+                n = x.shape[-1]
+                ans[i] = np.maximum(interpolate(envelope, factor, n), 0.0) \
+                    * np.exp(1j*interpolate(phase, factor, n))
+            return ans
+        return hilbert(self.filtered(x))
+
+    def _multirate(self, x: np.ndarray,
+                   levels: Optional[Dict[int, np.ndarray]] = None
+                   ) -> Iterator[Tuple]:
+        """yield index, decimation factor, envelope and unwrapped phase of
+        each band at its reduced rate
+
+        Envelope and unwrapped phase vary slowly compared to the reduced rate,
+        so that they are interpolated linearly to the full rate.  `levels`
+        holds the decimated samples by factor and may be shared by banks.
+        """
+        levels = {} if levels is None else levels
+        levels[1] = x
+        for i, (sos, factor) in enumerate(zip(self.sos, self.factors)):
+            analytic = hilbert(_zero_phase(sos, _decimated(levels, factor)))
+            yield i, factor, np.abs(analytic), np.unwrap(np.angle(analytic))
+
+    def phase(self, x: np.ndarray) -> np.ndarray:
+        if not self.multirate:
+            return analytic_phase(self.analytic(x))
+        ans = np.empty((len(self),) + x.shape, dtype=self.dtype)
+        for i, factor, _, phase in self._multirate(x):
+            phase = np.mod(interpolate(phase, factor, x.shape[-1]) + np.pi/2,
+                           2*np.pi)
+            ans[i] = _wrap_phase(phase.astype(self.dtype, copy=False))
+        return ans
+
+    def envelope(self, x: np.ndarray) -> np.ndarray:
+        if not self.multirate:
+            return np.abs(self.analytic(x))
+        ans = np.empty((len(self),) + x.shape, dtype=self.dtype)
+        for i, factor, envelope, _ in self._multirate(x):
+            # linear extrapolation beyond the last decimated sample may
+            # undershoot
+            ans[i] = np.maximum(interpolate(envelope, factor, x.shape[-1]),
+                                0.0)
+        return ans
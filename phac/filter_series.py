@@ -22,10 +22,23 @@ class FilterSeries(_FilterSeries):
     def df(self) -> float:
         return self.width/2
 
+    def __getnewargs__(self):
+        # the fields, since iterating yields the bands
+        return self.min, self.max, self.width
+
     def __iter__(self):
         for f0 in np.arange(self.min, self.max, self.df/self._resolution):
             yield FrequencyBand(f0-self.df, f0+self.df)
 
+    def filter_bank(self, sampling_rate: float, **kwargs):
+        """return a `FilterBank` of the bands, designed once
+
+        `kwargs` are passed on to `FilterBank`.  Save the bank with
+        `FilterBank.save` to reuse its filters in other processes and runs.
+        """
+        from .filter_bank import FilterBank
+        return FilterBank(self, sampling_rate, **kwargs)
+
     @classmethod
     def from_equidistant_list(cls, x: List[float]):
         return cls(x[0], x[-1], 2*(x[1]-x[0]))
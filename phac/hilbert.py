@@ -1,54 +1,148 @@
+from typing import Optional
+
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft as _fft
+
+from .util import trapezoid
+from .profiling import stage
+
+# rough peak memory per sample and band of filtering and Hilbert transform
+_BYTES_PER_SAMPLE = 128
+
+
+def _overlap_add(frames: np.ndarray, step: int, n: int) -> np.ndarray:
+    """return the sum of `frames` (..., k, m) placed every `step` samples
+
+    Consecutive frames may overlap by less than `step` samples.
+    """
+    k, m = frames.shape[-2:]
+    lead = frames.shape[:-2]
+    ans = np.zeros(lead + (max(n, (k+1)*step),), dtype=frames.dtype)
+    ans[..., :k*step].reshape(lead + (k, step))[...] = frames[..., :step]
+    ans[..., step:(k+1)*step].reshape(lead + (k, step))[..., :m-step] += \
+        frames[..., step:]
+    return ans[..., :n]
+
 
-from .util import trapezoid, _hilbert
+def _analytic_segments(frames: np.ndarray,
+                       workers: Optional[int] = None) -> np.ndarray:
+    """return analytic signals of `frames` along the last axis in one batch
 
+    Same as `scipy.signal.hilbert`, but with the real-input FFT and without
+    materializing the negative frequencies.  Single-precision frames yield
+    single-precision analytic signals.
+    """
+    n = frames.shape[-1]
+    npos = n//2 + 1
+    ans = np.zeros(frames.shape,
+                   dtype=np.result_type(frames.dtype, np.complex64))
+    ans[..., :npos] = _fft.rfft(frames, axis=-1, workers=workers)
+    ans[..., 1:(n+1)//2] *= 2.0
+    return _fft.ifft(ans, axis=-1, overwrite_x=True, workers=workers)
 
-class SegmentedSignal:
 
-    def __init__(self, nsegment: int, noverlap: int, n: int = None,
-                 arr: np.ndarray = None, dtype=np.float64):
-        self.arr = np.zeros(n, dtype=dtype) if arr is None else arr
-        self.nsegment = nsegment
-        self.noverlap = noverlap
+def overlap_for_tolerance(period: Optional[float], tolerance: float) -> int:
+    """return the overlap bounding the error of `hilbert` by `tolerance`
 
-    @property
-    def size(self) -> int:
-        return self.arr.size
+    Cutting a signal at a segment boundary perturbs its Hilbert transform
+    at distance `d` from the boundary by at most about `period/(2 pi^2 d)`
+    times the amplitude, where `period` (in samples) is that of the slowest
+    component of the signal.  Segments are cross-faded with linear ramps of
+    `noverlap` samples, which weight this error with `d/(noverlap+1)`, so
+    that both segments together deviate by at most
+    `period/(pi^2 (noverlap+1))` from the unsegmented transform.
+    """
+    try:
+        assert period is not None and period > 0, \
+            f"period ({period}) must be positive"
+        assert tolerance > 0, f"tolerance ({tolerance}) must be positive"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    return max(int(np.ceil(period / (np.pi**2 * tolerance))), 1)
 
-    @property
-    def segment_minus_overlap(self) -> int:
-        return self.nsegment-self.noverlap
 
-    @property
-    def num_segments(self) -> int:
-        return int(np.ceil(self.size/self.segment_minus_overlap))
+@stage('hilbert')
+def hilbert(arr, nsegment: int = 16384, noverlap: int = 1024,
+            tolerance: Optional[float] = None, period: Optional[float] = None,
+            workers: Optional[int] = None) -> np.ndarray:
+    """return analytic signal of `arr` along its last axis
 
-    def segment(self, n: int) -> np.ndarray:
-        m = n*self.segment_minus_overlap
-        return self.arr[m:m+self.nsegment]
+    The signal is cut into segments of `nsegment` samples, which overlap by
+    `noverlap` samples.  All segments are transformed with one batched FFT
+    and cross-faded with the ramps of `util.trapezoid`.  The first segment
+    is kept up to the beginning and the last segment, aligned with the end
+    of the signal, up to the end.  Signals shorter than `nsegment` are
+    transformed as a whole.
 
-    def add_to_segment(self, n: int, arr: np.ndarray):
-        m = n*self.segment_minus_overlap
-        self.arr[m:m+self.nsegment] += arr
+    Parameters
+    ----------
+    arr: np.ndarray
+        real signal, time along the last axis.
+    nsegment: int, default=16384
+        length of the segments.
+    noverlap: int, default=1024
+        overlap of consecutive segments.
+    tolerance: float, optional
+        bound on the deviation from the unsegmented transform relative to the
+        amplitude of the signal, away from its ends (where the unsegmented
+        transform suffers from the circular FFT itself).  Requires `period`
+        and overrides `noverlap` (see `overlap_for_tolerance`); `nsegment` is
+        increased to at least eight times the overlap.
+    period: float, optional
+        longest period (in samples) of the signal, e.g., `sampling_rate /
+        fmin` for a band-passed signal.
+    workers: int, optional
+        number of threads of the FFT, see `scipy.fft.fft`.
 
+    Returns
+    -------
+    np.ndarray, complex64 for float32 `arr`, complex128 otherwise.
+    """
+    if tolerance is not None:
+        noverlap = overlap_for_tolerance(period, tolerance)
+        nsegment = max(nsegment, 2**int(np.ceil(np.log2(8*noverlap))))
+    n = arr.shape[-1]
+    if n <= nsegment:
+        return _analytic_segments(arr, workers)
 
-def hilbert(arr, nsegment: int = 8192, noverlap: int = 1024) -> np.ndarray:
-    # If size is smaller then segmentation size ..
-    if arr.size < nsegment:
-        return _hilbert(arr)
+    step = nsegment - noverlap
+    window = trapezoid(nsegment, noverlap,
+                       dtype=np.result_type(arr.dtype, np.float32))
+    frames = sliding_window_view(arr, nsegment, axis=-1)[..., ::step, :]
+    num_regular = frames.shape[-2]
+    # unless the regular segments cover the signal exactly, a last segment
+    # is aligned with its end
+    aligned = (n - nsegment) % step == 0
+    if not aligned:
+        frames = np.concatenate([frames, arr[..., None, -nsegment:]], axis=-2)
+    analytic = _analytic_segments(frames, workers)
+    # the first segment is not faded in, the last one not faded out
+    analytic[..., 1:, :noverlap] *= window[:noverlap]
+    analytic[..., :-1, -noverlap:] *= window[-noverlap:]
+    ans = _overlap_add(analytic[..., :num_regular, :], step, n)
+    if not aligned:
+        # the last segment overlaps irregularly, normalize by the weights
+        weights = np.tile(window, (num_regular, 1))
+        weights[0, :noverlap] = 1.0
+        last = np.ones(nsegment, dtype=window.dtype)
+        last[:noverlap] = window[:noverlap]
+        ans[..., -nsegment:] += analytic[..., -1, :]
+        ans[..., -nsegment:] /= _overlap_add(weights, step, n)[-nsegment:] \
+            + last
+    return ans
 
-    arr = SegmentedSignal(nsegment, noverlap, arr=arr)
-    ans = SegmentedSignal(nsegment, noverlap, n=arr.size, dtype=np.complex)
-    trapz = trapezoid(nsegment, noverlap)
 
-    # first segment is not cut in the beginning
-    segment = _hilbert(arr.segment(0))
-    segment[noverlap:] *= trapz[noverlap:]
-    ans.add_to_segment(0, segment)
-    # rest of the segments are treated  as regular (This is not 100% correct
-    # for the last segment where special cases should be treated.)
-    for i in range(1, arr.num_segments):
-        transformed = _hilbert(arr.segment(i))
-        ans.add_to_segment(i, trapz[:transformed.size]*transformed)
+def segment_length(memory_budget: int, num_bands: int = 1) -> int:
+    """return the segment length fitting `num_bands` bands into the budget
 
-    return ans.arr
+    The length is the largest power of two for which the estimated peak
+    memory of filtering and Hilbert transforming a segment stays below
+    `memory_budget` (in bytes).
+    """
+    n = memory_budget // (_BYTES_PER_SAMPLE * num_bands)
+    try:
+        assert n >= 64, "memory budget of %s bytes too small" % memory_budget
+    except AssertionError as err:
+        raise ValueError(str(err))
+    return 2**int(np.log2(n))
@@ -1,33 +1,40 @@
+from typing import Dict, Optional, Sequence, Tuple
+
 import numpy as np
 
-from .util import indices_of_binned_phase
+from .util import _wrap_phase, phase_bin_codes
+from .aggregators import Aggregator, binned_aggregate
 
 _SMALL = 1e-9
 
+METRICS = ('modulation_index', 'mean_vector_length', 'phase_locking_value',
+           'height_ratio', 'glm')
+
 
-def normalize(x: np.ndarray) -> np.ndarray:
+def normalize(x: np.ndarray, axis: Optional[int] = None) -> np.ndarray:
     x = x.astype(np.float64)
     try:
         assert np.all(x >= 0.0), "values must be positive semi-definite."
-        s = x.sum()
-        assert s > 0.0, "sum must be positive."
+        s = x.sum(axis=axis, keepdims=True)
+        assert np.all(s > 0.0), "sum must be positive."
         return x / s
     except AssertionError as err:
         raise ValueError(str(err))
 
 
-def shannon_entropy(P: np.ndarray) -> float:
+def shannon_entropy(P: np.ndarray, axis: Optional[int] = None) -> float:
     try:
         assert np.all(P >= 0.0), "probability must be positive semi-definite."
         assert np.all(P <= 1.0), "probability must be smaller than 1."
-        assert np.abs(P.sum() - 1) < _SMALL, "sum must be exactly 1."
+        assert np.all(np.abs(P.sum(axis=axis) - 1) < _SMALL), \
+            "sum must be exactly 1."
     except AssertionError as err:
         raise ValueError(str(err))
     P = P.astype(np.float64)
-    return -np.sum(P*np.log(P+_SMALL))
+    return -np.sum(P*np.log(P+_SMALL), axis=axis)
 
 
-def _modulation_index(average_amplitudes: np.ndarray) -> float:
+def _modulation_index(average_amplitudes: np.ndarray) -> np.ndarray:
     """return modulation index
 
     The modulation index is defined as the normalized KL distance between
@@ -44,6 +51,8 @@ def _modulation_index(average_amplitudes: np.ndarray) -> float:
     ----------
     average_amplitudes: np.ndarray
         array of amplitude averages binned conditional on phase sections.
+        Bins are along the last axis, the modulation index is computed for
+        each element of the leading axes.
     """
     average_amplitudes = average_amplitudes.astype(np.float64)
     try:
@@ -52,12 +61,21 @@ def _modulation_index(average_amplitudes: np.ndarray) -> float:
     except AssertionError as err:
         raise ValueError(str(err))
     # normalize to something probability-like
-    P = normalize(average_amplitudes)
+    P = normalize(average_amplitudes, axis=-1)
     # computed KL distance: log(N)-H(P), and normalize with log(N)
-    return 1.0 - shannon_entropy(P) / np.log(P.size)
+    return 1.0 - shannon_entropy(P, axis=-1) / np.log(P.shape[-1])
+
 
+def _nan_modulation_index(average_amplitudes: np.ndarray) -> np.ndarray:
+    """return `_modulation_index`, `nan` where a phase bin is empty (`nan`)"""
+    empty = np.any(np.isnan(average_amplitudes), axis=-1)
+    mi = _modulation_index(
+        np.where(empty[..., None], 1.0, average_amplitudes))
+    return np.where(empty, np.nan, mi)
 
-def modulation_index(phase: np.ndarray, amplitude: np.ndarray) -> float:
+
+def modulation_index(phase: np.ndarray, amplitude: np.ndarray,
+                     aggregator='median') -> float:
     """return modulation index
 
     The modulation index is defined as the normalized KL distance between
@@ -76,11 +94,13 @@ def modulation_index(phase: np.ndarray, amplitude: np.ndarray) -> float:
         array of phase values
     amplitude: np.ndarray
         array of amplitude values
+    aggregator: str or callable, default='median'
+        average of the amplitudes within phase bins, see
+        `aggregators.get_aggregator`.
     """
-    indices = indices_of_binned_phase(phase, num_bins=12)
-    avg_amps = np.array([np.median(amplitude[idx]) for idx in indices],
-                        dtype=np.float64)
-    return _modulation_index(avg_amps)
+    codes = phase_bin_codes(phase, num_bins=12)
+    avg_amps = binned_aggregate(codes, amplitude, 12, aggregator)[0, 0]
+    return float(_modulation_index(avg_amps))
 
 
 def mean_phase_coherence(phase: np.ndarray, amplitude: np.ndarray) -> float:
@@ -97,3 +117,129 @@ def mean_phase_coherence(phase: np.ndarray, amplitude: np.ndarray) -> float:
     """
     z = amplitude * np.exp(1.0j*phase)
     return np.abs(np.mean(z))
+
+
+def _glm_r2(cos_sin: Tuple[np.ndarray, np.ndarray], amplitude_sums: np.ndarray,
+            amplitude: np.ndarray) -> np.ndarray:
+    """return the variance of the amplitudes explained by `cos` and `sin` of
+    the phases
+
+    The normal equations of the regression on `(cos, sin, 1)` are built from
+    sums shared with the mean vector length.
+    """
+    n = amplitude.shape[-1]
+    cos, sin = cos_sin
+    # Gram matrices of the regressors, (..., n_slow, 3, 3)
+    gram = np.empty(cos.shape[:-1] + (3, 3))
+    gram[..., 0, 0] = np.sum(cos*cos, axis=-1)
+    gram[..., 1, 1] = np.sum(sin*sin, axis=-1)
+    gram[..., 0, 1] = gram[..., 1, 0] = np.sum(cos*sin, axis=-1)
+    gram[..., 0, 2] = gram[..., 2, 0] = np.sum(cos, axis=-1)
+    gram[..., 1, 2] = gram[..., 2, 1] = np.sum(sin, axis=-1)
+    gram[..., 2, 2] = n
+    # (..., n_slow, n_fast, 3)
+    total = np.sum(amplitude, axis=-1)[..., None, :]
+    rhs = np.stack([amplitude_sums.real, amplitude_sums.imag,
+                    np.broadcast_to(total, amplitude_sums.shape)], axis=-1)
+    beta = np.linalg.solve(gram[..., None, :, :], rhs[..., None])[..., 0]
+    explained = np.sum(beta*rhs, axis=-1) - total**2/n
+    variance = np.sum(amplitude**2, axis=-1)[..., None, :] - total**2/n
+    return explained / variance
+
+
+def _envelope_plv(phasors: np.ndarray, amplitude: np.ndarray,
+                  slow_bank) -> np.ndarray:
+    """return phase locking values of `phasors` `(..., n_slow, n)` and the
+    phases of `amplitude` `(..., n_fast, n)` in each band of `slow_bank`
+
+    The amplitudes are filtered one slow band at a time.
+    """
+    lead = np.broadcast_shapes(phasors.shape[:-2], amplitude.shape[:-2])
+    ans = np.empty(lead + (phasors.shape[-2], amplitude.shape[-2]))
+    for i in range(phasors.shape[-2]):
+        amplitude_phase = slow_bank.select([i]).phase(amplitude)[0]
+        ans[..., i, :] = np.abs(
+            np.exp(-1.0j*amplitude_phase) @ phasors[..., i, :, None]
+        )[..., 0] / amplitude.shape[-1]
+    return ans
+
+
+def pac_metrics(phase: np.ndarray, amplitude: np.ndarray,
+                metrics: Sequence[str] = METRICS, num_bins: int = 18,
+                aggregator: Aggregator = 'median',
+                slow_bank=None) -> Dict[str, np.ndarray]:
+    """return coupling metrics of all pairs of phase and amplitude signals
+
+    Intermediates are computed once and shared: the phase bin codes and
+    binned amplitudes by 'modulation_index' (Tort et al., 2010) and
+    'height_ratio' (Lakatos et al., 2005), and the amplitude-weighted sums
+    of `exp(i*phase)` by 'mean_vector_length' (Canolty et al., 2006) and
+    'glm', the variance of the amplitudes explained by a regression on the
+    cosine and sine of the phase (Penny et al., 2008).  The
+    'phase_locking_value' is that of the phases and the phases of the
+    amplitudes band-passed in the same slow band (Cohen, 2008), which
+    needs the filters `slow_bank` of the phases.
+
+    Parameters
+    ----------
+    phase: np.ndarray
+        phases of shape `(..., n_slow, n)` or `(n,)`, in radians.  They are
+        wrapped into [0, 2*pi) for binning, so that e.g. phases of
+        `np.angle` in [-pi, pi) can be passed.
+    amplitude: np.ndarray
+        amplitude envelopes of shape `(..., n_fast, n)` or `(n,)`.  Leading
+        axes are broadcast against those of `phase`.
+    metrics: sequence of str, default=METRICS
+        the metrics to compute.
+    num_bins: int, default=18
+        number of phase bins.
+    aggregator: str or callable, default='median'
+        average of the amplitudes within phase bins, see
+        `aggregators.get_aggregator`.
+    slow_bank: FilterBank, optional
+        the `n_slow` bands of `phase`, from which phases are computed with
+        `FilterBank.phase`.  Required for 'phase_locking_value'.
+
+    Returns
+    -------
+    dict of arrays of shape `(..., n_slow, n_fast)` by metric.
+    """
+    unknown = set(metrics) - set(METRICS)
+    try:
+        assert not unknown, f"metrics {sorted(unknown)} not in {METRICS}"
+        assert slow_bank is not None or \
+            'phase_locking_value' not in metrics, \
+            "phase_locking_value needs the slow_bank of the phases"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    phase = np.atleast_2d(phase)
+    if not np.issubdtype(phase.dtype, np.floating):
+        phase = phase.astype(np.float64)
+    amplitude = np.atleast_2d(amplitude).astype(np.float64, copy=False)
+    n = phase.shape[-1]
+    ans: Dict[str, np.ndarray] = {}
+    if {'modulation_index', 'height_ratio'} & set(metrics):
+        # the bin codes are computed without checking the range
+        phase = _wrap_phase(phase)
+        codes = phase_bin_codes(phase, num_bins, validate=False)
+        avg = binned_aggregate(codes, amplitude, num_bins, aggregator)
+        if 'modulation_index' in metrics:
+            ans['modulation_index'] = _modulation_index(avg)
+        if 'height_ratio' in metrics:
+            highest = avg.max(axis=-1)
+            ans['height_ratio'] = (highest - avg.min(axis=-1)) / highest
+    if {'mean_vector_length', 'glm', 'phase_locking_value'} & set(metrics):
+        phase = phase.astype(np.float64, copy=False)
+        cos_sin = np.cos(phase), np.sin(phase)
+        if {'mean_vector_length', 'glm'} & set(metrics):
+            # sum_t a(t) exp(i*phi(t)), (..., n_slow, n_fast)
+            amplitude_t = np.swapaxes(amplitude, -1, -2)
+            sums = cos_sin[0] @ amplitude_t + 1.0j*(cos_sin[1] @ amplitude_t)
+            if 'mean_vector_length' in metrics:
+                ans['mean_vector_length'] = np.abs(sums) / n
+            if 'glm' in metrics:
+                ans['glm'] = _glm_r2(cos_sin, sums, amplitude)
+        if 'phase_locking_value' in metrics:
+            ans['phase_locking_value'] = _envelope_plv(
+                cos_sin[0] + 1.0j*cos_sin[1], amplitude, slow_bank)
+    return {metric: ans[metric] for metric in metrics}
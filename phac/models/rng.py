@@ -0,0 +1,14 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def standard_normal(shape: Tuple[int, ...],
+                    rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """return normal samples from `rng`, or from the global `np.random` state
+
+    The global state reproduces the samples of `np.random.seed`.
+    """
+    if rng is None:
+        return np.random.randn(*shape)
+    return rng.standard_normal(shape)
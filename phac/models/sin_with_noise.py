@@ -1,18 +1,28 @@
 import numpy as np
-from typing import Tuple
+from typing import Optional, Tuple
 from ..util import filtfilt
+from .rng import standard_normal
 
 
-def random_sin(t: np.ndarray, frequency: float, dphi: float) -> np.ndarray:
-    random_phase_walk = dphi * np.random.randn(t.size).cumsum()
+def _shape(n: int, size: Optional[int] = None) -> Tuple[int, ...]:
+    return (n,) if size is None else (size, n)
+
+
+def random_sin(t: np.ndarray, frequency: float, dphi: float,
+               rng: Optional[np.random.Generator] = None,
+               size: Optional[int] = None) -> np.ndarray:
+    random_phase_walk = dphi * standard_normal(
+        _shape(t.size, size), rng).cumsum(axis=-1)
     return np.sin(2.*np.pi*frequency*t + random_phase_walk)
 
 
-def filtered_noise(n: int, sr: float, band: Tuple[float, float]) -> np.ndarray:
-    """"""
-    x = np.random.randn(n)
-    x = filtfilt(x, sr, fmin=band[0], fmax=band[1])
-    x = x/np.std(x)
+def filtered_noise(n: int, sr: float, band: Tuple[float, float],
+                   rng: Optional[np.random.Generator] = None,
+                   size: Optional[int] = None) -> np.ndarray:
+    """return band-filtered white noise of unit variance"""
+    x = standard_normal(_shape(n, size), rng)
+    x = filtfilt(x, sr, fmin=band[0], fmax=band[1], axis=-1)
+    x = x/np.std(x, axis=-1, keepdims=True)
     return x
 
 
@@ -40,7 +50,9 @@ def validate_parameters(frequency, dphi, band, amplitude, coupling,
 def sin_with_noise(t: np.ndarray, frequency: float = 20.0,
                    dphi: float = 3.0, band: Tuple[float, float] = (50.0, 90.0),
                    amplitude: float = 0.5,
-                   coupling: float = 0.5) -> np.ndarray:
+                   coupling: float = 0.5,
+                   rng: Optional[np.random.Generator] = None,
+                   size: Optional[int] = None) -> np.ndarray:
     """
     Sinusoidal rhythm with modulated high-frequency noise have properties
 
@@ -58,14 +70,20 @@ def sin_with_noise(t: np.ndarray, frequency: float = 20.0,
         Amplitude of the filtered noise that is modulated.
     `coupling`: float
         in (0, 1).  How much of the noise is coupling into the signal
+    `rng`: np.random.Generator, optional
+        source of randomness.  By default, the global `np.random` state is
+        used.
+    `size`: int, optional
+        number of independent realizations.  If given, the result has shape
+        `(size, t.size)` and is generated in one pass.
     """
     sr = 1/(t[1]-t[0])
     validate_parameters(frequency, dphi, band, amplitude, coupling, sr)
     scaled_dphi = dphi*np.sqrt(1/sr)
-    x = random_sin(t, frequency, scaled_dphi)
-    dx = amplitude * filtered_noise(t.size, sr, band)
+    x = random_sin(t, frequency, scaled_dphi, rng, size)
+    dx = amplitude * filtered_noise(t.size, sr, band, rng, size)
     # compute normalized amplitude modulation (0 - 1)
-    modulation = x-x.min()
-    modulation /= modulation.max()
+    modulation = x-x.min(axis=-1, keepdims=True)
+    modulation /= modulation.max(axis=-1, keepdims=True)
     x += (1+(modulation-1)*coupling) * dx
     return x
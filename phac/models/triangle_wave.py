@@ -1,22 +1,44 @@
+from typing import Optional
+
 import numpy as np
 
+from .rng import standard_normal
 
-def square_wave(t: np.ndarray, frequency: float,
-                jitter: float, tilt: float) -> np.ndarray:
-    period = 1/frequency
-    y = np.zeros(t.shape[0])
-    for ti in np.arange(0, t[-1], period):
-        tti = ti + jitter*period*np.random.randn()
-        n0, n1 = t.searchsorted((tti, tti+period*tilt))
-        y[n0:n1] = 1.0
 
-    return y-y.mean()
+def square_wave(t: np.ndarray, frequency: float, jitter: float, tilt: float,
+                rng: Optional[np.random.Generator] = None,
+                size: Optional[int] = None) -> np.ndarray:
+    """return square waves sampled at `t`, of shape `t.shape` or
+    `(size,) + t.shape`
+
+    Each period is on during `tilt` of the period, starting at a time
+    jittered by `jitter` periods.  The on-intervals of all periods and
+    realizations are marked at once with a cumulative sum of their starts
+    and ends.
+    """
+    period = 1/frequency
+    starts = np.arange(0, t[-1], period)
+    num = 1 if size is None else size
+    shape = (starts.size,) if size is None else (size, starts.size)
+    jittered = (starts + jitter*period*standard_normal(shape, rng))\
+        .reshape(num, -1)
+    n0 = t.searchsorted(jittered)
+    n1 = t.searchsorted(jittered + period*tilt)
+    offsets = (t.size+1) * np.arange(num).reshape((num, 1))
+    edges = np.bincount((offsets + n0).ravel(), minlength=num*(t.size+1)) \
+        - np.bincount((offsets + n1).ravel(), minlength=num*(t.size+1))
+    y = (np.cumsum(edges.reshape(num, t.size+1), axis=-1)[:, :-1] > 0)\
+        .astype(np.float64)
+    y -= y.mean(axis=-1, keepdims=True)
+    return y[0] if size is None else y
 
 
 def triangle_wave(t: np.ndarray,
                   frequency: float = 20.0,
                   jitter: float = 0.2,
-                  tilt: float = 0.8) -> np.ndarray:
+                  tilt: float = 0.8,
+                  rng: Optional[np.random.Generator] = None,
+                  size: Optional[int] = None) -> np.ndarray:
     """return triangular wave patterns sampled at t
 
     Parameters
@@ -31,5 +53,14 @@ def triangle_wave(t: np.ndarray,
     `tilt`: float, default is 0.8
         from 0 to 1.  Whether the wave is tilted backwards (at `tilt=0`) or
         forward (at `tilt=1`)
+
+    `rng`: np.random.Generator, optional
+        source of randomness.  By default, the global `np.random` state is
+        used.
+
+    `size`: int, optional
+        number of independent realizations.  If given, the result has shape
+        `(size, t.size)`.
     """
-    return np.cumsum(square_wave(t, frequency, jitter, tilt))
+    return np.cumsum(square_wave(t, frequency, jitter, tilt, rng, size),
+                     axis=-1)
@@ -1,24 +1,226 @@
 from collections import namedtuple
-from typing import Tuple
+from typing import Optional, Tuple
 
 import numpy as np
 
-from .util import indices_of_binned_phase
-from .metrics import _modulation_index
+from .util import phase_bin_codes, binned_sum
+from .aggregators import Aggregator, QuantileSketch, binned_aggregate
+from .metrics import _modulation_index, _nan_modulation_index
 from .signal import Signal
+from .hilbert import segment_length
 
-PACResult: Tuple[float] = namedtuple(
+_PACResult: Tuple[float, complex] = namedtuple(  # type: ignore
     "PACResult", "modulation_index mean_phase_coherence"
 )
 
 
-def phase_amplitude_coupling(samples, sr, slow_band, fast_band):
-    signal = Signal(samples, sr)
-    phase = signal.phase(slow_band)
-    envelope = signal.envelope(fast_band)
-    indices = indices_of_binned_phase(phase, num_bins=12)
-    phi_avg = np.array([np.median(phase[idx]) for idx in indices])
-    env_avg = np.array([np.median(envelope[idx]) for idx in indices])
+class PACResult(_PACResult):
+    """modulation index and mean phase coherence, one value per channel"""
+
+    def to_records(self) -> np.ndarray:
+        """return a structured array with the fields of the result"""
+        mi, mpc = np.broadcast_arrays(self.modulation_index,
+                                      self.mean_phase_coherence)
+        ans = np.empty(mi.shape, dtype=[(self._fields[0], np.float64),
+                                        (self._fields[1], np.complex128)])
+        ans[self._fields[0]] = mi
+        ans[self._fields[1]] = mpc
+        return ans
+
+
+def phase_amplitude_coupling(samples, sr, slow_band, fast_band,
+                             engine: str = 'time',
+                             filter_shape: str = 'butter',
+                             memory_budget: Optional[int] = None,
+                             axis: int = -1,
+                             precision: str = 'double',
+                             aggregator: Aggregator = 'median'):
+    """return modulation index and mean phase coherence
+
+    Parameters
+    ----------
+    samples: np.ndarray
+        the recording, possibly memory-mapped, with any number of channel
+        axes.
+    sr: float
+        sampling rate in Hz.
+    slow_band, fast_band: 2-tuples
+        band edges of the phase and the amplitude component.
+    engine, filter_shape, precision: str
+        see `Signal`.
+    memory_budget: int, optional
+        in bytes.  If given, the recording is processed in segments of a
+        length fitting the budget with `StreamingPAC`.  The modulation
+        index then matches the in-memory one to within 0.1% relative error
+        with 'mean', and to within 5% with 'median', whose bin medians are
+        estimated with quantile sketches.
+    axis: int, default=-1
+        time axis of `samples`.
+    aggregator: str or callable, default='median'
+        average of phases and envelopes within phase bins, see
+        `aggregators.get_aggregator`.  With `memory_budget`, only 'median'
+        and 'mean' are supported.
+
+    Returns
+    -------
+    PACResult of arrays with the shape of the channel axes (scalars for 1-d
+    `samples`).
+    """
+    signal = Signal(samples, sr, engine=engine, filter_shape=filter_shape,
+                    axis=axis, precision=precision)
+    if memory_budget is not None:
+        from .streaming import streaming_phase_amplitude_coupling
+        nsegment = segment_length(memory_budget, num_bands=2)
+        noverlap = nsegment // 8
+        return streaming_phase_amplitude_coupling(
+            signal.chunks(nsegment-noverlap), sr, slow_band, fast_band,
+            nsegment=nsegment, noverlap=noverlap, aggregator=aggregator,
+            engine=engine, filter_shape=filter_shape, precision=precision)
+    # phase and envelope with time along the last axis, shape (..., 1, n)
+    phase = np.moveaxis(signal.phase(slow_band), axis, -1)[..., None, :]
+    envelope = np.moveaxis(signal.envelope(fast_band), axis, -1)[..., None, :]
+    codes = phase_bin_codes(phase, num_bins=12, validate=False)
+    phi_avg = binned_aggregate(codes, phase, 12, aggregator)[..., 0, 0, :]
+    env_avg = binned_aggregate(codes, envelope, 12, aggregator)[..., 0, 0, :]
     mi = _modulation_index(env_avg)
-    mpc = (env_avg * np.exp(1.0j*phi_avg)).mean()
+    mpc = (env_avg * np.exp(1.0j*phi_avg)).mean(axis=-1)
     return PACResult(modulation_index=mi, mean_phase_coherence=mpc)
+
+
+_STREAMING_AGGREGATORS = ('mean', 'median')
+
+SlidingPACResult: Tuple = namedtuple(  # type: ignore
+    "SlidingPACResult", "time modulation_index mean_phase_coherence"
+)
+
+
+def _window_sums(block_sums: np.ndarray, num_blocks: int) -> np.ndarray:
+    """return sums over `num_blocks` consecutive blocks (axis -2)
+
+    The blocks are grouped by `num_blocks`, so that each window is the sum
+    of a suffix of one group and a prefix of the next.  Cumulative sums
+    restart with each group and are never subtracted, so that no
+    cancellation error accumulates over long recordings.
+    """
+    n = block_sums.shape[-2]
+    num_windows = n - num_blocks + 1
+    num_groups = -(-n // num_blocks) + 1
+    pad = [(0, 0)] * (block_sums.ndim-2) \
+        + [(0, num_groups*num_blocks - n), (0, 0)]
+    groups = np.pad(block_sums, pad).reshape(
+        block_sums.shape[:-2] + (num_groups, num_blocks, -1))
+    prefix = np.cumsum(groups, axis=-2).reshape(
+        block_sums.shape[:-2] + (num_groups*num_blocks, -1))
+    suffix = np.flip(np.cumsum(np.flip(groups, axis=-2), axis=-2), axis=-2)\
+        .reshape(prefix.shape)
+    start = np.arange(num_windows)
+    # windows starting a group are the suffix of the group from its start
+    rest = (start % num_blocks != 0)[:, None]
+    return suffix[..., start, :] + rest * prefix[..., start+num_blocks-1, :]
+
+
+def _sliding_medians(codes: np.ndarray, values: np.ndarray, num_blocks: int,
+                     num_bins: int) -> np.ndarray:
+    """return medians over `num_blocks` consecutive blocks (axis -2)
+
+    A quantile sketch adds the block entering each window and removes the
+    one leaving it.
+    """
+    sketch = QuantileSketch(num_bins, codes.shape[:-2])
+    ans = []
+    for i in range(codes.shape[-2]):
+        sketch.add(codes[..., i, :], values[..., i, :])
+        if i >= num_blocks:
+            j = i - num_blocks
+            sketch.add(codes[..., j, :], values[..., j, :], weight=-1)
+        if i >= num_blocks-1:
+            ans.append(sketch.median())
+    return np.stack(ans, axis=-2)
+
+
+def sliding_phase_amplitude_coupling(samples, sr, slow_band, fast_band,
+                                     window: float, step: float,
+                                     num_bins: int = 12,
+                                     engine: str = 'time',
+                                     filter_shape: str = 'butter',
+                                     axis: int = -1,
+                                     precision: str = 'double',
+                                     aggregator: str = 'mean'
+                                     ) -> SlidingPACResult:
+    """return modulation index and mean phase coherence in sliding windows
+
+    The recording is filtered once.  Per phase bin, envelope and phase are
+    summed over blocks of `step`, and the sums of each window are updated
+    incrementally from those of the previous window, so that the cost does
+    not depend on the window length.  Bins are averaged with the mean, or
+    with the median estimated by a `QuantileSketch` that is updated in the
+    same way.
+
+    Parameters
+    ----------
+    samples: np.ndarray
+        the recording, with any number of channel axes.
+    sr: float
+        sampling rate in Hz.
+    slow_band, fast_band: 2-tuples
+        band edges of the phase and the amplitude component.
+    window: float
+        length of the windows in seconds, a multiple of `step`.
+    step: float
+        offset of consecutive windows in seconds.
+    num_bins: int, default=12
+        number of phase bins.
+    engine, filter_shape, precision: str
+        see `Signal`.
+    axis: int, default=-1
+        time axis of `samples`.
+    aggregator: str, default='mean'
+        'mean' gives exact bin means from running sums, 'median' estimates
+        bin medians with a `QuantileSketch` (1% relative error).
+
+    Returns
+    -------
+    SlidingPACResult with the centers of the windows in seconds, and the
+    modulation indices and mean phase coherences of shape `(...,
+    num_windows)` where `...` are the channel axes.  Both are `nan` in
+    windows with an empty phase bin.
+    """
+    nstep = int(round(step * sr))
+    num_blocks = int(round(window / step))
+    try:
+        assert nstep > 0, f"step ({step}) shorter than one sample"
+        assert np.isclose(num_blocks * step, window), \
+            f"window ({window}) must be a multiple of step ({step})"
+        assert aggregator in _STREAMING_AGGREGATORS, \
+            f"aggregator ({aggregator}) must be one of " \
+            f"{_STREAMING_AGGREGATORS}"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    signal = Signal(samples, sr, engine=engine, filter_shape=filter_shape,
+                    axis=axis, precision=precision)
+    n = signal.samples.shape[-1] // nstep * nstep
+    try:
+        assert n >= num_blocks * nstep, \
+            f"recording shorter than one window ({window} s)"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    phase = np.moveaxis(signal.phase(slow_band), axis, -1)[..., :n]
+    envelope = np.moveaxis(signal.envelope(fast_band), axis, -1)[..., :n]
+    # (..., n) -> (..., num_all_blocks, nstep)
+    blocks = phase.shape[:-1] + (n // nstep, nstep)
+    codes = phase_bin_codes(phase, num_bins, validate=False).reshape(blocks)
+    phase, envelope = phase.reshape(blocks), envelope.reshape(blocks)
+    if aggregator == 'median':
+        env_avg = _sliding_medians(codes, envelope, num_blocks, num_bins)
+        phi_avg = _sliding_medians(codes, phase, num_blocks, num_bins)
+    else:
+        counts = _window_sums(binned_sum(codes, None, num_bins), num_blocks)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            env_avg = _window_sums(binned_sum(codes, envelope, num_bins),
+                                   num_blocks) / counts
+            phi_avg = _window_sums(binned_sum(codes, phase, num_bins),
+                                   num_blocks) / counts
+    mi = _nan_modulation_index(env_avg)
+    mpc = (env_avg * np.exp(1.0j*phi_avg)).mean(axis=-1)
+    time = (np.arange(mi.shape[-1]) * nstep + num_blocks * nstep / 2) / sr
+    return SlidingPACResult(time, mi, mpc)
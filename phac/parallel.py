@@ -0,0 +1,150 @@
+import os
+from typing import Optional, Sequence, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .filter_bank import FilterBank
+from .util import phase_bin_codes
+from .aggregators import Aggregator, binned_aggregate
+from .profiling import stage
+
+
+class SharedArray:
+    """numpy array backed by shared memory
+
+    Pickling a `SharedArray` only transfers the name of the memory block,
+    shape and dtype.  Unpickling attaches to the same block, so that workers
+    read and write the array without copying it.  Only the process that
+    created the array may `unlink` it.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype=np.float64,
+                 name: Optional[str] = None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._owner = name is None
+        if self._owner:
+            nbytes = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.array: np.ndarray = np.ndarray(self.shape, dtype=self.dtype,
+                                            buffer=self._shm.buf)
+
+    @classmethod
+    def from_array(cls, arr: np.ndarray):
+        ans = cls(arr.shape, arr.dtype)
+        ans.array[...] = arr
+        return ans
+
+    def __getstate__(self):
+        return (self._shm.name, self.shape, self.dtype.str)
+
+    def __setstate__(self, state):
+        name, shape, dtype = state
+        self.__init__(shape, dtype, name=name)  # type: ignore
+
+    def close(self) -> None:
+        del self.array
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _bin_codes_task(samples: SharedArray, bank: FilterBank,
+                    rows: np.ndarray, num_bins: int, out: SharedArray):
+    phases = bank.select(rows).phase(samples.array)
+    out.array[rows] = phase_bin_codes(phases, num_bins, validate=False)
+
+
+def _envelope_task(samples: SharedArray, bank: FilterBank, rows: np.ndarray,
+                   out: SharedArray):
+    out.array[rows] = bank.select(rows).envelope(samples.array)
+
+
+def _binned_median_task(codes: SharedArray, amplitudes: SharedArray,
+                        rows: np.ndarray, num_bins: int, out: SharedArray,
+                        aggregator: Aggregator = 'median'):
+    out.array[..., rows, :, :] = binned_aggregate(
+        np.moveaxis(codes.array[rows], 0, -2),
+        np.moveaxis(amplitudes.array, 0, -2), num_bins, aggregator)
+
+
+def _wait(futures: Sequence) -> None:
+    done, _ = wait(futures)
+    for future in done:
+        future.result()
+
+
+@stage('parallel')
+def parallel_binned_median(samples: np.ndarray, slow_bank: FilterBank,
+                           fast_bank: FilterBank, num_bins: int = 18,
+                           n_jobs: int = -1,
+                           executor: Optional[Executor] = None,
+                           aggregator: Aggregator = 'median') -> np.ndarray:
+    """return binned medians of `comodulogram` computed with a worker pool
+
+    Samples, slow-band bin codes and fast-band envelopes are placed in shared
+    memory.  Workers compute bin codes and envelopes for subsets of bands,
+    and then the binned medians for subsets of slow bands.  Each band is
+    computed exactly like in the serial path, so that results are identical.
+
+    Parameters
+    ----------
+    samples: np.ndarray
+        the recording, time along the last axis.
+    slow_bank, fast_bank: FilterBank
+        filters for the phase and the amplitude component.
+    num_bins: int, default=18
+        number of phase bins.
+    n_jobs: int, default=-1
+        number of worker processes; -1 uses all CPUs.  Ignored if `executor`
+        is given.
+    executor: concurrent.futures.Executor, optional
+        pool to submit the work to.  It has to run on the same host.
+    aggregator: str or callable, default='median'
+        see `aggregators.get_aggregator`.  Callables have to be picklable.
+
+    Returns
+    -------
+    np.ndarray of shape `(..., n_slow, n_fast, num_bins)` where `...` are
+    the channel axes of `samples`.
+    """
+    n_jobs = (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+    own_executor = executor is None
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=n_jobs)
+    else:
+        n_jobs = getattr(executor, '_max_workers', n_jobs)
+    shape = samples.shape
+    shared = SharedArray.from_array(np.asarray(samples))
+    codes = SharedArray((len(slow_bank),) + shape,
+                        np.min_scalar_type(num_bins))
+    amplitudes = SharedArray((len(fast_bank),) + shape, fast_bank.dtype)
+    ans = SharedArray(shape[:-1] + (len(slow_bank), len(fast_bank),
+                                    num_bins))
+    try:
+        slow_rows = np.array_split(np.arange(len(slow_bank)), n_jobs)
+        fast_rows = np.array_split(np.arange(len(fast_bank)), n_jobs)
+        _wait([
+            executor.submit(_bin_codes_task, shared, slow_bank, rows,
+                            num_bins, codes)
+            for rows in slow_rows if rows.size
+        ] + [
+            executor.submit(_envelope_task, shared, fast_bank, rows,
+                            amplitudes)
+            for rows in fast_rows if rows.size
+        ])
+        _wait([
+            executor.submit(_binned_median_task, codes, amplitudes, rows,
+                            num_bins, ans, aggregator)
+            for rows in slow_rows if rows.size
+        ])
+        return ans.array.copy()
+    finally:
+        if own_executor:
+            executor.shutdown()
+        for arr in (shared, codes, amplitudes, ans):
+            arr.close()
@@ -1,10 +1,11 @@
 import numpy as np
-from typing import Tuple
+from typing import Optional, Tuple
 import matplotlib.pyplot as plt
 
 from .signal import Signal
-from .util import indices_of_binned_phase
+from .util import phase_bin_codes, binned_sum
 from .metrics import _modulation_index
+from .result import ComodulogramResult
 
 
 def plot_phase_amplitude_decomposition(x: np.ndarray, sr: float,
@@ -49,9 +50,10 @@ def plot_phase_amplitude_coupling(x: np.ndarray, sr: float,
     phase = x.phase(slow_band)
     envelope = x.envelope(fast_band)
 
-    indices = indices_of_binned_phase(phase, num_bins=12)
-    phi_avg = np.array([np.mean(phase[idx]) for idx in indices])
-    env_avg = np.array([np.mean(envelope[idx]) for idx in indices])
+    codes = phase_bin_codes(phase, num_bins=12, validate=False)
+    counts = binned_sum(codes, num_bins=12)
+    phi_avg = binned_sum(codes, phase, num_bins=12) / counts
+    env_avg = binned_sum(codes, envelope, num_bins=12) / counts
     mi = _modulation_index(env_avg)
 
     # plt.figure(figsize=(5, 3))
@@ -70,10 +72,17 @@ def plot_phase_amplitude_coupling(x: np.ndarray, sr: float,
     plt.tight_layout()
 
 
-def plot_comodulogram(C, **kwargs):
+def plot_comodulogram(C, layer: Optional[str] = None, **kwargs):
+    """plot a comodulogram given as pd.DataFrame or `ComodulogramResult`
+
+    `layer` selects the layer of a `ComodulogramResult` (by default the
+    first).
+    """
+    if isinstance(C, ComodulogramResult):
+        C = C.to_dataframe(layer)
     assert C.columns.name == 'f_slow' and C.index.name == 'f_fast'
     f_slow = list(C.columns)
     f_fast = list(C.index)
-    extent = [min(f_slow), max(f_slow)] + [min(f_fast), max(f_fast)]
+    extent = (min(f_slow), max(f_slow), min(f_fast), max(f_fast))
     plt.imshow(C, origin='lower', aspect='auto', extent=extent, **kwargs)
     plt.colorbar()
@@ -0,0 +1,163 @@
+import json
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+StageStats: Tuple = namedtuple(  # type: ignore
+    "StageStats", "calls seconds nbytes cache_hits cache_misses"
+)
+
+# active profiles, innermost last; stages are only timed while not empty
+_profiles: List['Profile'] = []
+# names of the stages being timed, innermost last
+_open: List[str] = []
+
+
+class Profile:
+    """wall time, calls, result bytes and cache hits of each stage
+
+    Stages are the functions decorated with `stage` and the regions wrapped
+    in `timed`.  `seconds` include the time of nested stages, and `nbytes`
+    counts the bytes of the arrays returned by a stage.  Cache hits and
+    misses of `cache.ArrayCache` are counted for the innermost open stage.
+    Work done in other processes (see `parallel`) is not recorded.
+
+    Parameters
+    ----------
+    callback: callable, optional
+        called as `callback(name, seconds, nbytes)` whenever a stage ends.
+    """
+
+    def __init__(self,
+                 callback: Optional[Callable[[str, float, int], None]] = None):
+        self.callback = callback
+        self._stages: Dict[str, List] = {}
+
+    def _stage(self, name: str) -> List:
+        return self._stages.setdefault(name, [0, 0.0, 0, 0, 0])
+
+    def _record(self, name: str, seconds: float, nbytes: int) -> None:
+        stats = self._stage(name)
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] += nbytes
+        if self.callback is not None:
+            self.callback(name, seconds, nbytes)
+
+    def _record_cache(self, name: str, hit: bool) -> None:
+        self._stage(name)[3 if hit else 4] += 1
+
+    @property
+    def stages(self) -> Dict[str, StageStats]:
+        return {name: StageStats(*stats)
+                for name, stats in self._stages.items()}
+
+    def to_dict(self) -> Dict[str, Dict]:
+        return {name: stats._asdict() for name, stats in self.stages.items()}
+
+    def to_json(self, path: Optional[str] = None, **kwargs) -> str:
+        """return the stages as JSON, and write them to `path` if given"""
+        ans = json.dumps(self.to_dict(), **kwargs)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(ans)
+        return ans
+
+
+@contextmanager
+def profile(callback: Optional[Callable[[str, float, int], None]] = None
+            ) -> Iterator[Profile]:
+    """record the stages run within the context
+
+    >>> with profile() as prof:
+    ...     comodulogram(samples, sr, slow, fast)
+    >>> prof.to_dict()['hilbert']['seconds']
+    """
+    ans = Profile(callback)
+    _profiles.append(ans)
+    try:
+        yield ans
+    finally:
+        _profiles.remove(ans)
+
+
+def _nbytes(result) -> int:
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    if isinstance(result, tuple):
+        return sum(_nbytes(x) for x in result)
+    return 0
+
+
+@contextmanager
+def _timed(name: str) -> Iterator[None]:
+    _open.append(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _open.pop()
+        for prof in _profiles:
+            prof._record(name, seconds, 0)
+
+
+class _Null:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL = _Null()
+
+
+def timed(name: str):
+    """return a context manager timing a region as stage `name`
+
+    Without an active `profile` this is a shared no-op context.
+    """
+    if not _profiles:
+        return _NULL
+    return _timed(name)
+
+
+def stage(name: str) -> Callable:
+    """decorator recording each call of a function as stage `name`
+
+    Without an active `profile`, the wrapper only checks for one and calls
+    the function.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _profiles:
+                return fn(*args, **kwargs)
+            _open.append(name)
+            start = time.perf_counter()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                seconds = time.perf_counter() - start
+                _open.pop()
+                nbytes = _nbytes(result)
+                for prof in _profiles:
+                    prof._record(name, seconds, nbytes)
+        return wrapper
+    return decorator
+
+
+def record_cache(hit: bool) -> None:
+    """count a cache hit or miss for the innermost open stage"""
+    if not _profiles:
+        return
+    name = _open[-1] if _open else 'cache'
+    for prof in _profiles:
+        prof._record_cache(name, hit)
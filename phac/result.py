@@ -0,0 +1,141 @@
+import os
+import zipfile
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def _to_frame(values: np.ndarray, slow_centers: np.ndarray,
+              fast_centers: np.ndarray):
+    """return `(..., n_slow, n_fast)` values with columns f_slow
+
+    The index is f_fast, preceded by a (flat) channel index for values with
+    leading channel axes.
+    """
+    import pandas as pd
+    values = np.asarray(values)
+    if values.ndim == 2:
+        return pd.DataFrame(
+            data=values.T,
+            index=pd.Index(fast_centers, name='f_fast'),
+            columns=pd.Index(slow_centers, name='f_slow'),
+        )
+    num_channels = int(np.prod(values.shape[:-2]))
+    values = values.reshape(num_channels, len(slow_centers), -1)
+    return pd.DataFrame(
+        data=np.swapaxes(values, 1, 2).reshape(-1, len(slow_centers)),
+        index=pd.MultiIndex.from_product(
+            [np.arange(num_channels), fast_centers],
+            names=['channel', 'f_fast']),
+        columns=pd.Index(slow_centers, name='f_slow'),
+    )
+
+
+def _npz_path(path: str) -> str:
+    """return `path` with the `.npz` suffix that `np.savez` appends"""
+    path = os.fspath(path)
+    return path if path.endswith('.npz') else path + '.npz'
+
+
+def _memmap_member(path: str, name: str, mode: str = 'r') -> np.memmap:
+    """return the array `name` of an uncompressed `.npz` file memory-mapped"""
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(name + '.npy')
+        try:
+            assert info.compress_type == zipfile.ZIP_STORED, \
+                f"{name} of {path} is compressed"
+        except AssertionError as err:
+            raise ValueError(str(err))
+        with archive.open(info) as f:
+            read_header = {
+                (1, 0): np.lib.format.read_array_header_1_0,
+                (2, 0): np.lib.format.read_array_header_2_0,
+            }[np.lib.format.read_magic(f)]
+            shape, fortran_order, dtype = read_header(f)
+            header = f.tell()
+    with open(path, 'rb') as f:
+        # skip the local file header of the member
+        f.seek(info.header_offset + 26)
+        lengths = np.frombuffer(f.read(4), dtype='<u2')
+    offset = info.header_offset + 30 + int(lengths.sum()) + header
+    return np.memmap(path, dtype=dtype, mode=mode,  # type: ignore
+                     offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+class ComodulogramResult:
+    """dense layers of a comodulogram with their frequency axes
+
+    Parameters
+    ----------
+    values: np.ndarray
+        shape `(n_layers, ..., n_slow, n_fast)` where `...` are channel axes.
+    f_slow, f_fast: np.ndarray
+        centers of the slow and the fast bands.
+    layers: sequence of str, default=('modulation_index',)
+        names of the layers, e.g. metrics (see `metrics.pac_metrics`) or the
+        fields of `surrogates.SurrogateResult`.
+    """
+
+    def __init__(self, values: np.ndarray, f_slow: np.ndarray,
+                 f_fast: np.ndarray,
+                 layers: Sequence[str] = ('modulation_index',)):
+        self.values = values
+        self.f_slow = np.asarray(f_slow)
+        self.f_fast = np.asarray(f_fast)
+        self.layers = tuple(layers)
+        try:
+            assert values.ndim >= 3 and values.shape[0] == len(self.layers), \
+                f"values of shape {values.shape} for layers {self.layers}"
+            assert values.shape[-2:] == (self.f_slow.size, self.f_fast.size), \
+                f"values of shape {values.shape} for {self.f_slow.size} " \
+                f"slow and {self.f_fast.size} fast bands"
+        except AssertionError as err:
+            raise ValueError(str(err))
+
+    @classmethod
+    def from_layers(cls, layers: dict, f_slow: np.ndarray,
+                    f_fast: np.ndarray):
+        """return result of arrays of shape `(..., n_slow, n_fast)` by name"""
+        return cls(np.stack([np.asarray(x, dtype=np.float64)
+                             for x in layers.values()]),
+                   f_slow, f_fast, list(layers))
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def __getitem__(self, layer: str) -> np.ndarray:
+        try:
+            return self.values[self.layers.index(layer)]
+        except ValueError:
+            raise KeyError(layer)
+
+    def to_dataframe(self, layer: Optional[str] = None):
+        """return `layer` (by default the first) as a pd.DataFrame with index
+        `f_fast` (or `(channel, f_fast)`) and columns `f_slow`"""
+        values = self.values[0] if layer is None else self[layer]
+        return _to_frame(values, self.f_slow, self.f_fast)
+
+    def save(self, path: str) -> None:
+        """write the result to an uncompressed `.npz` file, adding the
+        suffix to `path` if missing"""
+        np.savez(_npz_path(path), values=np.asarray(self.values),
+                 f_slow=self.f_slow, f_fast=self.f_fast,
+                 layers=np.array(self.layers))
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = None):
+        """return the result saved at `path`, with or without its `.npz`
+        suffix
+
+        With `mmap_mode` (e.g. 'r'), the values are memory-mapped from the
+        file instead of being read.
+        """
+        path = _npz_path(path)
+        with np.load(path) as data:
+            f_slow, f_fast = data['f_slow'], data['f_fast']
+            layers = [str(layer) for layer in data['layers']]
+            values = data['values'] if mmap_mode is None \
+                else _memmap_member(path, 'values', mmap_mode)
+        return cls(values, f_slow, f_fast, layers)
@@ -1,39 +1,248 @@
-from typing import Tuple
+from typing import Callable, Dict, Iterator, Optional, Tuple
 from functools import cached_property
 
 import numpy as np
+from scipy import fft as _fft
 
-from .hilbert import hilbert
-from .util import filtfilt
+from .cache import ArrayCache, CacheInfo
+from .hilbert import hilbert, segment_length
+from .spectral import band_analytic
+from .filter_bank import FilterBank
+from .util import _dtypes, filtfilt, analytic_phase
+from .profiling import stage
+
+ENGINES = ('time', 'fft')
 
 
 class Signal:
+    """band-filtered phases and envelopes of a recording
+
+    Parameters
+    ----------
+    signal: np.ndarray
+        samples of the recording, possibly a `np.memmap` (see `from_file`).
+        Multichannel recordings have further axes next to the time axis.
+    sampling_rate: float
+        in Hz.
+    engine: str, default='time'
+        'time' filters with a zero-phase Butterworth filter (`filtfilt`) and
+        computes analytic signals with a separate Hilbert transform.  'fft'
+        computes the spectrum of the recording once and obtains each
+        band-passed analytic signal with a single inverse FFT.
+    filter_shape: str, default='butter'
+        shape of the band-pass of the 'fft' engine (see
+        `spectral.zero_phase_response`).
+    memory_budget: int, optional
+        in bytes.  If given, filtering and Hilbert transform run on
+        overlapping segments (see `streaming.StreamingAnalytic`) whose length
+        is set by the budget instead of by the length of the recording.
+        Results are written segment by segment into the `out` arrays of the
+        methods, which may be memory-mapped as well.
+    axis: int, default=-1
+        time axis of `signal`.  All channels are filtered and transformed
+        together along this axis, and results have the shape of `signal`.
+    cache_bytes: int, default=2**28
+        budget in bytes of the cache of filtered and analytic signals (see
+        `cache.ArrayCache`).  Phase and envelope of a band share the cached
+        analytic signal.  Results are returned as writable copies of the
+        (read-only) cached arrays; `invalidate` drops them after `signal`
+        changed.  Not used with `memory_budget`.
+    precision: str, default='double'
+        'double' or 'single'.  In single precision, filtered signals, phases
+        and envelopes are float32 and analytic signals complex64, which halves
+        memory and speeds up the FFTs.  The Butterworth filters still run in
+        double precision internally, and averages per phase bin are always
+        computed in double precision.
+    multirate: bool, default=False
+        with the 'time' engine, filter each band at a sampling rate reduced
+        by a power of two (see `FilterBank`), and interpolate its analytic
+        signal back to the full rate.  The decimated recordings are kept
+        until `invalidate` and shared by all bands.  Not used with
+        `memory_budget`.
+    """
 
-    def __init__(self, signal: np.ndarray, sampling_rate: float):
+    def __init__(self, signal: np.ndarray, sampling_rate: float,
+                 engine: str = 'time', filter_shape: str = 'butter',
+                 memory_budget: Optional[int] = None, axis: int = -1,
+                 cache_bytes: int = 2**28, precision: str = 'double',
+                 multirate: bool = False):
+        try:
+            assert engine in ENGINES, \
+                f"engine ({engine}) must be one of {ENGINES}"
+        except AssertionError as err:
+            raise ValueError(str(err))
         self.signal = signal
         self.sampling_rate = sampling_rate
+        self.engine = engine
+        self.filter_shape = filter_shape
+        self.memory_budget = memory_budget
+        self.axis = axis
+        self.precision = precision
+        self.dtype, self.complex_dtype = _dtypes(precision)
+        self.cache = ArrayCache(cache_bytes)
+        self.multirate = multirate
+        self._levels: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_file(cls, path: str, sampling_rate: float, dtype=np.float64,
+                  offset: int = 0, num_channels: Optional[int] = None,
+                  **kwargs):
+        """return signal memory-mapped from a `.npy` or raw binary file
+
+        Parameters
+        ----------
+        path: str
+            `.npy` file, or file of raw samples of type `dtype`.
+        sampling_rate: float
+            in Hz.
+        dtype: default=np.float64
+            type of the raw samples.
+        offset: int, default=0
+            in bytes, size of a header preceding raw samples.
+        num_channels: int, optional
+            number of interleaved channels of raw samples.  The signal then
+            has shape `(n_samples, num_channels)` and time axis 0.
+        **kwargs:
+            passed on to `Signal`, e.g. `memory_budget`.
+        """
+        if str(path).endswith('.npy'):
+            samples = np.load(path, mmap_mode='r')
+        else:
+            samples = np.memmap(path, dtype=dtype, mode='r', offset=offset)
+        if num_channels is not None:
+            samples = samples.reshape(-1, num_channels)
+            kwargs['axis'] = 0
+        return cls(samples, sampling_rate, **kwargs)
+
+    @property
+    def samples(self) -> np.ndarray:
+        """the recording with time along the last axis"""
+        return np.moveaxis(self.signal, self.axis, -1)
 
     @cached_property
     def time(self) -> np.ndarray:
-        return np.arange(self.signal.size)/self.sampling_rate
+        return np.arange(self.signal.shape[self.axis])/self.sampling_rate
+
+    @cached_property
+    def spectrum(self) -> np.ndarray:
+        """spectrum of `samples` along the last axis"""
+        samples = self.samples.astype(self.dtype, copy=False)
+        return _fft.fft(samples, axis=-1)
+
+    def cache_info(self) -> CacheInfo:
+        return self.cache.cache_info()
+
+    def invalidate(self, band: Optional[Tuple[float, float]] = None) -> None:
+        """drop cached results, only those of `band` if given"""
+        if band is None:
+            self.__dict__.pop('spectrum', None)
+            self._levels.clear()
+            self.cache.invalidate()
+        else:
+            self.cache.invalidate(lambda key: key[0] == tuple(band))
+
+    def _cached(self, band: Tuple[float, float], method: str, dtype,
+                compute: Callable[[], np.ndarray]) -> np.ndarray:
+        key = (tuple(band), method, np.dtype(dtype).name)
+        return self.cache.get(key, compute)
 
-    def filtered(self, band: Tuple[float, float]) -> np.ndarray:
+    def chunks(self, size: int) -> Iterator[np.ndarray]:
+        """iterate over consecutive pieces of `size` samples (time last)"""
+        samples = self.samples
+        for i in range(0, samples.shape[-1], size):
+            yield np.asarray(samples[..., i:i+size], dtype=self.dtype)
+
+    @staticmethod
+    def _validate_band(band: Tuple[float, float]) -> None:
         try:
             assert isinstance(band, tuple), f"band must be tuple, got '{band}'"
             assert len(band) == 2, f"band '{band}'"
         except AssertionError as err:
             raise ValueError(str(err))
-        return filtfilt(self.signal, self.sampling_rate,
-                        fmin=band[0], fmax=band[1])
 
-    def phase(self, band) -> np.ndarray:
-        x = self.filtered(band)
-        phi = np.angle(hilbert(x)) + np.pi/2
-        return np.mod(phi, 2*np.pi)
+    def _filtered(self, band: Tuple[float, float]) -> np.ndarray:
+        if self.engine == 'fft' or self.multirate:
+            return np.real(self._analytic(band))
+        return self._cached(band, 'filtered', self.dtype, lambda: filtfilt(
+            self.samples, self.sampling_rate, fmin=band[0], fmax=band[1],
+            axis=-1).astype(self.dtype, copy=False))
 
-    @staticmethod
-    def _hilbert_envelope(filtered_signal: np.ndarray) -> np.ndarray:
-        return np.abs(hilbert(filtered_signal))
+    def _analytic(self, band: Tuple[float, float]) -> np.ndarray:
+        if self.engine == 'fft':
+            return self._cached(band, 'analytic', self.complex_dtype,
+                                lambda: band_analytic(
+                                    self.spectrum, self.sampling_rate, band,
+                                    self.filter_shape))
+        if self.multirate:
+            return self._cached(band, 'analytic', self.complex_dtype,
+                                lambda: self._multirate_analytic(band))
+        return self._cached(band, 'analytic', self.complex_dtype,
+                            lambda: hilbert(self._filtered(band)))
+
+    def _multirate_analytic(self, band: Tuple[float, float]) -> np.ndarray:
+        bank = FilterBank([band], self.sampling_rate, multirate=True,
+                          precision=self.precision)
+        samples = np.asarray(self.samples, dtype=np.float64)
+        return bank.analytic(samples, self._levels)[0]
+
+    def _into(self, out: Optional[np.ndarray],
+              arr: np.ndarray) -> np.ndarray:
+        """return `arr` (time last) with the time axis of `signal`, copied if
+        it is cached"""
+        arr = np.moveaxis(arr, -1, self.axis)
+        if out is None:
+            return arr if arr.flags.writeable else arr.copy()
+        out[...] = arr
+        return out
+
+    def _segmented(self, band: Tuple[float, float],
+                   fn: Callable[[np.ndarray], np.ndarray],
+                   out: Optional[np.ndarray], dtype,
+                   memory_budget: int) -> np.ndarray:
+        """write `fn` of the analytic signal segment by segment into `out`"""
+        from .streaming import StreamingAnalytic
+        if out is None:
+            out = np.empty(self.signal.shape, dtype=dtype)
+        target = np.moveaxis(out, self.axis, -1)
+        bank = FilterBank([band], self.sampling_rate, engine=self.engine,
+                          filter_shape=self.filter_shape,
+                          precision=self.precision)
+        nsegment = segment_length(memory_budget)
+        noverlap = nsegment // 8
+        stream = StreamingAnalytic(bank, nsegment, noverlap)
+        i = 0
+        for chunk in self.chunks(nsegment-noverlap):
+            completed = fn(stream.push(chunk)[0])
+            target[..., i:i+completed.shape[-1]] = completed
+            i += completed.shape[-1]
+        target[..., i:] = fn(stream.flush()[0])
+        return out
+
+    def _compute(self, band: Tuple[float, float],
+                 fn: Callable[[np.ndarray], np.ndarray],
+                 out: Optional[np.ndarray], dtype) -> np.ndarray:
+        """return `fn` of the analytic signal of `band`"""
+        self._validate_band(band)
+        if self.memory_budget is not None:
+            return self._segmented(band, fn, out, dtype, self.memory_budget)
+        return self._into(out, fn(self._analytic(band)))
+
+    @stage('Signal.filtered')
+    def filtered(self, band: Tuple[float, float],
+                 out: Optional[np.ndarray] = None) -> np.ndarray:
+        self._validate_band(band)
+        if self.memory_budget is None and self.engine == 'time':
+            return self._into(out, self._filtered(band))
+        return self._compute(band, np.real, out, self.dtype)
+
+    @stage('Signal.analytic')
+    def analytic(self, band: Tuple[float, float],
+                 out: Optional[np.ndarray] = None) -> np.ndarray:
+        return self._compute(band, np.asarray, out, self.complex_dtype)
+
+    @stage('Signal.phase')
+    def phase(self, band, out: Optional[np.ndarray] = None) -> np.ndarray:
+        return self._compute(band, analytic_phase, out, self.dtype)
 
     @staticmethod
     def _max_envelope(filtered_signal: np.ndarray) -> np.ndarray:
@@ -45,14 +254,28 @@ class Signal:
         idx = np.arange(maxidx.size)
         return np.interp(idx, idx[maxidx], maxis)
 
-    def envelope(self, band, method: str = 'hilbert') -> np.ndarray:
+    def _max_envelopes(self, band: Tuple[float, float]) -> np.ndarray:
+        self._validate_band(band)
+
+        def compute(filtered: np.ndarray) -> np.ndarray:
+            return np.apply_along_axis(self._max_envelope, -1, filtered)\
+                .astype(self.dtype, copy=False)
+
+        if self.memory_budget is not None:
+            return compute(np.moveaxis(self.filtered(band), self.axis, -1))
+        return self._cached(band, 'max', self.dtype,
+                            lambda: compute(self._filtered(band)))
+
+    @stage('Signal.envelope')
+    def envelope(self, band, method: str = 'hilbert',
+                 out: Optional[np.ndarray] = None) -> np.ndarray:
         envelope_fn = {
-            'hilbert': self._hilbert_envelope,
-            'max': self._max_envelope
+            'hilbert': lambda: self._compute(band, np.abs, out, self.dtype),
+            'max': lambda: self._into(out, self._max_envelopes(band))
         }
-        x = self.filtered(band)
         try:
-            return envelope_fn[method](x)
+            fn = envelope_fn[method]
         except KeyError:
             raise ValueError(f"method ({method}) must be one of "
                              f"{envelope_fn.keys()}")
+        return fn()
@@ -0,0 +1,91 @@
+from typing import Tuple
+
+import numpy as np
+from scipy import fft as _fft
+from scipy.signal import sosfreqz as _sosfreqz
+
+from .util import _bandpass
+from .profiling import stage
+
+FILTER_SHAPES = ('butter', 'ideal')
+
+
+def analytic_mask(n: int) -> np.ndarray:
+    """return the one-sided spectral mask turning a signal analytic
+
+    Same as in `scipy.signal.hilbert`: positive frequencies are doubled,
+    negative frequencies are removed, and the zero and Nyquist frequency are
+    kept.
+    """
+    h = np.zeros(n, dtype=np.float64)
+    h[0] = 1.0
+    if n % 2 == 0:
+        h[n//2] = 1.0
+        h[1:n//2] = 2.0
+    else:
+        h[1:(n+1)//2] = 2.0
+    return h
+
+
+def zero_phase_response(freqs: np.ndarray, sr: float,
+                        band: Tuple[float, float],
+                        shape: str = 'butter') -> np.ndarray:
+    """return the band-pass gain of a zero-phase filter at `freqs`
+
+    Parameters
+    ----------
+    freqs: np.ndarray
+        frequencies in Hz at which the gain is evaluated.
+    sr: float
+        sampling rate in Hz.
+    band: 2-tuple
+        band edges (left, right) in Hz.
+    shape: str, default='butter'
+        'butter' is the squared magnitude of the 4-th order Butterworth
+        band-pass, i.e., the response of `util.filtfilt`.  'ideal' is a
+        rectangular pass band.
+    """
+    if shape == 'butter':
+        _, h = _sosfreqz(_bandpass(sr, band), worN=np.abs(freqs), fs=sr)
+        return np.abs(h)**2
+    elif shape == 'ideal':
+        inside = (band[0] <= np.abs(freqs)) & (np.abs(freqs) <= band[1])
+        return inside.astype(np.float64)
+    raise ValueError(f"shape ({shape}) must be one of {FILTER_SHAPES}")
+
+
+def analytic_transfer(n: int, sr: float, band: Tuple[float, float],
+                      shape: str = 'butter') -> np.ndarray:
+    """return zero-phase band-pass and analytic mask as one spectral factor
+
+    Only the non-negative frequencies are non-zero, so that the gain is
+    evaluated only there.
+    """
+    mask = analytic_mask(n)
+    npos = n//2 + 1
+    freqs = np.arange(npos) * sr / n
+    mask[:npos] *= zero_phase_response(freqs, sr, band, shape)
+    return mask
+
+
+@stage('spectral.band_analytic')
+def band_analytic(spectrum: np.ndarray, sr: float, band: Tuple[float, float],
+                  shape: str = 'butter') -> np.ndarray:
+    """return analytic band-passed signal from the spectrum of a signal
+
+    The result has the precision of `spectrum`.
+
+    Parameters
+    ----------
+    spectrum: np.ndarray
+        `scipy.fft.fft` of the signal along the last axis.
+    sr: float
+        sampling rate in Hz.
+    band: 2-tuple
+        band edges (left, right) in Hz.
+    shape: str, default='butter'
+        filter shape, see `zero_phase_response`.
+    """
+    transfer = analytic_transfer(spectrum.shape[-1], sr, band, shape)
+    transfer = transfer.astype(spectrum.real.dtype, copy=False)
+    return _fft.ifft(spectrum * transfer, axis=-1)
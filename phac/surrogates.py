@@ -0,0 +1,220 @@
+from collections import namedtuple
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy import fft as _fft
+
+from .metrics import _modulation_index
+from .aggregators import Aggregator, binned_aggregate
+from .comodulogram import Filters, _codes_and_envelopes
+from .result import ComodulogramResult, _to_frame
+
+METHODS = ('time_shift', 'block_swap', 'phase_shuffle')
+
+SurrogateResult: Tuple = namedtuple(  # type: ignore
+    "SurrogateResult", "modulation_index zscore pvalue null_mean null_std"
+)
+
+# number of surrogate envelope samples held in memory at once
+_BATCH_SAMPLES = 2**25
+
+
+def _time_shift(envelopes: np.ndarray, num: int, rng: np.random.Generator,
+                min_shift: Optional[int] = None, **kwargs) -> np.ndarray:
+    n = envelopes.shape[-1]
+    min_shift = n // 10 if min_shift is None else min_shift
+    shifts = rng.integers(min_shift, n - min_shift, size=num, endpoint=True)
+    idx = np.mod(np.arange(n) + shifts[:, None], n)
+    return np.moveaxis(np.take(envelopes, idx, axis=-1), -2, 0)
+
+
+def _derangements(num: int, size: int,
+                  rng: np.random.Generator) -> np.ndarray:
+    """return `num` random permutations of `size` items without fixed points"""
+    ans = np.argsort(rng.random((num, size)), axis=-1)
+    redo = np.any(ans == np.arange(size), axis=-1)
+    while np.any(redo):
+        ans[redo] = np.argsort(rng.random((redo.sum(), size)), axis=-1)
+        redo = np.any(ans == np.arange(size), axis=-1)
+    return ans
+
+
+def _block_swap(envelopes: np.ndarray, num: int, rng: np.random.Generator,
+                num_blocks: int = 10, **kwargs) -> np.ndarray:
+    n = envelopes.shape[-1]
+    try:
+        assert 2 <= num_blocks <= n, \
+            f"num_blocks ({num_blocks}) must be in [2, {n}]"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    block = n // num_blocks
+    order = _derangements(num, num_blocks, rng)
+    j = np.arange(block*num_blocks)
+    idx = np.tile(np.arange(n), (num, 1))
+    idx[:, :j.size] = order[:, j // block] * block + j % block
+    return np.moveaxis(np.take(envelopes, idx, axis=-1), -2, 0)
+
+
+def _phase_shuffle(envelopes: np.ndarray, num: int, rng: np.random.Generator,
+                   **kwargs) -> np.ndarray:
+    n = envelopes.shape[-1]
+    spectrum = _fft.rfft(envelopes, axis=-1)
+    phases = np.exp(2.0j*np.pi*rng.random((num,) + spectrum.shape))
+    phases[..., 0] = 1.0
+    if n % 2 == 0:
+        phases[..., -1] = 1.0
+    shuffled = _fft.irfft(spectrum * phases, n=n, axis=-1)
+    # map ranks back onto the original values to keep them positive
+    ranks = np.argsort(np.argsort(shuffled, axis=-1), axis=-1)
+    return np.take_along_axis(
+        np.broadcast_to(np.sort(envelopes, axis=-1), shuffled.shape),
+        ranks, axis=-1)
+
+
+def surrogates(envelopes: np.ndarray, num: int, method: str = 'time_shift',
+               rng: Optional[np.random.Generator] = None,
+               **kwargs) -> np.ndarray:
+    """return `num` surrogates of `envelopes` decoupled from the phase
+
+    Parameters
+    ----------
+    envelopes: np.ndarray
+        amplitude envelopes, time along the last axis.
+    num: int
+        number of surrogates.
+    method: str, default='time_shift'
+        'time_shift' shifts envelopes circularly by a random lag of at least
+        `min_shift` samples (default: 10% of the samples).  'block_swap' cuts
+        envelopes into `num_blocks` blocks (default: 10, at least 2 and at
+        most the number of samples) and permutes them such that no block
+        stays in place.  'phase_shuffle' randomizes the
+        Fourier phases of the envelopes and maps the result onto the original
+        amplitude values (amplitude-adjusted surrogates).
+    rng: np.random.Generator, optional
+        source of randomness.
+
+    Returns
+    -------
+    np.ndarray of shape `(num,) + envelopes.shape`
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    surrogate_fn = {
+        'time_shift': _time_shift,
+        'block_swap': _block_swap,
+        'phase_shuffle': _phase_shuffle
+    }
+    try:
+        fn = surrogate_fn[method]
+    except KeyError:
+        raise ValueError(f"method ({method}) must be one of {METHODS}")
+    return fn(envelopes, num, rng, **kwargs)
+
+
+def surrogate_test(codes: np.ndarray, envelopes: np.ndarray,
+                   num_surrogates: int = 200, method: str = 'time_shift',
+                   num_bins: int = 18,
+                   rng: Optional[np.random.Generator] = None,
+                   batch_size: Optional[int] = None,
+                   aggregator: Aggregator = 'median',
+                   **kwargs) -> SurrogateResult:
+    """return modulation indices and their significance against surrogates
+
+    Phase bin codes and envelopes are computed once by the caller.  The
+    surrogates of all envelopes are generated and binned in batches of
+    `batch_size` with one call each, and the same surrogate lags (or block
+    orders, or phases) are used for all pairs of phase and amplitude bands.
+
+    Parameters
+    ----------
+    codes: np.ndarray
+        phase bin codes of shape `(..., n_slow, n)` or `(n,)`.
+    envelopes: np.ndarray
+        amplitude envelopes of shape `(..., n_fast, n)` or `(n,)`.  Leading
+        channel axes are broadcast against those of `codes`.
+    num_surrogates: int, default=200
+        size of the null distribution.
+    method: str, default='time_shift'
+        see `surrogates`.
+    num_bins: int, default=18
+        number of phase bins.
+    rng: np.random.Generator, optional
+        source of randomness.
+    batch_size: int, optional
+        number of surrogates processed at once.  By default, batches hold
+        about 2**25 envelope samples.
+    aggregator: str or callable, default='median'
+        average of the envelopes within phase bins, see
+        `aggregators.get_aggregator`.
+    **kwargs:
+        passed on to `surrogates`.
+
+    Returns
+    -------
+    SurrogateResult of arrays of shape `(..., n_slow, n_fast)` (scalars for
+    1-d input): the observed modulation index, its z-score and p-value with
+    respect to the surrogates, and mean and standard deviation of the
+    surrogate modulation indices.
+    """
+    squeeze = codes.ndim == 1 and envelopes.ndim == 1
+    codes = np.atleast_2d(codes)
+    envelopes = np.atleast_2d(envelopes)
+    rng = np.random.default_rng() if rng is None else rng
+    lead = np.broadcast_shapes(codes.shape[:-2], envelopes.shape[:-2])
+    n_slow, (n_fast, n) = codes.shape[-2], envelopes.shape[-2:]
+    if batch_size is None:
+        batch_size = max(1, _BATCH_SAMPLES // envelopes.size)
+    observed = _modulation_index(
+        binned_aggregate(codes, envelopes, num_bins, aggregator))
+    null = np.empty((num_surrogates,) + lead + (n_slow, n_fast),
+                    dtype=np.float64)
+    for start in range(0, num_surrogates, batch_size):
+        num = min(batch_size, num_surrogates - start)
+        shuffled = surrogates(envelopes, num, method, rng, **kwargs)
+        # stack surrogates next to the fast bands, (..., num*n_fast, n)
+        shuffled = np.moveaxis(shuffled, 0, -3).reshape(
+            envelopes.shape[:-2] + (num*n_fast, n))
+        avg = binned_aggregate(codes, shuffled, num_bins, aggregator)
+        null[start:start+num] = np.moveaxis(
+            _modulation_index(avg).reshape(lead + (n_slow, num, n_fast)),
+            -2, 0)
+    null_mean = null.mean(axis=0)
+    null_std = null.std(axis=0, ddof=1)
+    zscore = (observed - null_mean) / null_std
+    pvalue = (1 + np.sum(null >= observed, axis=0)) / (1 + num_surrogates)
+    ans = SurrogateResult(observed, zscore, pvalue, null_mean, null_std)
+    if squeeze:
+        ans = SurrogateResult(*(x[0, 0] for x in ans))
+    return ans
+
+
+def surrogate_comodulogram(samples: np.ndarray, sampling_rate: float,
+                           slow_filters: Filters, fast_filters: Filters,
+                           num_surrogates: int = 200,
+                           method: str = 'time_shift', num_bins: int = 18,
+                           rng: Optional[np.random.Generator] = None,
+                           engine: str = 'time', filter_shape: str = 'butter',
+                           axis: int = -1, precision: str = 'double',
+                           aggregator: Aggregator = 'median',
+                           as_frame: bool = True, **kwargs):
+    """return `comodulogram` with z-scores and p-values against surrogates
+
+    Filtering is done once, see `surrogate_test` for the parameters and
+    `comodulogram` for the filters, which may be `FilterBank`s.
+
+    Returns
+    -------
+    SurrogateResult of pd.DataFrame's with index `f_fast` (or `(channel,
+    f_fast)`, see `comodulogram`) and columns `f_slow`.  With
+    `as_frame=False`, a `ComodulogramResult` with one layer per field of
+    `SurrogateResult`.
+    """
+    slow_centers, fast_centers, codes, envelopes = _codes_and_envelopes(
+        samples, sampling_rate, slow_filters, fast_filters, num_bins, axis,
+        engine=engine, filter_shape=filter_shape, precision=precision)
+    ans = surrogate_test(codes, envelopes, num_surrogates, method, num_bins,
+                         rng, aggregator=aggregator, **kwargs)
+    if not as_frame:
+        return ComodulogramResult.from_layers(ans._asdict(), slow_centers,
+                                              fast_centers)
+    frames = [_to_frame(x, slow_centers, fast_centers) for x in ans]
+    return SurrogateResult(*frames)
@@ -0,0 +1,71 @@
+import pytest
+import numpy as np
+
+from .adaptive import adaptive_comodulogram
+from .comodulogram import comodulogram
+from .filter_series import FilterSeries
+
+SLOW = FilterSeries(3.0, 15.0, 4.0)
+FAST = FilterSeries(30.0, 100.0, 40.0)
+
+
+@pytest.fixture
+def samples(make_samples):
+    return make_samples(30.0, coupling=0.9)
+
+
+def test_adaptive_comodulogram(samples):
+    sr, x = samples
+    ans = adaptive_comodulogram(x, sr, SLOW, FAST, (0.25, 2.5))
+    coarse = ans.level == 0
+    expected = comodulogram(x, sr, SLOW, FAST, as_frame=False)
+    assert np.array_equal(np.unique(ans.f_slow[coarse]), expected.f_slow)
+    assert np.array_equal(np.unique(ans.f_fast[coarse]), expected.f_fast)
+    assert np.allclose(ans.modulation_index[coarse],
+                       expected['modulation_index'].ravel())
+    assert ans.level.max() == 2
+    assert np.allclose(np.diff(np.unique(ans.f_slow[ans.level == 2])), 0.25)
+    # fewer pairs than the dense grid at the target resolution
+    assert ans.f_slow.size < 45 * 25
+    f_slow, f_fast, mi = ans.peak()
+    assert abs(f_slow - 6.0) <= SLOW.width/2 and 40.0 <= f_fast <= 90.0
+    assert mi == ans.modulation_index.max()
+    assert ans.zscore is None
+    assert len(ans.to_dataframe()) == ans.f_slow.size
+
+
+def test_threshold_above_all_scores_stops_at_the_coarse_grid(samples):
+    sr, x = samples
+    ans = adaptive_comodulogram(x, sr, SLOW, FAST, (0.25, 2.5),
+                                threshold=1.0)
+    assert np.all(ans.level == 0)
+
+
+def test_adaptive_comodulogram_with_surrogates(samples):
+    sr, x = samples
+    x = np.stack([x, x[::-1]])
+    ans = adaptive_comodulogram(x, sr, SLOW, FAST, (0.5, 5.0),
+                                threshold=5.0, num_surrogates=20,
+                                rng=np.random.default_rng(0))
+    assert ans.zscore.shape == ans.modulation_index.shape == \
+        (2, ans.f_slow.size)
+    assert ans.level.max() == 1
+    assert ans.peak()[0].shape == (2,)
+    frame = ans.to_dataframe()
+    assert len(frame) == 2 * ans.f_slow.size
+    assert list(frame.columns) == ['channel', 'f_slow', 'f_fast', 'level',
+                                   'modulation_index', 'zscore']
+
+
+def test_invalid_resolution(samples):
+    sr, x = samples
+    with pytest.raises(ValueError):
+        adaptive_comodulogram(x, sr, SLOW, FAST, (0.0, 2.5))
+
+
+def test_filter_banks_are_rejected(samples):
+    sr, x = samples
+    with pytest.raises(ValueError):
+        adaptive_comodulogram(x, sr, SLOW.filter_bank(sr), FAST, (0.5, 2.5))
+    with pytest.raises(ValueError):
+        adaptive_comodulogram(x, sr, SLOW, FAST.filter_bank(sr), (0.5, 2.5))
@@ -0,0 +1,77 @@
+from functools import partial
+
+import pytest
+import numpy as np
+from scipy.stats import trim_mean
+from .aggregators import (
+    AGGREGATORS,
+    binned_aggregate,
+    binned_trimmed_mean,
+    QuantileSketch
+)
+from .util import phase_bin_codes
+
+
+@pytest.fixture
+def binned():
+    np.random.seed(42)
+    codes = phase_bin_codes(2*np.pi*np.random.rand(2, 3, 500), 6)
+    amplitudes = np.random.rand(2, 4, 500)
+    amplitudes[..., :100] = amplitudes[..., :1]  # repeated values
+    return codes, amplitudes
+
+
+def _expected(codes, amplitudes, fn):
+    ans = np.empty(codes.shape[:-1] + amplitudes.shape[-2:-1] + (6,))
+    for c in np.ndindex(codes.shape[:-2]):
+        for i, j, k in np.ndindex(ans.shape[-3:]):
+            ans[c + (i, j, k)] = fn(amplitudes[c][j, codes[c][i] == k])
+    return ans
+
+
+@pytest.mark.parametrize('aggregator, fn', [
+    ('median', np.median),
+    ('mean', np.mean),
+    ('trimmed_mean', partial(trim_mean, proportiontocut=0.1)),
+    (partial(binned_trimmed_mean, proportiontocut=0.25),
+     partial(trim_mean, proportiontocut=0.25)),
+])
+@pytest.mark.parametrize('num_phase', [1, 3])
+def test_binned_aggregate(binned, aggregator, fn, num_phase):
+    codes, amplitudes = binned
+    codes = codes[:, :num_phase]
+    avg = binned_aggregate(codes, amplitudes, 6, aggregator)
+    assert avg.shape == (2, num_phase, 4, 6)
+    assert avg == pytest.approx(_expected(codes, amplitudes, fn))
+
+
+@pytest.mark.parametrize('aggregator', AGGREGATORS)
+def test_empty_bins(aggregator):
+    codes = np.array([0, 0, 2, 2, 2], dtype=np.uint8)
+    avg = binned_aggregate(codes, np.arange(5.0), 3, aggregator)[0, 0]
+    assert np.isnan(avg[1]) and not np.any(np.isnan(avg[[0, 2]]))
+
+
+def test_unknown_aggregator():
+    with pytest.raises(ValueError):
+        binned_aggregate(np.zeros(3, dtype=np.uint8), np.ones(3), 3, 'mode')
+
+
+def test_quantile_sketch():
+    np.random.seed(42)
+    codes = phase_bin_codes(2*np.pi*np.random.rand(2, 10000), 6)
+    values = np.random.lognormal(size=(2, 10000))
+    sketch = QuantileSketch(6, shape=(2,), relative_accuracy=0.01)
+    for i in range(0, 10000, 3000):
+        sketch.add(codes[:, i:i+3000], values[:, i:i+3000])
+    expected = binned_aggregate(codes[:, None], values[:, None], 6)[:, 0, 0]
+    assert sketch.median() == pytest.approx(expected, rel=0.02)
+    sketch.add(codes[:, 5000:], values[:, 5000:], weight=-1)
+    expected = binned_aggregate(codes[:, None, :5000], values[:, None, :5000],
+                                6)[:, 0, 0]
+    assert sketch.median() == pytest.approx(expected, rel=0.02)
+    assert sketch.counts.sum() == 2 * 5000
+
+
+def test_empty_quantile_sketch():
+    assert np.all(np.isnan(QuantileSketch(4).median()))
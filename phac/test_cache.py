@@ -0,0 +1,39 @@
+import pytest
+import numpy as np
+from .cache import ArrayCache
+
+
+def test_cache_counts_hits_and_misses():
+    cache = ArrayCache()
+    first = cache.get('a', lambda: np.zeros(10))
+    second = cache.get('a', lambda: np.ones(10))
+    assert second is first
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.nbytes) == (1, 1, 80)
+
+
+def test_cached_arrays_are_read_only():
+    arr = ArrayCache().get('a', lambda: np.zeros(10))
+    with pytest.raises(ValueError):
+        arr[0] = 1.0
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ArrayCache(max_bytes=200)
+    cache.put('a', np.zeros(10))
+    cache.put('b', np.zeros(10))
+    cache.get('a', lambda: np.zeros(10))
+    cache.put('c', np.zeros(10))
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    cache.put('d', np.zeros(100))
+    assert 'd' not in cache and len(cache) == 2
+
+
+def test_cache_invalidate():
+    cache = ArrayCache()
+    for key in [(1, 'x'), (1, 'y'), (2, 'x')]:
+        cache.put(key, np.zeros(1))
+    cache.invalidate(lambda key: key[0] == 1)
+    assert list(cache._arrays) == [(2, 'x')]
+    cache.invalidate()
+    assert len(cache) == 0
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import numpy as np
+from .calibration import (analysis_bands, calibrate, detection_curve,
+                          load_records, parameter_grid, summarize)
+
+GRID = {'coupling': [0.0, 0.6], 'amplitude': [0.5, 1.0],
+        'band': [(40.0, 90.0)], 'frequency': [6.0], 'dphi': [1.0]}
+
+
+def test_parameter_grid():
+    cells = parameter_grid({'a': [1, 2], 'b': ['x', 'y', 'z']})
+    assert len(cells) == 6
+    assert cells[1] == {'a': 1, 'b': 'y'}
+
+
+@pytest.mark.parametrize('suffix', ['.jsonl', '.csv'])
+def test_calibrate(tmp_path, suffix):
+    path = str(tmp_path / f'records{suffix}')
+    ans = calibrate(GRID, num_realizations=8, duration=5.0, batch_size=3,
+                    path=path)
+    # 4 coupled cells and 2 uncoupled ones
+    assert len(ans.records) == 6*8
+    assert len(ans.summary) == 4
+    summary = ans.summary.set_index(['coupling', 'amplitude'])
+    assert np.all(summary.loc[0.6, 'detection_rate'] == 1.0)
+    assert np.all(summary.loc[0.0, 'detection_rate'] <= 0.5)
+    assert np.all(summary['null_q95'] <= summary['null_q99'])
+    assert summarize(load_records(path)).equals(ans.summary)
+    curve = detection_curve(ans.summary)
+    assert curve.shape == (2, 2)
+
+
+def test_calibrate_is_reproducible_in_parallel():
+    expected = calibrate(GRID, num_realizations=4, duration=5.0,
+                         batch_size=2, seed=3)
+    with ThreadPoolExecutor(2) as executor:
+        ans = calibrate(GRID, num_realizations=4, duration=5.0,
+                        batch_size=2, seed=3, executor=executor)
+    assert ans.records.equals(expected.records)
+    other = calibrate(GRID, num_realizations=4, duration=5.0, batch_size=2,
+                      seed=4)
+    assert not other.records.equals(expected.records)
+
+
+def test_calibrate_on_default_settings():
+    ans = calibrate({'coupling': [0.1, 0.5]}, num_realizations=8,
+                    duration=4.0)
+    rates = ans.summary.set_index('coupling')['detection_rate']
+    assert rates[0.5] > rates[0.1]
+    assert rates[0.5] >= 0.5
+
+
+def test_analysis_bands():
+    assert analysis_bands({}) == ((16.0, 24.0), (50.0, 90.0))
+    slow, fast = analysis_bands({'frequency': 6.0, 'band': [40.0, 90.0]})
+    assert np.allclose(slow, (4.8, 7.2)) and fast == (40.0, 90.0)
+    assert analysis_bands({}, (4.0, 8.0)) == ((4.0, 8.0), (50.0, 90.0))
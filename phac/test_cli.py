@@ -0,0 +1,126 @@
+import pytest
+import numpy as np
+
+from .cli import find_recordings, load, main, run
+from .comodulogram import comodulogram_metrics
+from .filter_series import FilterSeries
+from .models import sin_with_noise
+from .result import ComodulogramResult
+
+SLOW = FilterSeries(4.0, 10.0, 2.0)
+FAST = FilterSeries(40.0, 90.0, 20.0)
+ARGS = ['--slow', '4', '10', '2', '--fast', '40', '90', '20']
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    rng = np.random.default_rng(0)
+    sr = 256.0
+    t = np.arange(int(10.0*sr))/sr
+    x = sin_with_noise(t, frequency=6.0, dphi=1.0, band=(40.0, 90.0),
+                       coupling=0.9, rng=rng, size=3)
+    (tmp_path / 'data' / 'sub').mkdir(parents=True)
+    np.save(tmp_path / 'data' / 'a.npy', x[0])
+    np.save(tmp_path / 'data' / 'sub' / 'b.npy', x[1])
+    # two interleaved float32 channels behind a 16 byte header
+    raw = np.concatenate([np.zeros(4, dtype=np.float32),
+                          x[1:].T.astype(np.float32).ravel()])
+    raw.tofile(tmp_path / 'c.bin')
+    (tmp_path / 'manifest.csv').write_text(
+        'path,sampling_rate,dtype,num_channels,offset\n'
+        'c.bin,256,float32,2,16\n')
+    return sr, x
+
+
+def test_find_and_load_recordings(tmp_path, recordings):
+    sr, x = recordings
+    found = find_recordings([str(tmp_path / 'data'),
+                             str(tmp_path / 'manifest.csv')], sr)
+    assert [r.name for r in found] == ['a.npy', 'sub/b.npy', 'c.bin']
+    assert np.array_equal(load(found[1]), x[1])
+    assert found[2].sampling_rate == 256.0
+    assert np.allclose(load(found[2]), x[1:].astype(np.float32))
+    with pytest.raises(ValueError):
+        find_recordings([str(tmp_path / 'data')])
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_run(tmp_path, recordings, n_jobs):
+    sr, x = recordings
+    found = find_recordings([str(tmp_path / 'data')], sr)
+    output = str(tmp_path / 'out')
+    done = dict(run(found, output, n_jobs, slow_filters=SLOW,
+                    fast_filters=FAST, metrics=['modulation_index', 'glm']))
+    assert len(done) == 2
+    ans = ComodulogramResult.load(str(done[found[1]]), mmap_mode='r')
+    expected = comodulogram_metrics(x[1], sr, SLOW, FAST,
+                                    ['modulation_index', 'glm'],
+                                    as_frame=False)
+    assert ans.layers == expected.layers
+    assert np.allclose(ans.values, expected.values)
+    assert list(run(found, output, n_jobs, slow_filters=SLOW,
+                    fast_filters=FAST)) == []
+
+
+def test_run_with_filter_banks(tmp_path, recordings):
+    sr, x = recordings
+    found = find_recordings([str(tmp_path / 'data')], sr)
+    done = dict(run(found, str(tmp_path / 'out'),
+                    slow_filters=SLOW.filter_bank(sr),
+                    fast_filters=FAST.filter_bank(sr), engine='fft'))
+    ans = ComodulogramResult.load(str(done[found[0]]))
+    expected = comodulogram_metrics(x[0], sr, SLOW, FAST,
+                                    ['modulation_index'], as_frame=False)
+    assert np.allclose(ans['modulation_index'], expected.values[0])
+
+
+def test_main_resumes(tmp_path, recordings, capsys):
+    output = str(tmp_path / 'out')
+    inputs = [str(tmp_path / 'data'), str(tmp_path / 'manifest.csv')]
+    (tmp_path / 'out').mkdir()
+    np.savez(tmp_path / 'out' / 'a.npz')
+    assert main(inputs + ['-r', '256', '-o', output] + ARGS) == 0
+    assert capsys.readouterr().out.endswith(
+        '2 recordings processed, 0 failed, 1 skipped\n')
+    assert ComodulogramResult.load(output + '/c.npz').shape[:2] == (1, 2)
+    assert not list((tmp_path / 'out').rglob('*.partial.npz'))
+    assert main(inputs + ['-r', '256', '-o', output] + ARGS) == 0
+    assert capsys.readouterr().out == \
+        '0 recordings processed, 0 failed, 3 skipped\n'
+    assert main(inputs[:1] + ['-o', output] + ARGS) == 2
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_run_continues_after_failures(tmp_path, recordings, n_jobs):
+    sr, x = recordings
+    (tmp_path / 'data' / 'bad.npy').write_bytes(b'not an array')
+    found = find_recordings([str(tmp_path / 'data')], sr)
+    done = dict(run(found, str(tmp_path / 'out'), n_jobs, slow_filters=SLOW,
+                    fast_filters=FAST))
+    assert len(done) == 3
+    assert isinstance(done[found[1]], ValueError)
+    assert done[found[0]].exists() and done[found[2]].exists()
+
+
+def test_main_reports_failures(tmp_path, recordings, capsys):
+    (tmp_path / 'data' / 'bad.npy').write_bytes(b'not an array')
+    output = str(tmp_path / 'out')
+    assert main([str(tmp_path / 'data'), '-r', '256', '-o', output]
+                + ARGS) == 1
+    captured = capsys.readouterr()
+    assert 'bad.npy' in captured.err
+    assert captured.out.endswith('2 recordings processed, 1 failed, '
+                                 '0 skipped\n')
+
+
+def test_run_fails_on_same_outputs(tmp_path, recordings):
+    sr, x = recordings
+    np.save(tmp_path / 'a.npy', x[2])
+    found = find_recordings([str(tmp_path / 'data' / 'a.npy'),
+                             str(tmp_path / 'a.npy')], sr)
+    output = str(tmp_path / 'out')
+    with pytest.raises(ValueError):
+        list(run(found, output, slow_filters=SLOW, fast_filters=FAST))
+    assert not (tmp_path / 'out').exists()
+    assert main([str(tmp_path / 'data' / 'a.npy'), str(tmp_path / 'a.npy'),
+                 '-r', '256', '-o', output] + ARGS) == 2
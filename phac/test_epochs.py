@@ -0,0 +1,104 @@
+import pytest
+import numpy as np
+
+from .epochs import (epoch_indices, epoched_phase_amplitude_coupling,
+                     epoched_comodulogram)
+from .comodulogram import comodulogram
+from .filter_series import FilterSeries
+from .pac import phase_amplitude_coupling
+from .signal import Signal
+
+
+@pytest.fixture
+def samples(make_samples):
+    return make_samples(20.0, coupling=0.9)
+
+
+def test_epoch_indices():
+    indices = epoch_indices([10, 20], (-0.5, 1.0), 4.0, 30)
+    assert np.array_equal(indices, [[8, 9, 10, 11, 12, 13],
+                                    [18, 19, 20, 21, 22, 23]])
+    with pytest.raises(ValueError):
+        epoch_indices([1, 20], (-0.5, 1.0), 4.0, 30)
+    with pytest.raises(ValueError):
+        epoch_indices([10, 27], (-0.5, 1.0), 4.0, 30)
+
+
+def test_epochs_tiling_the_recording_pool_to_the_recording(samples):
+    sr, x = samples
+    events = np.arange(0, x.size, 512)
+    ans = epoched_phase_amplitude_coupling(
+        Signal(x, sr), events, (0.0, 2.0), (4.0, 8.0), (40.0, 90.0))
+    assert ans.time.shape == (512,)
+    assert ans.time[0] == 0.0
+    assert ans.trials.modulation_index.shape == events.shape
+    expected = phase_amplitude_coupling(x, sr, (4.0, 8.0), (40.0, 90.0))
+    assert np.allclose(ans.pooled.modulation_index, expected.modulation_index)
+    assert np.allclose(ans.pooled.mean_phase_coherence,
+                       expected.mean_phase_coherence)
+
+
+def test_multichannel_epochs(samples):
+    sr, x = samples
+    x = np.stack([x, x[::-1]], axis=-1)
+    events = np.array([300, 1200, 4000])
+    ans = epoched_phase_amplitude_coupling(
+        Signal(x, sr, axis=0), events, (-1.0, 1.0), (4.0, 8.0),
+        (40.0, 90.0), aggregator='mean')
+    assert ans.trials.modulation_index.shape == (2, 3)
+    assert ans.pooled.modulation_index.shape == (2,)
+    single = epoched_phase_amplitude_coupling(
+        Signal(x[:, 1], sr), events, (-1.0, 1.0), (4.0, 8.0),
+        (40.0, 90.0), aggregator='mean')
+    assert np.allclose(ans.trials.modulation_index[1],
+                       single.trials.modulation_index)
+
+
+def test_epoched_comodulogram(samples):
+    sr, x = samples
+    slow = FilterSeries(4.0, 10.0, 2.0)
+    fast = FilterSeries(40.0, 90.0, 20.0)
+    events = np.arange(0, x.size, 1024)
+    ans = epoched_comodulogram(Signal(x, sr), events, (0.0, 4.0), slow, fast)
+    expected = comodulogram(x, sr, slow, fast, as_frame=False)
+    assert ans.trials.shape == expected.shape[:1] + events.shape \
+        + expected.shape[1:]
+    assert np.allclose(ans.pooled.values, expected.values)
+    # the strongest coupling of each trial is near the modulating frequency
+    best = ans.trials.f_slow[ans.trials['modulation_index'].max(axis=-1)
+                             .argmax(axis=-1)]
+    assert np.all(np.abs(best - 6.0) <= 1.0)
+
+
+def test_epoched_comodulogram_of_filter_banks(samples):
+    sr, x = samples
+    slow = FilterSeries(4.0, 10.0, 2.0)
+    fast = FilterSeries(40.0, 90.0, 20.0)
+    events = np.arange(0, x.size, 1024)
+    signal = Signal(x, sr)
+    expected = epoched_comodulogram(signal, events, (0.0, 4.0), slow, fast)
+    ans = epoched_comodulogram(signal, events, (0.0, 4.0),
+                               slow.filter_bank(sr), fast.filter_bank(sr))
+    assert np.array_equal(ans.trials.values, expected.trials.values,
+                          equal_nan=True)
+    assert np.array_equal(ans.pooled.values, expected.pooled.values)
+    with pytest.raises(ValueError):
+        epoched_comodulogram(signal, events, (0.0, 4.0),
+                             slow.filter_bank(2*sr), fast)
+
+
+def test_short_epochs_with_empty_bins(samples):
+    sr, x = samples
+    events = np.arange(256, x.size - 256, 128)
+    signal = Signal(x, sr)
+    ans = epoched_phase_amplitude_coupling(signal, events, (-0.05, 0.05),
+                                           (4.0, 8.0), (40.0, 90.0))
+    empty = np.isnan(ans.trials.modulation_index)
+    assert np.any(empty)
+    assert np.array_equal(np.isnan(ans.trials.mean_phase_coherence), empty)
+    assert 0.0 < ans.pooled.modulation_index < 1.0
+    slow = FilterSeries(4.0, 10.0, 2.0)
+    fast = FilterSeries(40.0, 90.0, 20.0)
+    comod = epoched_comodulogram(signal, events, (-0.05, 0.05), slow, fast)
+    assert np.any(np.isnan(comod.trials.values))
+    assert np.all(np.isfinite(comod.pooled.values))
@@ -0,0 +1,189 @@
+import pytest
+import numpy as np
+from .signal import Signal
+from .filter_bank import FilterBank
+from .filter_series import FilterSeries
+from .comodulogram import comodulogram, comodulogram_metrics
+
+
+@pytest.fixture
+def samples(make_samples):
+    return make_samples(60.0)
+
+
+def test_filter_bank_bands():
+    series = FilterSeries(4.0, 8.0, 2.0)
+    bank = FilterBank.from_series(series, 128.0)
+    assert len(bank) == len(list(series))
+    assert bank.centers == pytest.approx([band.center for band in series])
+
+
+def test_filter_bank_fails():
+    with pytest.raises(ValueError):
+        FilterBank([(5.0, 3.0)], 128.0)
+
+
+def test_filter_bank_matches_signal(samples):
+    sr, x = samples
+    bands = [(3.0, 5.0), (5.0, 7.0), (50.0, 70.0)]
+    bank = FilterBank(bands, sr)
+    signal = Signal(x, sr)
+    filtered = bank.filtered(x)
+    phases = bank.phase(x)
+    envelopes = bank.envelope(x)
+    assert phases.shape == envelopes.shape == (len(bands), x.size)
+    for i, band in enumerate(bands):
+        assert filtered[i] == pytest.approx(signal.filtered(band))
+        assert phases[i] == pytest.approx(signal.phase(band))
+        assert envelopes[i] == pytest.approx(signal.envelope(band))
+
+
+def test_fft_filter_bank_matches_signal(samples):
+    sr, x = samples
+    bands = [(3.0, 5.0), (50.0, 70.0)]
+    bank = FilterBank(bands, sr, engine='fft', filter_shape='ideal')
+    signal = Signal(x, sr, engine='fft', filter_shape='ideal')
+    analytic = bank.analytic(x)
+    for i, band in enumerate(bands):
+        assert analytic[i] == pytest.approx(signal.analytic(band))
+
+
+def test_comodulogram(samples):
+    sr, x = samples
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    C = comodulogram(x, sr, slow, fast)
+    assert C.shape == (len(list(fast)), len(list(slow)))
+    assert C.columns.name == 'f_slow' and C.index.name == 'f_fast'
+    f_fast, f_slow = C.stack().idxmax()
+    assert f_slow == pytest.approx(6.0, abs=1.0)
+    assert 50.0 < f_fast < 90.0
+
+
+def test_comodulogram_fft_engine(samples):
+    sr, x = samples
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    expected = comodulogram(x, sr, slow, fast)
+    C = comodulogram(x, sr, slow, fast, engine='fft')
+    assert C.values == pytest.approx(expected.values, rel=0.05,
+                                     abs=0.05*expected.values.max())
+
+
+def test_multichannel_comodulogram(samples):
+    sr, x = samples
+    x = np.stack([x[:5000], x[5000:10000]], axis=-1)
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    C = comodulogram(x, sr, slow, fast, axis=0)
+    assert C.index.names == ['channel', 'f_fast']
+    for i in range(2):
+        expected = comodulogram(x[:, i], sr, slow, fast)
+        assert np.array_equal(C.loc[i].values, expected.values)
+
+
+def test_single_precision_comodulogram(samples):
+    sr, x = samples
+    slow = FilterSeries(4.0, 10.0, 2.0)
+    fast = FilterSeries(40.0, 90.0, 20.0)
+    expected = comodulogram(x, sr, slow, fast)
+    C = comodulogram(x, sr, slow, fast, precision='single')
+    error = np.abs(C.values - expected.values).max()
+    assert error < 1e-3 * np.abs(expected.values).max()
+
+
+def test_filter_bank_save_and_load(samples, tmp_path):
+    sr, x = samples
+    bank = FilterSeries(4.0, 8.0, 2.0).filter_bank(sr)
+    assert bank.sos.shape == (len(bank), 4, 6)
+    path = str(tmp_path / 'bank.npz')
+    bank.save(path)
+    loaded = FilterBank.load(path, precision='single')
+    assert loaded.bands == bank.bands
+    assert loaded.sampling_rate == sr
+    assert loaded.precision == 'single'
+    assert np.array_equal(loaded.sos, bank.sos)
+    assert loaded.select([1]).filtered(x)[0] == pytest.approx(
+        bank.filtered(x)[1], rel=1e-4, abs=1e-4)
+
+
+def test_filter_bank_rejects_unstable_sos():
+    sos = np.array([[[1.0, 0.0, 0.0, 1.0, 0.0, -1.5]]])
+    with pytest.raises(ValueError):
+        FilterBank([(4.0, 6.0)], 128.0, sos=sos)
+
+
+def test_narrow_low_band_at_high_rate():
+    sr = 30000.0
+    t = np.arange(int(20*sr))/sr
+    x = np.sin(2*np.pi*1.0*t)
+    bank = FilterBank([(0.5, 2.0)], sr)
+    # the (b, a) form of this band-pass diverges
+    assert np.max(np.abs(bank.filtered(x)[0, t.size//4:-t.size//4])) \
+        == pytest.approx(1.0, abs=0.05)
+
+
+def test_multirate_envelopes_are_not_negative(samples):
+    sr, x = samples
+    bank = FilterBank([(5.0, 7.0)], sr, multirate=True)
+    envelope = bank.envelope(x)
+    assert np.all(envelope >= 0.0)
+    assert np.abs(bank.analytic(x)) == pytest.approx(envelope)
+
+
+def test_multirate_filter_bank(samples, tmp_path):
+    sr, x = samples
+    bands = [(5.0, 7.0), (50.0, 70.0)]
+    bank = FilterBank(bands, sr)
+    multirate = FilterBank(bands, sr, multirate=True)
+    assert multirate.factors == [4, 1]
+    sl = slice(int(5*sr), -int(5*sr))
+    dphi = np.angle(np.exp(1j*(bank.phase(x)[0] - multirate.phase(x)[0])))
+    assert np.max(np.abs(dphi[sl])) < 0.05
+    envelope = bank.envelope(x)[0]
+    assert multirate.envelope(x)[0, sl] == pytest.approx(envelope[sl],
+                                                         rel=0.05)
+    assert np.abs(multirate.analytic(x)[0]) == pytest.approx(
+        multirate.envelope(x)[0])
+    path = str(tmp_path / 'bank.npz')
+    multirate.save(path)
+    loaded = FilterBank.load(path)
+    assert loaded.multirate and loaded.factors == multirate.factors
+    assert np.array_equal(loaded.sos, multirate.sos)
+
+
+def test_multirate_comodulogram(samples):
+    sr, x = samples
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    expected = comodulogram(x, sr, slow, fast)
+    C = comodulogram(x, sr, slow, fast, multirate=True)
+    assert C.values == pytest.approx(expected.values,
+                                     abs=0.1*expected.values.max())
+
+
+def test_comodulogram_of_filter_banks(samples):
+    sr, x = samples
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    expected = comodulogram(x, sr, slow, fast)
+    C = comodulogram(x, sr, slow.filter_bank(sr), fast.filter_bank(sr))
+    assert C.equals(expected)
+    with pytest.raises(ValueError):
+        comodulogram(x, sr, slow.filter_bank(2*sr), fast)
+    with pytest.raises(ValueError):
+        comodulogram_metrics(x, sr, slow, fast.filter_bank(2*sr))
+
+
+def test_comodulogram_metrics(samples):
+    sr, x = samples
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    ans = comodulogram_metrics(x, sr, slow, fast)
+    expected = comodulogram(x, sr, slow, fast)
+    assert ans['modulation_index'].values == pytest.approx(expected.values)
+    banks = comodulogram_metrics(x, sr, slow.filter_bank(sr),
+                                 fast.filter_bank(sr),
+                                 metrics=['mean_vector_length'])
+    assert list(banks) == ['mean_vector_length']
+    assert banks['mean_vector_length'].equals(ans['mean_vector_length'])
@@ -0,0 +1,50 @@
+import pytest
+import numpy as np
+from scipy.signal import hilbert as _hilbert
+from .hilbert import (
+    hilbert,
+    overlap_for_tolerance,
+    segment_length
+)
+from .util import filtfilt
+
+
+def test_short_hilbert_is_exact():
+    x = np.random.randn(2, 1000)
+    assert hilbert(x, nsegment=1000) == pytest.approx(_hilbert(x))
+
+
+@pytest.mark.parametrize('n', [31744, 40000, 100003])
+@pytest.mark.parametrize('tolerance', [None, 1e-2, 1e-3])
+def test_segmented_hilbert(n, tolerance):
+    np.random.seed(42)
+    sr, fmin = 256.0, 4.0
+    x = filtfilt(np.random.randn(3, n), sr, fmin, 8.0)
+    expected = _hilbert(x)
+    analytic = hilbert(x, tolerance=tolerance, period=sr/fmin)
+    assert analytic.shape == x.shape
+    assert np.allclose(np.real(analytic), x)
+    # both transforms suffer from the circular FFT at the ends
+    error = np.abs(analytic - expected)[:, 2048:-2048]
+    scale = np.abs(expected).max(axis=-1, keepdims=True)
+    assert np.all(error / scale < (tolerance or 1e-2))
+
+
+def test_overlap_for_tolerance():
+    assert overlap_for_tolerance(64.0, 1e-2) == 649
+    with pytest.raises(ValueError):
+        overlap_for_tolerance(64.0, 0.0)
+
+
+@pytest.mark.parametrize('budget, num_bands, expected', [
+    (128*1024, 1, 1024),
+    (128*1024, 2, 512),
+    (128*1000, 1, 512),
+])
+def test_segment_length(budget, num_bands, expected):
+    assert segment_length(budget, num_bands) == expected
+
+
+def test_segment_length_fails():
+    with pytest.raises(ValueError):
+        segment_length(1024)
@@ -1,9 +1,15 @@
 import pytest
 import numpy as np
+from .filter_bank import FilterBank
+from .models import sin_with_noise
 from .metrics import (
     normalize,
     shannon_entropy,
-    _modulation_index
+    _modulation_index,
+    modulation_index,
+    mean_phase_coherence,
+    pac_metrics,
+    METRICS,
 )
 
 
@@ -43,3 +49,86 @@ def test_shannon_entropy(x, expected):
 def test_modulation_index_fails():
     with pytest.raises(ValueError):
         _modulation_index(np.array([-1, 1, 1]))
+
+
+def test_modulation_index_along_last_axis():
+    x = np.random.rand(3, 4, 18) + 0.1
+    mi = _modulation_index(x)
+    assert mi.shape == (3, 4)
+    for idx in np.ndindex(3, 4):
+        assert mi[idx] == pytest.approx(_modulation_index(x[idx]))
+
+
+@pytest.fixture
+def phases_and_amplitudes():
+    rng = np.random.default_rng(0)
+    phase = rng.uniform(0.0, 2*np.pi, size=(2, 500))
+    amplitude = 1.0 + 0.5*np.cos(phase[:1]) + 0.1*rng.random((3, 500))
+    return phase, amplitude
+
+
+# metrics of phases without their filters
+BINNED_METRICS = [m for m in METRICS if m != 'phase_locking_value']
+
+
+def test_pac_metrics(phases_and_amplitudes):
+    phase, amplitude = phases_and_amplitudes
+    ans = pac_metrics(phase, amplitude, BINNED_METRICS, num_bins=12)
+    assert list(ans) == BINNED_METRICS
+    for metric in BINNED_METRICS:
+        assert ans[metric].shape == (2, 3)
+    assert ans['modulation_index'][1, 2] == pytest.approx(
+        modulation_index(phase[1], amplitude[2]))
+    assert ans['mean_vector_length'][1, 2] == pytest.approx(
+        mean_phase_coherence(phase[1], amplitude[2]))
+    # the amplitudes are modulated by the first phase only
+    for metric in BINNED_METRICS:
+        assert np.all(ans[metric][0] > ans[metric][1])
+    assert ans['glm'][0] == pytest.approx(1.0, abs=0.1)
+
+
+def test_pac_metrics_wraps_phases(phases_and_amplitudes):
+    phase, amplitude = phases_and_amplitudes
+    expected = pac_metrics(phase, amplitude, BINNED_METRICS, num_bins=12)
+    # phases in [-pi, pi) as from np.angle
+    ans = pac_metrics(np.angle(np.exp(1.0j*phase)), amplitude,
+                      BINNED_METRICS, num_bins=12)
+    for metric in BINNED_METRICS:
+        assert np.allclose(ans[metric], expected[metric])
+
+
+def test_glm_matches_least_squares(phases_and_amplitudes):
+    phase, amplitude = phases_and_amplitudes
+    glm = pac_metrics(phase, amplitude, metrics=['glm'])['glm']
+    X = np.stack([np.cos(phase[1]), np.sin(phase[1]), np.ones(500)], axis=1)
+    beta, *_ = np.linalg.lstsq(X, amplitude[0], rcond=None)
+    residual = amplitude[0] - X @ beta
+    expected = 1.0 - np.sum(residual**2) \
+        / np.sum((amplitude[0] - amplitude[0].mean())**2)
+    assert glm[1, 0] == pytest.approx(expected)
+
+
+def test_pac_metrics_fails(phases_and_amplitudes):
+    with pytest.raises(ValueError):
+        pac_metrics(*phases_and_amplitudes, metrics=['tort'])
+    with pytest.raises(ValueError):
+        pac_metrics(*phases_and_amplitudes)
+
+
+def test_phase_locking_value_of_filtered_envelopes():
+    rng = np.random.default_rng(0)
+    sr = 256.0
+    t = np.arange(int(30*sr))/sr
+    x = sin_with_noise(t, frequency=6.0, dphi=1.0, band=(40.0, 90.0),
+                       coupling=0.9, rng=rng)
+    slow = FilterBank([(4.0, 8.0), (14.0, 18.0)], sr)
+    phase = slow.phase(x)
+    envelope = FilterBank([(40.0, 90.0)], sr).envelope(x)
+    plv = pac_metrics(phase, envelope, ['phase_locking_value'],
+                      slow_bank=slow)['phase_locking_value']
+    assert plv.shape == (2, 1)
+    expected = np.abs(np.mean(np.exp(1.0j*(
+        phase[0] - slow.select([0]).phase(envelope)[0, 0]))))
+    assert plv[0, 0] == pytest.approx(expected)
+    # the envelope follows the 6 Hz rhythm only
+    assert plv[0, 0] > 0.5 > plv[1, 0]
@@ -0,0 +1,38 @@
+import pytest
+import numpy as np
+from .models import sin_with_noise, triangle_wave
+
+
+@pytest.mark.parametrize('model,kwargs', [
+    (sin_with_noise, dict(frequency=6.0, dphi=1.0, band=(40.0, 90.0))),
+    (triangle_wave, dict(frequency=6.0)),
+])
+def test_models_are_seedable(model, kwargs):
+    t = np.arange(2560)/256.0
+    x = model(t, rng=np.random.default_rng(1), **kwargs)
+    assert x.shape == t.shape
+    assert np.array_equal(x, model(t, rng=np.random.default_rng(1), **kwargs))
+    batch = model(t, rng=np.random.default_rng(1), size=3, **kwargs)
+    assert batch.shape == (3, t.size)
+    assert not np.allclose(batch[0], batch[1])
+    np.random.seed(2)
+    y = model(t, **kwargs)
+    np.random.seed(2)
+    assert np.array_equal(y, model(t, **kwargs))
+
+
+def test_triangle_wave_without_jitter():
+    t = np.arange(1000)/100.0
+    x = triangle_wave(t, frequency=2.0, jitter=0.0, tilt=0.5,
+                      rng=np.random.default_rng(0), size=2)
+    assert np.array_equal(x[0], x[1])
+    # rises during the first half of each period and falls during the second
+    dx = np.diff(x[0])
+    assert np.all(dx[:24] > 0) and np.all(dx[26:49] < 0)
+
+
+def test_batch_sin_with_noise_is_normalized():
+    t = np.arange(2560)/256.0
+    x = sin_with_noise(t, frequency=6.0, dphi=1.0, coupling=0.0,
+                       amplitude=0.0, rng=np.random.default_rng(0), size=4)
+    assert np.max(np.abs(x), axis=-1) == pytest.approx(1.0, abs=1e-3)
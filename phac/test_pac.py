@@ -1,8 +1,24 @@
 import pytest
 import numpy as np
-from .pac import phase_amplitude_coupling, PACResult
+from .pac import (
+    phase_amplitude_coupling,
+    PACResult,
+    _window_sums,
+    sliding_phase_amplitude_coupling
+)
+from .streaming import streaming_phase_amplitude_coupling
+from .signal import Signal
+from .metrics import _modulation_index
+from .util import phase_bin_codes
 from .models import sin_with_noise
 
+SLOW, FAST = (4.0, 8.0), (50.0, 80.0)
+
+
+@pytest.fixture
+def samples(make_samples):
+    return make_samples(300.0)
+
 
 @pytest.mark.parametrize('coupling, expected', [
     (0.1, PACResult(0.000849, 0)),
@@ -34,3 +50,112 @@ def test_pac_on_sin_with_noise(coupling, expected):
     assert pac.modulation_index == pytest.approx(
         expected.modulation_index, abs=1e-5
     )
+
+
+@pytest.mark.parametrize('aggregator, rel', [('mean', 1e-3), ('median', 5e-2)])
+def test_pac_with_memory_budget(samples, aggregator, rel):
+    sr, x = samples
+    pac = phase_amplitude_coupling(x, sr, SLOW, FAST, aggregator=aggregator,
+                                   memory_budget=2*128*16384)
+    expected = phase_amplitude_coupling(x, sr, SLOW, FAST,
+                                        aggregator=aggregator)
+    assert pac.modulation_index == \
+        pytest.approx(expected.modulation_index, rel=rel)
+
+
+@pytest.mark.parametrize('axis', [0, -1])
+def test_multichannel_pac(samples, axis):
+    sr, x = samples
+    x = np.stack([x[:20000], x[20000:40000], x[40000:60000]])
+    pac = phase_amplitude_coupling(np.moveaxis(x, -1, axis), sr, SLOW, FAST,
+                                   axis=axis)
+    assert pac.modulation_index.shape == (3,)
+    for i, channel in enumerate(x):
+        expected = phase_amplitude_coupling(channel, sr, SLOW, FAST)
+        assert pac.modulation_index[i] == expected.modulation_index
+        assert pac.mean_phase_coherence[i] == expected.mean_phase_coherence
+    records = pac.to_records()
+    assert records.shape == (3,)
+    assert np.array_equal(records['modulation_index'], pac.modulation_index)
+
+
+def test_sliding_pac(samples):
+    sr, x = samples
+    x = x[:int(60*sr)]
+    pac = sliding_phase_amplitude_coupling(x, sr, SLOW, FAST, window=10.0,
+                                           step=2.5)
+    assert pac.time[0] == 5.0
+    assert np.allclose(np.diff(pac.time), 2.5)
+    assert pac.modulation_index.shape == (21,)
+    signal = Signal(x, sr)
+    phase, envelope = signal.phase(SLOW), signal.envelope(FAST)
+    for i, t in enumerate(pac.time):
+        window = slice(int((t-5.0)*sr), int((t+5.0)*sr))
+        codes = phase_bin_codes(phase[window], 12)
+        counts = np.bincount(codes)
+        env_avg = np.bincount(codes, envelope[window]) / counts
+        phi_avg = np.bincount(codes, phase[window]) / counts
+        assert pac.modulation_index[i] == pytest.approx(
+            _modulation_index(env_avg))
+        assert pac.mean_phase_coherence[i] == pytest.approx(
+            (env_avg * np.exp(1.0j*phi_avg)).mean())
+
+
+def test_sliding_pac_fails(samples):
+    sr, x = samples
+    with pytest.raises(ValueError):
+        sliding_phase_amplitude_coupling(x, sr, SLOW, FAST, window=10.0,
+                                         step=3.0)
+
+
+@pytest.mark.parametrize('aggregator', ['mean', 'median'])
+def test_sliding_pac_with_empty_bins(samples, aggregator):
+    sr, x = samples
+    x = x[:int(20*sr)]
+    pac = sliding_phase_amplitude_coupling(x, sr, SLOW, FAST, window=0.1,
+                                           step=0.05, aggregator=aggregator)
+    empty = np.isnan(pac.modulation_index)
+    assert np.any(empty)
+    assert np.array_equal(np.isnan(pac.mean_phase_coherence), empty)
+
+
+@pytest.mark.parametrize('num_blocks', [1, 3, 4, 7])
+def test_window_sums(num_blocks):
+    rng = np.random.default_rng(0)
+    block_sums = 1e8 + rng.random((2, 25, 3))
+    expected = np.stack([block_sums[:, i:i+num_blocks].sum(axis=1)
+                         for i in range(25 - num_blocks + 1)], axis=1)
+    ans = _window_sums(block_sums, num_blocks)
+    assert ans.shape == expected.shape
+    assert np.allclose(ans - num_blocks*1e8, expected - num_blocks*1e8,
+                       rtol=0, atol=1e-6)
+    counts = rng.integers(0, 5, (40, 2))
+    assert np.array_equal(_window_sums(counts, 3), counts[:-2] + counts[1:-1]
+                          + counts[2:])
+
+
+@pytest.mark.parametrize('engine', ['time', 'fft'])
+def test_single_precision_pac(samples, engine):
+    sr, x = samples
+    expected = phase_amplitude_coupling(x, sr, SLOW, FAST, engine=engine)
+    pac = phase_amplitude_coupling(x, sr, SLOW, FAST, engine=engine,
+                                   precision='single')
+    assert pac.modulation_index == pytest.approx(expected.modulation_index,
+                                                 rel=1e-4)
+
+
+@pytest.mark.parametrize('aggregator', ['mean', 'median'])
+def test_aggregators_of_pac(samples, aggregator):
+    sr, x = samples
+    expected = phase_amplitude_coupling(x, sr, SLOW, FAST,
+                                        aggregator=aggregator)
+    streamed = streaming_phase_amplitude_coupling(
+        np.array_split(x, 20), sr, SLOW, FAST, nsegment=16384,
+        noverlap=2048, aggregator=aggregator)
+    assert streamed.modulation_index == pytest.approx(
+        expected.modulation_index, rel=0.05)
+    sliding = sliding_phase_amplitude_coupling(
+        x, sr, SLOW, FAST, window=x.size/sr, step=x.size/sr/4,
+        aggregator=aggregator)
+    assert sliding.modulation_index[0] == pytest.approx(
+        expected.modulation_index, rel=0.05)
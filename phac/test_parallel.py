@@ -0,0 +1,64 @@
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import numpy as np
+from .parallel import SharedArray
+from .comodulogram import comodulogram
+from .filter_series import FilterSeries
+
+
+@pytest.fixture
+def samples(make_samples):
+    return make_samples(20.0)
+
+
+def test_shared_array_pickles_by_name():
+    arr = SharedArray.from_array(np.arange(6.0).reshape(2, 3))
+    try:
+        attached = pickle.loads(pickle.dumps(arr))
+        attached.array[1, 2] = -1.0
+        assert arr.array[1, 2] == -1.0
+        attached.close()
+    finally:
+        arr.close()
+
+
+@pytest.mark.parametrize('precision', ['double', 'single'])
+@pytest.mark.parametrize('engine', ['time', 'fft'])
+def test_parallel_comodulogram_is_identical(samples, engine, precision):
+    sr, x = samples
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    expected = comodulogram(x, sr, slow, fast, engine=engine,
+                            precision=precision)
+    C = comodulogram(x, sr, slow, fast, engine=engine, precision=precision,
+                     n_jobs=2)
+    assert np.array_equal(C.values, expected.values)
+    with ThreadPoolExecutor(3) as executor:
+        C = comodulogram(x, sr, slow, fast, engine=engine,
+                         precision=precision, executor=executor)
+    assert np.array_equal(C.values, expected.values)
+
+
+def test_parallel_multichannel_comodulogram(samples):
+    sr, x = samples
+    x = np.stack([x[:2560], x[2560:]])
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    expected = comodulogram(x, sr, slow, fast)
+    with ThreadPoolExecutor(2) as executor:
+        C = comodulogram(x, sr, slow, fast, executor=executor)
+    assert np.array_equal(C.values, expected.values)
+
+
+@pytest.mark.parametrize('aggregator', ['mean', 'trimmed_mean'])
+def test_parallel_aggregator(samples, aggregator):
+    sr, x = samples
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    expected = comodulogram(x, sr, slow, fast, aggregator=aggregator)
+    with ThreadPoolExecutor(2) as executor:
+        C = comodulogram(x, sr, slow, fast, executor=executor,
+                         aggregator=aggregator)
+    assert np.array_equal(C.values, expected.values)
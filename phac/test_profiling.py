@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+
+from . import profiling
+from .profiling import profile, stage, timed
+from .signal import Signal
+from .comodulogram import comodulogram
+from .filter_series import FilterSeries
+from .models import sin_with_noise
+
+
+def test_stage_is_not_recorded_without_profile():
+    calls = []
+
+    @stage('test.square')
+    def square(x):
+        calls.append(x)
+        return x**2
+
+    assert square(3) == 9
+    assert calls == [3]
+    assert profiling._open == []
+    assert timed('test.region') is profiling._NULL
+
+
+def test_profile_records_calls_and_bytes():
+    @stage('test.ones')
+    def ones(n):
+        return np.ones(n)
+
+    events = []
+    with profile(lambda *args: events.append(args)) as prof:
+        ones(10)
+        ones(20)
+        with timed('test.region'):
+            pass
+    ones(30)
+    stats = prof.stages
+    assert stats['test.ones'].calls == 2
+    assert stats['test.ones'].nbytes == 30 * 8
+    assert stats['test.ones'].seconds >= 0.0
+    assert stats['test.region'].calls == 1
+    assert [name for name, *_ in events] == [
+        'test.ones', 'test.ones', 'test.region']
+
+
+def test_profile_counts_cache_hits():
+    sr = 128.0
+    x = np.sin(2*np.pi*5.0*np.arange(1280)/sr)
+    signal = Signal(x, sr)
+    with profile() as prof:
+        signal.phase((4.0, 6.0))
+        signal.envelope((4.0, 6.0))
+    stats = prof.stages
+    # analytic and filtered signal
+    assert stats['Signal.phase'].cache_misses == 2
+    assert stats['Signal.envelope'].cache_hits == 1
+    assert stats['hilbert'].calls == 1
+    assert stats['util.filtfilt'].calls == 1
+
+
+def test_profile_of_comodulogram_to_json(tmp_path):
+    sr = 256.0
+    x = sin_with_noise(np.arange(1024)/sr, 6.0, dphi=1.0, coupling=0.5)
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    with profile() as prof:
+        comodulogram(x, sr, slow, fast)
+    path = tmp_path / 'profile.json'
+    ans = json.loads(prof.to_json(str(path)))
+    assert json.loads(path.read_text()) == ans
+    for name in ['comodulogram', 'comodulogram.filter', 'hilbert',
+                 'util.bin_codes', 'aggregate',
+                 'comodulogram.modulation_index']:
+        assert ans[name]['calls'] >= 1
+    assert ans['comodulogram']['seconds'] >= ans['hilbert']['seconds']
@@ -0,0 +1,77 @@
+import pytest
+import numpy as np
+
+from .comodulogram import comodulogram, comodulogram_metrics
+from .filter_series import FilterSeries
+from .result import ComodulogramResult
+from .surrogates import SurrogateResult, surrogate_comodulogram
+
+
+@pytest.fixture
+def samples(make_samples):
+    return make_samples(20.0, coupling=0.9)
+
+
+SLOW = FilterSeries(4.0, 10.0, 2.0)
+FAST = FilterSeries(40.0, 90.0, 20.0)
+
+
+def test_comodulogram_result(samples):
+    sr, x = samples
+    expected = comodulogram(x, sr, SLOW, FAST)
+    ans = comodulogram(x, sr, SLOW, FAST, as_frame=False)
+    assert ans.layers == ('modulation_index',)
+    assert ans.shape == (1,) + expected.shape[::-1]
+    assert np.array_equal(ans['modulation_index'], expected.to_numpy().T)
+    assert ans.to_dataframe().equals(expected)
+    with pytest.raises(KeyError):
+        ans['glm']
+
+
+def test_multichannel_result_to_dataframe(samples):
+    sr, x = samples
+    x = np.stack([x, x[::-1]])
+    expected = comodulogram(x, sr, SLOW, FAST)
+    ans = comodulogram(x, sr, SLOW, FAST, as_frame=False)
+    assert ans.shape == (1, 2, expected.shape[1], expected.shape[0] // 2)
+    assert ans.to_dataframe().equals(expected)
+
+
+def test_metrics_and_surrogate_layers(samples):
+    sr, x = samples
+    frames = comodulogram_metrics(x, sr, SLOW, FAST)
+    ans = comodulogram_metrics(x, sr, SLOW, FAST, as_frame=False)
+    assert ans.layers == tuple(frames)
+    for metric, frame in frames.items():
+        assert np.allclose(ans.to_dataframe(metric), frame)
+    ans = surrogate_comodulogram(x, sr, SLOW, FAST, num_surrogates=10,
+                                 rng=np.random.default_rng(0),
+                                 as_frame=False)
+    assert ans.layers == SurrogateResult._fields
+
+
+@pytest.mark.parametrize('name', ['result.npz', 'result'])
+@pytest.mark.parametrize('mmap_mode', [None, 'r'])
+def test_save_and_load(tmp_path, mmap_mode, name):
+    rng = np.random.default_rng(0)
+    ans = ComodulogramResult.from_layers(
+        {'a': rng.random((3, 4, 5)), 'b': rng.random((3, 4, 5))},
+        np.arange(4.0), np.arange(5.0))
+    path = str(tmp_path / name)
+    ans.save(path)
+    assert (tmp_path / 'result.npz').exists()
+    loaded = ComodulogramResult.load(path, mmap_mode)
+    assert isinstance(loaded.values, np.memmap) == (mmap_mode is not None)
+    assert loaded.layers == ans.layers
+    assert np.array_equal(loaded.values, ans.values)
+    assert np.array_equal(loaded.f_fast, ans.f_fast)
+    assert loaded.to_dataframe('b').equals(ans.to_dataframe('b'))
+
+
+def test_wrong_shape():
+    with pytest.raises(ValueError):
+        ComodulogramResult(np.zeros((2, 4, 5)), np.arange(4.0),
+                           np.arange(5.0))
+    with pytest.raises(ValueError):
+        ComodulogramResult(np.zeros((1, 5, 4)), np.arange(4.0),
+                           np.arange(5.0))
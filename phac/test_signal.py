@@ -85,3 +85,158 @@ def test_envelope(sr, f, band):
     envelope = signal.envelope(band)
     assert envelope[sl].mean() == pytest.approx(1.0, abs=1e-1)
     assert envelope[sl] == pytest.approx(envelope[sl].mean(), abs=1e-1)
+
+
+@pytest.mark.parametrize('sr, f, band', [
+    (128.0, 10.0, (5.0, 15.0)),
+    (512.0, 50.0, (30.0, 60.0)),
+])
+def test_fft_engine(sr, f, band):
+    t = time(sr)
+    x = np.sin(phase(t, f)) + 0.05*np.random.randn(t.size)
+    time_domain = Signal(x, sr)
+    frequency_domain = Signal(x, sr, engine='fft')
+    sl = slice(int(0.1*t.size), int(0.9*t.size))
+    dphi = phase_difference(frequency_domain.phase(band),
+                            time_domain.phase(band))
+    assert dphi[sl] == pytest.approx(0.0, abs=1e-2)
+    assert frequency_domain.envelope(band)[sl] == pytest.approx(
+        time_domain.envelope(band)[sl], abs=1e-2)
+    assert frequency_domain.filtered(band)[sl] == pytest.approx(
+        time_domain.filtered(band)[sl], abs=1e-2)
+
+
+def test_engine_fails():
+    with pytest.raises(ValueError):
+        Signal(np.zeros(10), 1.0, engine='unknown')
+
+
+@pytest.mark.parametrize('method', ['phase', 'envelope', 'filtered'])
+def test_memory_budget(tmp_path, method):
+    sr, band = 128.0, (5.0, 15.0)
+    t = time(sr, T=800.0)
+    x = np.sin(phase(t, 10.0)) + 0.5*np.random.randn(t.size)
+    path = tmp_path / 'samples.f32'
+    x.astype(np.float32).tofile(path)
+    signal = Signal.from_file(path, sr, dtype=np.float32,
+                              memory_budget=128*8192)
+    assert isinstance(signal.signal, np.memmap)
+    expected = getattr(Signal(x.astype(np.float32), sr), method)(band)
+    out = np.lib.format.open_memmap(tmp_path / 'out.npy', mode='w+',
+                                    shape=x.shape)
+    result = getattr(signal, method)(band, out=out)
+    assert result is out
+    sl = slice(1000, -1000)
+    if method == 'phase':
+        result = phase_difference(result, expected)
+        expected = np.zeros_like(expected)
+    assert result[sl] == pytest.approx(expected[sl], abs=2e-2)
+
+
+def test_from_npy_file(tmp_path):
+    x = np.random.randn(1000)
+    np.save(tmp_path / 'samples.npy', x)
+    signal = Signal.from_file(tmp_path / 'samples.npy', 100.0)
+    assert np.array_equal(signal.signal, x)
+
+
+@pytest.mark.parametrize('memory_budget', [None, 128*1024])
+def test_multichannel(memory_budget):
+    sr, band = 128.0, (5.0, 15.0)
+    x = np.random.randn(5000, 3)
+    signal = Signal(x, sr, axis=0, memory_budget=memory_budget)
+    assert signal.time.size == 5000
+    phase = signal.phase(band)
+    envelope = signal.envelope(band, method='max')
+    assert phase.shape == envelope.shape == x.shape
+    for i in range(3):
+        channel = Signal(x[:, i], sr, memory_budget=memory_budget)
+        assert phase[:, i] == pytest.approx(channel.phase(band))
+        assert envelope[:, i] == pytest.approx(
+            channel.envelope(band, method='max'))
+
+
+def test_from_interleaved_file(tmp_path):
+    x = np.random.randn(1000, 4)
+    x.tofile(tmp_path / 'samples.raw')
+    signal = Signal.from_file(tmp_path / 'samples.raw', 100.0,
+                              num_channels=4)
+    assert signal.axis == 0
+    assert np.array_equal(signal.samples, x.T)
+
+
+@pytest.mark.parametrize('engine', ['time', 'fft'])
+def test_phase_and_envelope_share_analytic(engine):
+    sr, band = 128.0, (5.0, 15.0)
+    signal = Signal(np.random.randn(4000), sr, engine=engine)
+    phase = signal.phase(band)
+    envelope = signal.envelope(band)
+    info = signal.cache_info()
+    assert info.hits == 1
+    assert phase == pytest.approx(Signal(signal.signal, sr,
+                                         engine=engine).phase(band))
+    assert envelope == pytest.approx(np.abs(signal.analytic(band)))
+    signal.invalidate(band)
+    assert len(signal.cache) == 0
+    signal.envelope(band)
+    signal.signal[:] = 0.0
+    signal.invalidate()
+    assert np.all(signal.envelope(band) == 0.0)
+
+
+def test_cache_budget():
+    sr, band = 128.0, (5.0, 15.0)
+    signal = Signal(np.random.randn(4000), sr, cache_bytes=0)
+    signal.phase(band)
+    signal.phase(band)
+    info = signal.cache_info()
+    assert info.hits == 0 and info.nbytes == 0
+
+
+@pytest.mark.parametrize('cache_bytes', [2**28, 0])
+@pytest.mark.parametrize('engine', ['time', 'fft'])
+def test_results_are_writable(engine, cache_bytes):
+    sr, band = 128.0, (5.0, 15.0)
+    signal = Signal(np.random.randn(4000), sr, engine=engine,
+                    cache_bytes=cache_bytes)
+    for _ in range(2):
+        for x in [signal.filtered(band), signal.analytic(band),
+                  signal.envelope(band, 'max')]:
+            x -= x.mean()
+    expected = signal.filtered(band)
+    assert np.array_equal(signal.filtered(band), expected)
+
+
+@pytest.mark.parametrize('engine', ['time', 'fft'])
+def test_single_precision(engine):
+    sr, band = 128.0, (5.0, 15.0)
+    signal = Signal(np.random.randn(4000), sr, engine=engine,
+                    precision='single')
+    assert signal.filtered(band).dtype == np.float32
+    assert signal.analytic(band).dtype == np.complex64
+    phase = signal.phase(band)
+    assert phase.dtype == np.float32
+    assert np.all((0.0 <= phase) & (phase < 2*np.pi))
+    for method in ['hilbert', 'max']:
+        assert signal.envelope(band, method=method).dtype == np.float32
+    with pytest.raises(ValueError):
+        Signal(np.zeros(10), 1.0, precision='half')
+
+
+def test_multirate_signal():
+    sr = 1024.0
+    t = time(sr, T=20.0)
+    x = np.sin(phase(t, 5.0)) + 0.5*np.sin(phase(t, 60.0))
+    signal = Signal(x, sr)
+    multirate = Signal(x, sr, multirate=True)
+    sl = slice(int(2*sr), -int(2*sr))
+    dphi = phase_difference(signal.phase((4.0, 6.0)),
+                            multirate.phase((4.0, 6.0)))
+    assert np.max(np.abs(dphi[sl])) < 0.05
+    assert multirate.envelope((4.0, 6.0))[sl] == pytest.approx(1.0, rel=0.05)
+    assert multirate.filtered((4.0, 6.0))[sl] == pytest.approx(
+        signal.filtered((4.0, 6.0))[sl], abs=0.05)
+    multirate.phase((50.0, 70.0))
+    assert len(multirate._levels) > 1
+    multirate.invalidate()
+    assert len(multirate._levels) == 0
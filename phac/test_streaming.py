@@ -0,0 +1,94 @@
+import pytest
+import numpy as np
+from .streaming import (
+    StreamingAnalytic,
+    StreamingPAC,
+    streaming_phase_amplitude_coupling
+)
+from .filter_bank import FilterBank
+from .metrics import _modulation_index
+from .util import analytic_phase, phase_bin_codes
+
+SLOW, FAST = (4.0, 8.0), (50.0, 80.0)
+
+
+@pytest.fixture
+def samples(make_samples):
+    return make_samples(300.0)
+
+
+def test_short_stream_is_exact(samples):
+    sr, x = samples
+    bank = FilterBank([SLOW, FAST], sr)
+    x = x[:5000]
+    stream = StreamingAnalytic(bank, nsegment=8192, noverlap=1024)
+    parts = [stream.push(chunk) for chunk in np.array_split(x, 7)]
+    assert all(part.shape == (2, 0) for part in parts)
+    assert np.array_equal(stream.flush(), bank.analytic(x))
+
+
+@pytest.mark.parametrize('num_chunks', [1, 13, 400])
+def test_streaming_analytic(samples, num_chunks):
+    sr, x = samples
+    bank = FilterBank([SLOW, FAST], sr)
+    stream = StreamingAnalytic(bank, nsegment=16384, noverlap=2048)
+    parts = [stream.push(chunk) for chunk in np.array_split(x, num_chunks)]
+    analytic = np.concatenate(parts + [stream.flush()], axis=1)
+    expected = bank.analytic(x)
+    assert analytic.shape == expected.shape
+    scale = np.abs(expected).max(axis=1, keepdims=True)
+    error = np.abs(analytic - expected)[:, 2048:-2048] / scale
+    assert np.all(error < 0.02)
+
+
+def test_streaming_pac(samples):
+    sr, x = samples
+    analytic = FilterBank([SLOW, FAST], sr).analytic(x)
+    codes = phase_bin_codes(analytic_phase(analytic[0]), 12)
+    env_avg = np.bincount(codes, weights=np.abs(analytic[1])) \
+        / np.bincount(codes)
+    pac = streaming_phase_amplitude_coupling(
+        np.array_split(x, 50), sr, SLOW, FAST, nsegment=16384, noverlap=2048)
+    assert pac.modulation_index == pytest.approx(_modulation_index(env_avg),
+                                                 rel=0.01)
+
+
+def test_streaming_pac_on_demand(samples):
+    sr, x = samples
+    pac = StreamingPAC(sr, SLOW, FAST, nsegment=16384, noverlap=2048)
+    pac.update(x[:20000])
+    assert pac.counts.sum() == 16384 - 2048
+    assert 0.0 < pac.result().modulation_index < 1.0
+    pac.update(x[20000:])
+    final = pac.finish()
+    assert pac.counts.sum() == x.size
+    assert 0.0 < final.modulation_index < 1.0
+
+
+@pytest.mark.parametrize('aggregator', ['mean', 'median'])
+def test_streaming_pac_before_all_bins_have_samples(samples, aggregator):
+    sr, x = samples
+    pac = StreamingPAC(sr, SLOW, FAST, nsegment=16384, noverlap=2048,
+                       aggregator=aggregator)
+    assert np.isnan(pac.result().modulation_index)
+    for chunk in [x[:0], x[:1000]]:
+        pac.update(chunk)
+        ans = pac.result()
+        assert np.isnan(ans.modulation_index)
+        assert np.isnan(ans.mean_phase_coherence)
+    pac.update(x[1000:40000])
+    assert 0.0 < pac.result().modulation_index < 1.0
+
+
+def test_multichannel_streaming_pac(samples):
+    sr, x = samples
+    x = np.stack([x[:40000], x[-40000:]])
+    pac = streaming_phase_amplitude_coupling(
+        np.array_split(x, 9, axis=-1), sr, SLOW, FAST, nsegment=16384,
+        noverlap=2048)
+    for i, channel in enumerate(x):
+        expected = streaming_phase_amplitude_coupling(
+            np.array_split(channel, 9), sr, SLOW, FAST, nsegment=16384,
+            noverlap=2048)
+        assert pac.modulation_index[i] == pytest.approx(
+            expected.modulation_index)
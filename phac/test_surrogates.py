@@ -0,0 +1,94 @@
+import pytest
+import numpy as np
+from .surrogates import surrogates, surrogate_test, surrogate_comodulogram
+from .filter_bank import FilterBank
+from .filter_series import FilterSeries
+from .util import phase_bin_codes
+
+METHODS = ['time_shift', 'block_swap', 'phase_shuffle']
+
+
+@pytest.fixture
+def samples(make_samples):
+    return make_samples(60.0, coupling=0.9)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_surrogates_keep_values(method):
+    rng = np.random.default_rng(0)
+    envelopes = rng.random((3, 1001))
+    shuffled = surrogates(envelopes, 5, method, rng)
+    assert shuffled.shape == (5, 3, 1001)
+    assert np.array_equal(np.sort(shuffled, axis=-1),
+                          np.broadcast_to(np.sort(envelopes, axis=-1),
+                                          shuffled.shape))
+    assert not np.array_equal(shuffled[0], envelopes)
+
+
+def test_surrogates_fails():
+    with pytest.raises(ValueError):
+        surrogates(np.random.rand(10), 2, 'unknown')
+
+
+@pytest.mark.parametrize('num_blocks', [0, 1, 11])
+def test_block_swap_fails(num_blocks):
+    envelopes = np.random.default_rng(0).random(10)
+    with pytest.raises(ValueError):
+        surrogates(envelopes, 2, 'block_swap', num_blocks=num_blocks)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_surrogate_test(samples, method):
+    sr, x = samples
+    codes = phase_bin_codes(FilterBank([(4.0, 8.0), (20.0, 24.0)], sr)
+                            .phase(x))
+    envelopes = FilterBank([(50.0, 80.0)], sr).envelope(x)
+    rng = np.random.default_rng(1)
+    ans = surrogate_test(codes, envelopes, num_surrogates=50, method=method,
+                         rng=rng, batch_size=16)
+    assert ans.zscore.shape == ans.pvalue.shape == (2, 1)
+    # coupled to the slow rhythm, not to the unrelated band
+    assert ans.zscore[0, 0] > 5.0
+    assert ans.pvalue[0, 0] == pytest.approx(1/51)
+    assert ans.zscore[0, 0] > ans.zscore[1, 0]
+
+
+def test_surrogate_test_is_reproducible(samples):
+    sr, x = samples
+    codes = phase_bin_codes(FilterBank([(4.0, 8.0)], sr).phase(x))[0]
+    envelope = FilterBank([(50.0, 80.0)], sr).envelope(x)[0]
+    a, b = (surrogate_test(codes, envelope, num_surrogates=20,
+                           rng=np.random.default_rng(3), batch_size=bs)
+            for bs in (1, 20))
+    assert np.ndim(a.zscore) == 0
+    assert a == b
+
+
+def test_surrogate_comodulogram(samples):
+    sr, x = samples
+    slow = FilterSeries(4.0, 8.0, 2.0)
+    fast = FilterSeries(50.0, 80.0, 20.0)
+    ans = surrogate_comodulogram(x, sr, slow, fast, num_surrogates=20,
+                                 rng=np.random.default_rng(0))
+    assert ans.zscore.shape == ans.modulation_index.shape
+    assert ans.zscore.columns.name == 'f_slow'
+    assert ans.zscore.index.name == 'f_fast'
+    banks = surrogate_comodulogram(x, sr, slow.filter_bank(sr),
+                                   fast.filter_bank(sr), num_surrogates=20,
+                                   rng=np.random.default_rng(0))
+    assert banks.zscore.equals(ans.zscore)
+
+
+def test_multichannel_surrogate_test(samples):
+    sr, x = samples
+    x = np.stack([x[:5000], x[5000:10000]])
+    codes = np.moveaxis(phase_bin_codes(
+        FilterBank([(4.0, 8.0)], sr).phase(x)), 0, -2)
+    envelopes = np.moveaxis(FilterBank([(50.0, 80.0)], sr).envelope(x), 0, -2)
+    ans = surrogate_test(codes, envelopes, num_surrogates=10,
+                         rng=np.random.default_rng(0), batch_size=4)
+    assert ans.zscore.shape == (2, 1, 1)
+    for i in range(2):
+        expected = surrogate_test(codes[i], envelopes[i], num_surrogates=10,
+                                  rng=np.random.default_rng(0), batch_size=4)
+        assert ans.zscore[i] == pytest.approx(expected.zscore)
@@ -1,8 +1,15 @@
 from .util import (
     indices_of_binned_phase,
+    phase_bin_codes,
+    bin_index,
+    binned_median,
+    binned_sum,
     trapezoid,
     phase_difference,
     downsample,
+    decimate,
+    decimation_factor,
+    interpolate,
     np
 )
 import pytest
@@ -23,6 +30,57 @@ def test_indices_of_binned_phase():
         assert idx[0] == i
 
 
+@pytest.mark.parametrize("num_bins", [3, 12, 18])
+def test_phase_bin_codes(num_bins):
+    phase = 2*np.pi*np.random.rand(1000)
+    phase[:num_bins] = np.linspace(0, 2*np.pi, num=num_bins, endpoint=False)
+    codes = phase_bin_codes(phase, num_bins=num_bins)
+    for i, idx in enumerate(indices_of_binned_phase(phase, num_bins)):
+        assert np.all(codes[idx] == i)
+        assert idx.size == np.sum(codes == i)
+
+
+@pytest.mark.parametrize("phi", [-0.1, 2.*np.pi])
+def test_phase_bin_codes_raises_error(phi):
+    with pytest.raises(ValueError):
+        phase_bin_codes(np.array([1, phi, 5]), num_bins=3)
+
+
+def test_phase_bin_codes_without_validation():
+    phase = np.array([0.0, 1.0, 2*np.pi - 1e-12, np.pi], dtype=np.float32)
+    codes = phase_bin_codes(phase, num_bins=4, validate=False)
+    assert codes.dtype == np.uint8
+    assert np.array_equal(codes, [0, 0, 3, 2])
+
+
+def test_bin_index():
+    codes = np.array([[2, 0, 2, 1, 0], [1, 1, 1, 1, 1]], dtype=np.uint8)
+    bins = bin_index(codes, num_bins=3)
+    assert np.array_equal(bins.counts, [[2, 1, 2], [0, 5, 0]])
+    assert np.array_equal(bins.offsets, [[0, 2, 3, 5], [0, 0, 5, 5]])
+    assert np.array_equal(bins.permutation, [[1, 4, 3, 0, 2],
+                                             [0, 1, 2, 3, 4]])
+
+
+@pytest.mark.parametrize("n", [1, 2, 101, 1000])
+def test_binned_median(n):
+    num_bins = 5
+    phases = 2*np.pi*np.random.rand(3, n)
+    amplitudes = np.random.rand(4, n)
+    amplitudes[:, :n//2] = amplitudes[:, :1]  # repeated values
+    avg = binned_median(phase_bin_codes(phases, num_bins), amplitudes,
+                        num_bins)
+    assert avg.shape == (3, 4, num_bins)
+    for i, phase in enumerate(phases):
+        indices = indices_of_binned_phase(phase, num_bins)
+        for j, amplitude in enumerate(amplitudes):
+            for k, idx in enumerate(indices):
+                if idx.size:
+                    assert avg[i, j, k] == np.median(amplitude[idx])
+                else:
+                    assert np.isnan(avg[i, j, k])
+
+
 @pytest.mark.parametrize("n, m", [
     (-1, 21),  # negative
     (64, -1),  # negative
@@ -69,6 +127,44 @@ def test_downsample(factor):
     assert resampled[sl] == pytest.approx(expected[sl], abs=1e-2)
 
 
+@pytest.mark.parametrize("sr,fmax,expected", [
+    (1000.0, 10.0, 16), (1000.0, 100.0, 2), (1000.0, 150.0, 1),
+])
+def test_decimation_factor(sr, fmax, expected):
+    assert decimation_factor(sr, fmax) == expected
+    assert decimation_factor(sr, fmax, max_factor=4) == min(expected, 4)
+
+
+@pytest.mark.parametrize("factor", [2, 3, 8])
+def test_decimate(factor):
+    sr = 1000.0
+    t = np.arange(10000)/sr
+    x = np.stack([np.sin(2*np.pi*5.0*t), np.cos(2*np.pi*5.0*t)])
+    decimated = decimate(x, factor)
+    assert decimated.shape == (2, x[:, ::factor].shape[-1])
+    sl = slice(decimated.shape[-1]//10, -decimated.shape[-1]//10)
+    assert decimated[:, sl] == pytest.approx(x[:, ::factor][:, sl],
+                                             abs=1e-3)
+    assert decimate(x.T, factor, axis=0) == pytest.approx(decimated.T)
+
+
+@pytest.mark.parametrize("n", [16, 17, 23])
+def test_interpolate(n):
+    factor = 4
+    x = 2.0*np.arange(n) + 1.0
+    decimated = np.stack([x[::factor], -x[::factor]])
+    assert interpolate(decimated, factor, n) == pytest.approx(
+        np.stack([x, -x]))
+    assert interpolate(x, 1, n) == pytest.approx(x)
+
+
+@pytest.mark.parametrize("n", [1, 3, 4])
+def test_interpolate_one_sample(n):
+    decimated = np.array([[2.0, 5.0], [-1.0, 7.0]])
+    assert np.array_equal(interpolate(decimated, 4, n),
+                          np.repeat(decimated[:, :1], n, axis=-1))
+
+
 @pytest.mark.parametrize("phase", np.linspace(0, 2*np.pi, num=20))
 def test_phase_difference(phase):
     """test phase difference of `phase+0.1 - phase`
@@ -80,3 +176,24 @@ def test_phase_difference(phase):
     phi0 = np.mod(phase+dphi, 2*np.pi)
     phi1 = np.mod(phase, 2*np.pi)
     assert phase_difference(phi0, phi1) == pytest.approx(dphi)
+
+
+def test_binned_median_multichannel():
+    num_bins = 6
+    phases = 2*np.pi*np.random.rand(2, 3, 500)
+    amplitudes = np.random.rand(2, 4, 500)
+    codes = phase_bin_codes(phases, num_bins)
+    avg = binned_median(codes, amplitudes, num_bins)
+    assert avg.shape == (2, 3, 4, num_bins)
+    for i in range(2):
+        assert np.array_equal(avg[i], binned_median(codes[i], amplitudes[i],
+                                                    num_bins))
+
+
+def test_binned_sum():
+    codes = np.array([[0, 1, 1, 2], [2, 2, 2, 0]])
+    values = np.arange(8.0).reshape(2, 4)
+    assert np.array_equal(binned_sum(codes, num_bins=3),
+                          [[1, 2, 1], [1, 0, 3]])
+    assert np.array_equal(binned_sum(codes, values, 3),
+                          [[0, 3, 3], [7, 0, 15]])
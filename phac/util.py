@@ -1,16 +1,56 @@
-from typing import List, Tuple
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 from functools import lru_cache
 from scipy.signal import butter as _butter
 from scipy.signal import hilbert as _hilbert  # noqa: F401
-from scipy.signal import filtfilt as _filtfilt
+from scipy.signal import sosfiltfilt as _sosfiltfilt
 
+from .profiling import stage
 
-def indices_of_binned_phase(phase: np.ndarray,
-                            num_bins: int = 18) -> List[np.ndarray]:
+# decimated signals keep frequencies up to a 1/MULTIRATE_MARGIN of their rate
+MULTIRATE_MARGIN = 5.0
+
+# real and complex type of each floating-point precision
+PRECISIONS: Dict[str, Tuple[np.dtype, np.dtype]] = {
+    'double': (np.dtype(np.float64), np.dtype(np.complex128)),
+    'single': (np.dtype(np.float32), np.dtype(np.complex64)),
+}
+
+
+def _dtypes(precision: str) -> Tuple[np.dtype, np.dtype]:
+    try:
+        return PRECISIONS[precision]
+    except KeyError:
+        raise ValueError(f"precision ({precision}) must be one of "
+                         f"{tuple(PRECISIONS)}")
+
+
+PhaseBins: Tuple = namedtuple(  # type: ignore
+    "PhaseBins", "counts offsets permutation"
+)
+
+
+def _validate_phase(phase: np.ndarray) -> None:
+    if np.size(phase) == 0:
+        return
+    try:
+        assert np.min(phase) >= 0, "All phase values must be greater or \
+        equal than 0"
+        assert np.max(phase) < 2.0 * np.pi, "All phase values must be \
+        smaller than 2*pi"
+    except AssertionError as err:
+        raise ValueError(str(err))
+
+
+def indices_of_binned_phase(phase: np.ndarray, num_bins: int = 18,
+                            validate: bool = True) -> List[np.ndarray]:
     """return list of indices each with values in bins
 
+    The list is split from the permutation of `bin_index`, which should be
+    preferred for large arrays.
+
     Parameters
     ----------
     phase: np.ndarray
@@ -18,19 +58,157 @@ def indices_of_binned_phase(phase: np.ndarray,
 
     num_bins: int, default=18
         number of equidistant bins in the range [0, 2*pi).
+
+    validate: bool, default=True
+        check that `phase` is within [0, 2*pi).
     """
-    try:
-        assert np.all(phase >= 0), "All phase values must be greater or equal \
-        than 0"
-        assert np.all(phase < 2.0 * np.pi), "All phase values must be smaller \
-        than 2*pi"
-    except AssertionError as err:
-        raise ValueError(str(err))
-    sorting = np.argsort(phase)
-    bin_limits = np.linspace(0, 2*np.pi, num=num_bins+1)
-    bin_limit_idx = phase[sorting].searchsorted(bin_limits)
-    return [sorting[slice(*ij)]
-            for ij in zip(bin_limit_idx, bin_limit_idx[1:])]
+    bins = bin_index(phase_bin_codes(phase, num_bins, validate), num_bins)
+    return np.split(bins.permutation, bins.offsets[1:-1])
+
+
+@stage('util.bin_codes')
+def phase_bin_codes(phase: np.ndarray, num_bins: int = 18,
+                    validate: bool = True) -> np.ndarray:
+    """return the index of the phase bin of each value in `phase`
+
+    Codes are computed in a single pass as `floor(phase*num_bins/(2*pi))`, so
+    that values within rounding of a bin edge may fall into the neighbouring
+    bin.  The codes are returned in the smallest unsigned integer type holding
+    `num_bins`.
+
+    Parameters
+    ----------
+    phase: np.ndarray
+        phase variable with wrapped around the interval [0, 2*pi).
+
+    num_bins: int, default=18
+        number of equidistant bins in the range [0, 2*pi).
+
+    validate: bool, default=True
+        check that `phase` is within [0, 2*pi).  Phases of `analytic_phase`
+        need no validation.
+    """
+    if validate:
+        _validate_phase(phase)
+    scaled = np.multiply(phase, num_bins / (2*np.pi))
+    # truncation is the floor of non-negative values
+    codes = scaled.astype(np.min_scalar_type(num_bins))
+    # values just below 2*pi may round up to `num_bins`
+    return np.minimum(codes, num_bins-1, out=codes)
+
+
+def _bin_offsets(counts: np.ndarray) -> np.ndarray:
+    """return start of each bin and the total along the last axis"""
+    offsets = np.zeros(counts.shape[:-1] + (counts.shape[-1]+1,),
+                       dtype=np.intp)
+    np.cumsum(counts, axis=-1, out=offsets[..., 1:])
+    return offsets
+
+
+@stage('util.bin_index')
+def bin_index(codes: np.ndarray, num_bins: int = 18) -> PhaseBins:
+    """return the samples grouped by phase bin in compressed form
+
+    A counting sort of the codes yields the number of samples in each bin,
+    the offsets of the bins and the permutation of the samples, such that
+    `permutation[offsets[i]:offsets[i+1]]` are the indices (in increasing
+    order) of the samples in bin `i`.  The structure is computed once per
+    phase signal and reused for any number of amplitudes.
+
+    Parameters
+    ----------
+    codes: np.ndarray
+        phase bin codes (see `phase_bin_codes`) of shape `(..., n)`.
+    num_bins: int, default=18
+        number of phase bins.
+
+    Returns
+    -------
+    PhaseBins with `counts` of shape `(..., num_bins)`, `offsets` of shape
+    `(..., num_bins+1)` and `permutation` of shape `(..., n)`.
+    """
+    counts = binned_sum(codes, num_bins=num_bins)
+    # stable sorting of small integer codes is a radix sort, O(n)
+    permutation = np.argsort(codes, axis=-1, kind='stable')
+    return PhaseBins(counts, _bin_offsets(counts), permutation)
+
+
+def binned_sum(codes: np.ndarray, values: Optional[np.ndarray] = None,
+               num_bins: int = 18) -> np.ndarray:
+    """return sums of `values` within each phase bin along the last axis
+
+    Without `values`, the number of samples in each bin is returned.  Leading
+    axes (e.g. channels) are reduced with a single `np.bincount`.
+
+    Returns
+    -------
+    np.ndarray of shape `codes.shape[:-1] + (num_bins,)`
+    """
+    if values is not None:
+        codes, values = np.broadcast_arrays(codes, values)
+    lead, n = codes.shape[:-1], codes.shape[-1]
+    num = int(np.prod(lead))
+    flat = codes.reshape(num, n).astype(np.intp) \
+        + num_bins * np.arange(num)[:, None]
+    weights = None if values is None else values.reshape(num*n)
+    sums = np.bincount(flat.ravel(), weights=weights,
+                       minlength=num*num_bins)
+    return sums.reshape(lead + (num_bins,))
+
+
+@stage('util.binned_median')
+def binned_median(codes: np.ndarray, amplitudes: np.ndarray,
+                  num_bins: int = 18) -> np.ndarray:
+    """return medians of all amplitudes within all phase bins
+
+    Amplitudes are sorted once.  For each phase signal, the bin counts are
+    computed once for all amplitudes, and a counting sort of the bin codes
+    (taken in amplitude order, see `bin_index`) groups the samples by bin
+    while keeping them sorted within each bin, so that the medians are read
+    off at the middle positions of each group.  Empty bins yield `nan`.
+
+    Parameters
+    ----------
+    codes: np.ndarray
+        phase bin codes (see `phase_bin_codes`) of shape `(..., n_phase, n)`.
+    amplitudes: np.ndarray
+        amplitudes of shape `(..., n_amplitude, n)`.  Leading axes (e.g.
+        channels) are broadcast against those of `codes`.
+    num_bins: int, default=18
+        number of phase bins.
+
+    Returns
+    -------
+    np.ndarray of shape `(..., n_phase, n_amplitude, num_bins)`
+    """
+    codes = np.atleast_2d(codes)
+    amplitudes = np.atleast_2d(amplitudes)
+    (n_phase, n), n_amplitude = codes.shape[-2:], amplitudes.shape[-2]
+    lead = np.broadcast_shapes(codes.shape[:-2], amplitudes.shape[:-2])
+    codes = np.broadcast_to(codes, lead + (n_phase, n))
+    amplitudes = np.broadcast_to(amplitudes, lead + (n_amplitude, n))
+    order = np.argsort(amplitudes, axis=-1)
+    sorted_amplitudes = np.take_along_axis(amplitudes, order, axis=-1)
+    ans = np.empty(lead + (n_phase, n_amplitude, num_bins), dtype=np.float64)
+    for i in range(n_phase):
+        c = codes[..., i, :]
+        counts = binned_sum(c, num_bins=num_bins)[..., None, :]
+        offsets = _bin_offsets(counts)[..., :-1]
+        grouped = np.argsort(
+            np.take_along_axis(c[..., None, :], order, axis=-1),
+            axis=-1, kind='stable')
+        lower = np.minimum(offsets + np.maximum(counts-1, 0) // 2, n-1)
+        upper = np.minimum(offsets + counts // 2, n-1)
+        lower_values, upper_values = (
+            np.take_along_axis(
+                sorted_amplitudes,
+                np.take_along_axis(grouped, position, axis=-1), axis=-1)
+            for position in (lower, upper)
+        )
+        median = 0.5 * (lower_values.astype(np.float64) + upper_values)
+        median[np.broadcast_to(counts == 0, median.shape)] = np.nan
+        ans[..., i, :, :] = median
+    return ans
 
 
 def trapezoid(n: int, m: int, dtype=np.float64) -> np.ndarray:
@@ -64,25 +242,46 @@ def trapezoid(n: int, m: int, dtype=np.float64) -> np.ndarray:
     return np.concatenate([tr, middle, tr[::-1]]).astype(dtype)
 
 
-def _highpass(sr: float, f: float) -> Tuple[np.ndarray, np.ndarray]:
-    highpass_freq = 2*f/sr
-    return _butter(4, highpass_freq, btype='high')
+def is_stable(sos: np.ndarray) -> bool:
+    """return whether all poles of second-order sections lie in the unit
+    circle
+
+    `sos` may hold the sections of several filters, shape `(..., 6)`.
+    """
+    denominators = np.reshape(sos, (-1, 6))[:, 3:]
+    poles = np.concatenate([np.roots(a) for a in denominators]) \
+        if len(denominators) else np.empty(0)
+    return bool(np.all(np.abs(poles) < 1.0))
+
+
+def _butter_sos(sr: float, freqs, btype: str) -> np.ndarray:
+    sos = _butter(4, 2*np.asarray(freqs)/sr, btype=btype, output='sos')
+    try:
+        assert is_stable(sos), \
+            f"unstable {btype}-pass filter at {freqs} Hz (sr: {sr} Hz)"
+    except AssertionError as err:
+        raise ValueError(str(err))
+    return sos
+
+
+@stage('util.design')
+def _highpass(sr: float, f: float) -> np.ndarray:
+    return _butter_sos(sr, f, 'high')
 
 
-def _lowpass(sr: float, f: float) -> Tuple[np.ndarray, np.ndarray]:
-    lowpass_freq = 2*f/sr
-    return _butter(4, lowpass_freq, btype='low')
+@stage('util.design')
+def _lowpass(sr: float, f: float) -> np.ndarray:
+    return _butter_sos(sr, f, 'low')
 
 
-def _bandpass(sr: float,
-              band: Tuple[float, float]) -> Tuple[np.ndarray, np.ndarray]:
-    bandpass_freqs = 2*np.array(band)/sr
-    return _butter(4, bandpass_freqs, btype='band')
+@stage('util.design')
+def _bandpass(sr: float, band: Tuple[float, float]) -> np.ndarray:
+    return _butter_sos(sr, band, 'band')
 
 
-@lru_cache(maxsize=128)
-def _pass(sr: float,
-          band: Tuple[float, float]) -> Tuple[np.ndarray, np.ndarray]:
+@lru_cache(maxsize=1024)
+def _pass(sr: float, band: Tuple[float, float]) -> np.ndarray:
+    """return second-order sections of a 4-th order Butterworth filter"""
     try:
         assert not all(f is None for f in band), "fmin and fmax is `None`."
         if band[1] is None:
@@ -97,10 +296,37 @@ def _pass(sr: float,
         raise ValueError(str(err))
 
 
+@stage('util.filtfilt')
+def _zero_phase(sos: np.ndarray, x: np.ndarray, axis: int = -1) -> np.ndarray:
+    return _sosfiltfilt(sos, x, axis=axis, padtype='constant')
+
+
 def filtfilt(x: np.ndarray, sr: float, fmin: float = None, fmax: float = None,
              axis: int = -1) -> np.ndarray:
-    b, a = _pass(sr, (fmin, fmax))
-    return _filtfilt(b, a, x, axis=axis, padtype='constant', method='pad')
+    """return `x` filtered forward and backward with a Butterworth filter
+
+    The filter is a 4-th order band-pass, or a high-pass (`fmax=None`) or
+    low-pass (`fmin=None`), applied as second-order sections.
+    """
+    return _zero_phase(_pass(sr, (fmin, fmax)), x, axis=axis)
+
+
+@stage('util.phase')
+def analytic_phase(analytic: np.ndarray) -> np.ndarray:
+    """return phase in [0, 2*pi) of an analytic signal
+
+    The phase is shifted by `pi/2` such that the peaks of the band-filtered
+    signal are found at `pi/2`.  The phase has the precision of `analytic`.
+    """
+    return _wrap_phase(np.angle(analytic) + np.pi/2)
+
+
+def _wrap_phase(phi: np.ndarray) -> np.ndarray:
+    # in single precision, `2*pi` rounds up; wrap below it instead
+    two_pi = np.asarray(2*np.pi, dtype=phi.dtype)
+    if two_pi > 2*np.pi:
+        two_pi = np.nextafter(two_pi, 0)
+    return np.mod(phi, two_pi)
 
 
 def downsample(x: np.ndarray, sr_old: float, sr_new: float,
@@ -143,6 +369,60 @@ def downsample(x: np.ndarray, sr_old: float, sr_new: float,
     return x
 
 
+def decimation_factor(sr: float, fmax: float,
+                      max_factor: Optional[int] = None) -> int:
+    """return the largest power of two by which a signal can be decimated
+
+    After decimation by the factor, frequencies up to `fmax` lie below a
+    fifth of the reduced sampling rate, i.e. in the pass band of the
+    anti-aliasing filter of `decimate` (gain above 0.99).
+    """
+    factor = 1
+    while 2*factor*MULTIRATE_MARGIN*fmax <= sr and \
+            (max_factor is None or 2*factor <= max_factor):
+        factor *= 2
+    return factor
+
+
+def decimate(x: np.ndarray, factor: int, axis: int = -1) -> np.ndarray:
+    """return every `factor`-th sample of `x` after anti-alias filtering
+
+    Each stage low-pass filters with a zero-phase 4-th order Butterworth
+    filter at 0.8 times the reduced Nyquist frequency and keeps every
+    second (or, for odd factors, `factor`-th) sample, starting with the
+    first.  Decimating in stages of two keeps the filters well-conditioned
+    for large factors.
+    """
+    x = np.moveaxis(x, axis, -1)
+    while factor > 1:
+        step = 2 if factor % 2 == 0 else factor
+        x = filtfilt(x, 1.0, fmax=0.4/step)[..., ::step]
+        factor //= step
+    return np.moveaxis(x, -1, axis)
+
+
+def interpolate(x: np.ndarray, factor: int, n: int) -> np.ndarray:
+    """return `n` samples linearly interpolated from `x` decimated by
+    `factor`
+
+    Sample `j` of `x` (along the last axis) is taken at sample `j*factor`
+    of the result, and `x` needs at least `ceil(n/factor)` samples.  Beyond
+    the last sample of `x` values are extrapolated, or held if only one
+    sample is used.
+    """
+    if factor == 1:
+        return x[..., :n]
+    m = -(-n // factor)
+    if m == 1:
+        return np.repeat(x[..., :1], n, axis=-1)
+    left = x[..., :m]
+    right = np.concatenate([x[..., 1:m], 2*x[..., m-1:m] - x[..., m-2:m-1]],
+                           axis=-1)
+    fraction = np.arange(factor) / factor
+    ans = left[..., None] * (1.0-fraction) + right[..., None] * fraction
+    return ans.reshape(x.shape[:-1] + (m*factor,))[..., :n]
+
+
 def phase_difference(phi0: np.ndarray, phi1: np.ndarray) -> np.ndarray:
     """computes linear phase differences smaller than `pi`"""
     dphi = phi0-phi1
@@ -11,9 +11,12 @@ __version__ = ''
 exec(open(join('phac', 'version.py')).read())
 requirements = open('requirements.txt').read().split('\n')
 
-setup(
+setuptools.setup(
     name='phac',
     version=__version__,
     packages=['phac', 'phac.models'],
     install_requires=requirements,
+    entry_points={
+        'console_scripts': ['phac = phac.cli:main'],
+    },
 )